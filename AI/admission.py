@@ -0,0 +1,321 @@
+# admission.py
+# 경로별 입장 제어(동시 실행 제한 + 우선순위)와 요청 마감 시각(deadline) 전파
+#   - 모임 매칭 > 범용 검색 > 취미 추천 순으로 우선순위를 두고, 경로별 동시 실행 수와 전체 용량을 함께 제한합니다.
+#       자리가 나면 대기열에서 우선순위가 높은(같으면 먼저 온) 요청부터 들여보냅니다.
+#   - 클라이언트는 X-MOIT-Deadline-Ms 헤더로 남은 대기 시간(ms)을 알려줍니다. 헤더가 없으면 경로별 기본값(PHP cURL 제한 시간)을 씁니다.
+#   - 마감 시각은 contextvar 로 그래프 노드, 스레드 풀 작업, 공급자 호출까지 그대로 전파됩니다.
+#       노드는 has_time_for(작업) 으로 남은 시간을 보고, 모자라면 선택 작업(유용성 평가/질의 재작성 루프 등)을 건너뜁니다.
+#   - 마감 전에 자리를 얻지 못하거나 대기열이 가득 차면 AdmissionRejected 를 냅니다. (HTTP 503 + Retry-After)
+#       백그라운드 작업(queue_limit=False)은 대기열 상한에 걸리지 않고 차례가 올 때까지 기다리며, 상한 계산에도 들어가지 않습니다.
+#   - 요청이 취소돼도 스레드 풀에서 이미 돌고 있는 블로킹 호출(Gemini 등)은 멈출 수 없으므로,
+#       hold_slot_until 로 등록한 작업이 끝날 때까지 자리를 반납하지 않습니다.
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Awaitable, Dict, Optional
+
+from telemetry import ADMISSION_EVENTS, ADMISSION_WAIT
+
+DEADLINE_HEADER = "x-moit-deadline-ms"
+# 응답을 돌려보내는 데 드는 시간만큼 클라이언트 마감보다 조금 일찍 끝냅니다.
+DEADLINE_MARGIN = float(os.getenv("MOIT_DEADLINE_MARGIN_MS", "500")) / 1000
+
+# 경로: (우선순위(작을수록 먼저), 동시 실행 제한, 기본 마감(초))
+# 기본 마감은 호출하는 PHP 의 cURL 제한 시간입니다. (create_meeting.php 30초, ai_search.php 60초, get_ai_recommendation.php 120초)
+# MOIT_ADMISSION_POLICIES 에 같은 형식의 JSON을 넣어 덮어쓸 수 있습니다.
+ROUTE_POLICIES = {
+    "meeting_matching": (0, 16, 30.0),
+    "general_search": (1, 8, 60.0),
+    "hobby_recommendation": (2, 4, 120.0),
+}
+ROUTE_POLICIES.update({route: tuple(policy) for route, policy in json.loads(os.getenv("MOIT_ADMISSION_POLICIES", "{}")).items()})
+
+# 선택 작업을 시작하려면 남아 있어야 하는 시간(초). MOIT_DEADLINE_RESERVES 에 JSON을 넣어 덮어쓸 수 있습니다.
+#   check_helpfulness: 답변 유용성 LLM 평가 / rewrite_query: 질의 재작성 후 검색-답변-평가 한 바퀴 더
+#   query_variants: 모임 검색 질의 변형 생성 / hobby_photos: 취미 추천 사진 분석 / general_search_answer: 도구 결과로 답변 정리
+OPTIONAL_WORK_RESERVES = {
+    "check_helpfulness": 3.0,
+    "rewrite_query": 10.0,
+    "query_variants": 5.0,
+    "hobby_photos": 20.0,
+    "general_search_answer": 5.0,
+}
+OPTIONAL_WORK_RESERVES.update(json.loads(os.getenv("MOIT_DEADLINE_RESERVES", "{}")))
+
+_request_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("moit_request_started", default=None)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("moit_deadline", default=None)
+_slot_lease: contextvars.ContextVar[Optional["SlotLease"]] = contextvars.ContextVar("moit_slot_lease", default=None)
+
+
+class AdmissionRejected(Exception):
+    """자리를 얻지 못한 요청. reason 은 queue_full(대기열 가득 참) 또는 deadline(마감 전에 차례가 오지 않음)"""
+
+    def __init__(self, route: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{route} 입장 거절 ({reason})")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """마감 시각까지 끝내지 못한 요청"""
+
+
+class ClientDisconnected(Exception):
+    """응답을 기다리던 클라이언트가 연결을 끊은 요청"""
+
+
+def parse_deadline_header(value: Optional[str]) -> Optional[float]:
+    """X-MOIT-Deadline-Ms 헤더 값을 남은 시간(초)으로 바꿉니다. 없거나 잘못된 값이면 None"""
+    if not value:
+        return None
+    try:
+        millis = float(value)
+    except ValueError:
+        logging.warning(f"잘못된 마감 헤더 값을 무시합니다: {value!r}")
+        return None
+    return max(0.0, millis / 1000 - DEADLINE_MARGIN) if millis > 0 else None
+
+
+def start_request(header_value: Optional[str] = None):
+    """요청 시작 시각을 기록하고, 헤더가 있으면 마감 시각을 정합니다. (요청 미들웨어에서 호출)"""
+    now = time.monotonic()
+    _request_started.set(now)
+    seconds = parse_deadline_header(header_value)
+    _deadline.set(now + seconds if seconds is not None else None)
+
+
+def apply_route_default(route: str):
+    """헤더로 마감을 받지 않은 요청에 경로별 기본 마감을 적용합니다. (요청 시작 시각 기준)"""
+    if _deadline.get() is not None:
+        return
+    started = _request_started.get() or time.monotonic()
+    _deadline.set(started + ROUTE_POLICIES.get(route, (1, 0, 60.0))[2] - DEADLINE_MARGIN)
+
+
+def time_left() -> Optional[float]:
+    """마감까지 남은 시간(초). 마감이 없으면 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class SlotLease:
+    """slot() 으로 얻은 자리 하나. 반납 전에 등록된 블로킹 작업이 남아 있으면 반납을 미룹니다."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.pending = []  # concurrent.futures.Future
+        self.released = False
+
+
+class AdmissionController:
+    """경로별 동시 실행 제한과 우선순위 대기열. 이벤트 루프 안에서만 호출합니다."""
+
+    def __init__(self, policies: Dict[str, tuple] = None, capacity: int = None, max_queue: int = None):
+        self.policies = dict(policies or ROUTE_POLICIES)
+        self.capacity = capacity or int(os.getenv("MOIT_ADMISSION_CAPACITY", "16"))
+        self.max_queue = max_queue or int(os.getenv("MOIT_ADMISSION_QUEUE", "64"))
+        self.enabled = os.getenv("MOIT_ADMISSION", "1") == "1"
+        self._active = {route: 0 for route in self.policies}
+        self._total = 0
+        self._waiters = []  # (우선순위, 순번, 경로, future, 대기열 상한 적용 여부)
+        self._seq = 0
+        self._holding = set()  # 블로킹 작업이 끝나기를 기다렸다가 자리를 반납하는 태스크
+        self._lock = threading.Lock()  # 통계 전용
+        self.counts = {route: {"admitted": 0, "queued": 0, "rejected": 0, "expired": 0, "cancelled": 0, "held": 0}
+                       for route in self.policies}
+        self.skipped: Dict[str, int] = {}
+        self.max_wait_seconds = 0.0
+
+    def _policy(self, route: str) -> tuple:
+        return self.policies.get(route, (1, self.capacity, 60.0))
+
+    def _can_run(self, route: str) -> bool:
+        return self._total < self.capacity and self._active.get(route, 0) < self._policy(route)[1]
+
+    def _grant(self, route: str):
+        self._active[route] = self._active.get(route, 0) + 1
+        self._total += 1
+
+    def _record(self, route: str, outcome: str):
+        with self._lock:
+            self.counts.setdefault(route, {"admitted": 0, "queued": 0, "rejected": 0, "expired": 0, "cancelled": 0, "held": 0})
+            self.counts[route][outcome] += 1
+        ADMISSION_EVENTS.labels(route=route, outcome=outcome).inc()
+
+    def _observe_wait(self, route: str, seconds: float):
+        with self._lock:
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        ADMISSION_WAIT.labels(route=route).observe(seconds)
+
+    async def acquire(self, route: str, queue_limit: bool = True):
+        if self._can_run(route):
+            self._grant(route)
+            self._record(route, "admitted")
+            self._observe_wait(route, 0.0)
+            return
+        if queue_limit and sum(1 for waiter in self._waiters if waiter[4] and not waiter[3].done()) >= self.max_queue:
+            self._record(route, "rejected")
+            raise AdmissionRejected(route, "queue_full")
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        self._waiters.append((self._policy(route)[0], self._seq, route, future, queue_limit))
+        self._waiters.sort(key=lambda waiter: waiter[:2])
+        self._record(route, "queued")
+        queued_at = time.perf_counter()
+        left = time_left()
+        try:
+            done, _ = await asyncio.wait({future}, timeout=max(0.0, left) if left is not None else None)
+        except asyncio.CancelledError:
+            # 기다리는 동안 요청이 취소됐습니다. 그 사이 자리를 받았다면 돌려줍니다.
+            if future.done() and not future.cancelled():
+                self.release(route)
+            else:
+                future.cancel()
+            self._record(route, "cancelled")
+            raise
+        if not done:
+            future.cancel()  # _dispatch 가 건너뜁니다.
+            self._record(route, "expired")
+            raise AdmissionRejected(route, "deadline")
+        self._record(route, "admitted")
+        self._observe_wait(route, time.perf_counter() - queued_at)
+
+    def release(self, route: str):
+        self._active[route] -= 1
+        self._total -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """우선순위 순으로 훑으며 지금 실행할 수 있는 대기 요청에 자리를 넘깁니다."""
+        remaining = []
+        for waiter in self._waiters:
+            future, route = waiter[3], waiter[2]
+            if future.done():
+                continue
+            if self._can_run(route):
+                self._grant(route)
+                future.set_result(True)
+            else:
+                remaining.append(waiter)
+        self._waiters = remaining
+
+    @asynccontextmanager
+    async def slot(self, route: str, apply_deadline: bool = True, queue_limit: bool = True):
+        """경로 자리를 얻어 실행합니다. apply_deadline 이면 헤더가 없는 요청에 경로별 기본 마감을 적용합니다.
+        queue_limit=False 면 대기열이 가득 차도 거절하지 않고 자리가 날 때까지 기다립니다. (백그라운드 작업용)"""
+        if apply_deadline:
+            apply_route_default(route)
+        if not self.enabled:
+            yield
+            return
+        await self.acquire(route, queue_limit=queue_limit)
+        lease = SlotLease(route)
+        token = _slot_lease.set(lease)
+        try:
+            yield
+        finally:
+            _slot_lease.reset(token)
+            self._release_lease(lease)
+
+    def _release_lease(self, lease: SlotLease):
+        lease.released = True
+        pending = [future for future in lease.pending if not future.done()]
+        if not pending:
+            self.release(lease.route)
+            return
+        self._record(lease.route, "held")
+        logging.info(f"진행 중인 블로킹 작업 {len(pending)}개가 끝날 때까지 자리를 붙잡아 둡니다: {lease.route}")
+        task = asyncio.ensure_future(self._release_when_done(lease.route, pending))
+        self._holding.add(task)
+        task.add_done_callback(self._holding.discard)
+
+    async def _release_when_done(self, route: str, pending: list):
+        try:
+            await asyncio.wait([asyncio.wrap_future(future) for future in pending])
+        finally:
+            self.release(route)
+
+    def has_time_for(self, work: str) -> bool:
+        """선택 작업을 시작할 시간이 남았는지. 모자라 건너뛰면 통계에 남깁니다."""
+        left = time_left()
+        if left is None or left >= OPTIONAL_WORK_RESERVES.get(work, 0.0):
+            return True
+        with self._lock:
+            self.skipped[work] = self.skipped.get(work, 0) + 1
+        logging.info(f"마감까지 {max(left, 0.0):.1f}초 남아 선택 작업을 건너뜁니다: {work}")
+        return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = {route: dict(values) for route, values in self.counts.items()}
+            skipped = dict(self.skipped)
+            max_wait = self.max_wait_seconds
+        waiting = {}
+        for _, _, route, future, _ in self._waiters:
+            if not future.done():
+                waiting[route] = waiting.get(route, 0) + 1
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "in_use": self._total,
+            "routes": {
+                route: {"priority": policy[0], "limit": policy[1], "default_deadline": policy[2],
+                        "active": self._active.get(route, 0), "waiting": waiting.get(route, 0),
+                        **counts.get(route, {})}
+                for route, policy in self.policies.items()
+            },
+            "skipped_work": skipped,
+            "max_wait_ms": round(max_wait * 1000, 1),
+        }
+
+
+admission = AdmissionController()
+
+
+def has_time_for(work: str) -> bool:
+    return admission.has_time_for(work)
+
+
+def hold_slot_until(future: Future):
+    """지금 자리의 반납을 블로킹 작업 future 가 끝날 때까지 미룹니다. (자리 밖이거나 이미 반납했으면 무시합니다)"""
+    lease = _slot_lease.get()
+    if lease is not None and not lease.released:
+        lease.pending.append(future)
+
+
+async def within_deadline(awaitable: Awaitable):
+    """마감까지만 기다립니다. 시간이 다 되면 작업을 취소하고 DeadlineExceeded 를 냅니다."""
+    left = time_left()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=max(0.0, left))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("마감 시각까지 응답을 만들지 못했습니다.") from None
+
+
+async def run_until_disconnect(request, awaitable: Awaitable, poll_interval: float = None):
+    """클라이언트가 연결을 끊거나 마감이 지나면 실행 중인 작업(과 진행 중인 공급자 호출)을 취소합니다."""
+    poll_interval = poll_interval or float(os.getenv("MOIT_DISCONNECT_POLL_MS", "250")) / 1000
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected("클라이언트가 연결을 끊었습니다.")
+            left = time_left()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("마감 시각까지 응답을 만들지 못했습니다.")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,160 @@
+# backfill.py
+# MySQL meetings 테이블 전체를 벡터 인덱스에 다시 적재하는 CLI
+# 사용법: python backfill.py --chunk-size 100            (중단된 지점부터 이어서)
+#         python backfill.py --reset                       (처음부터 다시)
+#         python backfill.py --reconcile [--dry-run]      (테이블과 인덱스를 비교해 차이만 인덱스 변경 대기열에 넣기)
+
+import argparse
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:     %(message)s')
+
+# 현재 인원은 join_meeting.php 와 같이 참여자 수 + 주최자 1명으로 계산합니다. (meetings 테이블에는 상태 컬럼이 없습니다)
+MEETING_COLUMNS = (
+    "id, title, description, category, location, max_members, meeting_date, meeting_time, "
+    "(SELECT COUNT(*) FROM meeting_participants mp WHERE mp.meeting_id = meetings.id) + 1 AS current_members"
+)
+
+
+def load_checkpoint(path: str) -> int:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return int(json.load(f).get("last_id", 0))
+    return 0
+
+
+def save_checkpoint(path: str, last_id: int, total: int):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "total": total, "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    os.replace(tmp_path, path)
+
+
+def iter_meeting_chunks(connection, after_id: int, chunk_size: int):
+    """id 기준 키셋 페이지네이션으로 meetings 테이블을 청크 단위로 읽어옵니다."""
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {MEETING_COLUMNS} FROM meetings WHERE id > %s ORDER BY id LIMIT %s",
+                (after_id, chunk_size),
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1]["id"]
+
+
+def load_meeting_payloads(connection, chunk_size: int = 500) -> list:
+    """meetings 테이블 전체를 /meetings/add 요청 형식으로 읽어옵니다. (인덱스 대조용)"""
+    from db import meeting_row_to_payload
+
+    return [meeting_row_to_payload(row) for rows in iter_meeting_chunks(connection, 0, chunk_size) for row in rows]
+
+
+def load_meeting_payloads_by_ids(connection, meeting_ids: list, chunk_size: int = 500) -> list:
+    """지정한 모임들만 /meetings/add 요청 형식으로 읽어옵니다. (만료/상태 정리용)"""
+    from db import meeting_row_to_payload
+
+    payloads = []
+    ids = [int(meeting_id) for meeting_id in meeting_ids if str(meeting_id).isdigit()]
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {MEETING_COLUMNS} FROM meetings WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+            payloads.extend(meeting_row_to_payload(row) for row in cursor.fetchall())
+    return payloads
+
+
+def run_reconcile(dry_run: bool = False) -> dict:
+    """테이블과 인덱스의 차이를 인덱스 변경 대기열(index_outbox)에 넣습니다. 실제 반영은 서버의 주기 작업이 맡습니다."""
+    from db import get_db_connection
+    from index_outbox import IndexOutbox, reconcile
+    from resource_pool import registry
+
+    connection = get_db_connection()
+    try:
+        rows = load_meeting_payloads(connection)
+    finally:
+        connection.close()
+    vector_store = registry.get_vector_store()
+    return reconcile(vector_store, IndexOutbox(lambda: vector_store), rows, dry_run=dry_run)
+
+
+def run_backfill(chunk_size: int, checkpoint_path: str, reset: bool = False):
+    from db import get_db_connection, meeting_row_to_payload
+    from meeting_index import STATUS_ENDED, ingest_meetings, meeting_status
+    from resource_pool import registry
+
+    if reset and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    last_id = load_checkpoint(checkpoint_path)
+    if last_id:
+        logging.info(f"체크포인트에서 이어서 진행합니다 (마지막 id: {last_id})")
+
+    vector_store = registry.get_vector_store()
+    # 서버가 write-behind 로 쌓아 둔 변경 중 이번에 적재하는 모임의 것은 버립니다. (나중에 반영되며 덮어쓰지 않도록)
+    outbox = None
+    if os.getenv("MOIT_INDEX_WRITE_BEHIND", "1") == "1":
+        from index_outbox import IndexOutbox
+        outbox = IndexOutbox(lambda: vector_store)
+    connection = get_db_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS remaining FROM meetings WHERE id > %s", (last_id,))
+        remaining = cursor.fetchone()["remaining"]
+    logging.info(f"--- 백필 시작: 남은 모임 {remaining}건, 청크 크기 {chunk_size} ---")
+
+    done = 0
+    start = time.perf_counter()
+    try:
+        for rows in iter_meeting_chunks(connection, last_id, chunk_size):
+            # 이미 지난 모임은 검색 대상이 아니므로 적재하지 않습니다.
+            payloads = [meeting_row_to_payload(row) for row in rows]
+            live = [p for p in payloads if meeting_status(p) != STATUS_ENDED]
+            if outbox is not None and live:
+                outbox.discard([p["meeting_id"] for p in live])
+            result = ingest_meetings(vector_store, live)
+            if hasattr(vector_store, "flush"):
+                # 로컬 인덱스는 스냅샷을 모아서 기록하므로, 체크포인트보다 먼저 디스크에 남깁니다.
+                vector_store.flush()
+            done += len(rows)
+            last_id = rows[-1]["id"]
+            save_checkpoint(checkpoint_path, last_id, done)
+            elapsed = time.perf_counter() - start
+            logging.info(
+                f"진행률 {done}/{remaining} ({done / remaining * 100 if remaining else 100:.1f}%) "
+                f"- 청크 {result['count']}건 {result['seconds']:.2f}s, 누적 처리량 {done / elapsed if elapsed else 0:.1f}건/s"
+            )
+    finally:
+        connection.close()
+        if outbox is not None:
+            outbox.close()
+    logging.info(f"--- 백필 완료: {done}건, {time.perf_counter() - start:.1f}s ---")
+    return done
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="meetings 테이블을 벡터 인덱스로 백필합니다.")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json")
+    parser.add_argument("--reset", action="store_true", help="체크포인트를 지우고 처음부터 다시 적재")
+    parser.add_argument("--reconcile", action="store_true", help="전체 적재 대신 테이블과 인덱스의 차이만 대기열에 넣기")
+    parser.add_argument("--dry-run", action="store_true", help="--reconcile 과 함께: 차이만 보고하고 대기열에는 넣지 않기")
+    args = parser.parse_args()
+    if args.reconcile:
+        print(json.dumps(run_reconcile(dry_run=args.dry_run), ensure_ascii=False, indent=2))
+        return
+    run_backfill(args.chunk_size, args.checkpoint, reset=args.reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,771 @@
+# benchmarks.py
+# 외부 API 호출 없이 돌릴 수 있는 마이크로 벤치마크 모음
+# 사용법: python benchmarks.py graph-build --iterations 50
+#         python benchmarks.py startup --runs 5 --compare startup_baseline.json   (콜드 스타트 회귀 확인)
+#         python benchmarks.py hybrid-retrieval --meetings 1000 --queries 300      (키워드+벡터 / 벡터 단독 검색 비교)
+#         python benchmarks.py micro-batch --requests 400 --concurrency 32         (분류 호출 마이크로 배치 효과)
+#         python benchmarks.py resilience --calls 400 --straggler-rate 0.05        (헤지/재시도/차단기/대체 경로 효과)
+#         python benchmarks.py admission --meetings 15 --background 24             (경로별 입장 제어, 마감 전파 효과)
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Tuple
+
+
+def use_fake_providers():
+    """main 모듈을 import 하기 전에 가짜 공급자 설정을 적용합니다."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+    os.environ.setdefault("PINECONE_INDEX_NAME_MEETING", "moit-benchmark")
+    os.environ.setdefault("MOIT_VECTOR_BACKEND", "fake")
+    os.environ.setdefault("MOIT_EMBEDDING_BACKEND", "fake")
+
+
+def fake_responder(prompt: str) -> str:
+    """프롬프트 종류를 보고 그럴듯한 가짜 LLM 응답을 돌려줍니다."""
+    if '"labels"' in prompt:
+        # 여러 항목을 한 번에 분류하는 배치 프롬프트: 항목마다 단건 프롬프트와 같은 규칙으로 답합니다.
+        items = re.split(r"\[(?:요청|평가 항목) \d+\]", prompt)[1:]
+        if "AI 라우터" in prompt:
+            return json.dumps({"labels": [fake_responder("AI 라우터 [사용자 요청]" + item) for item in items]})
+        return json.dumps({"labels": ["helpful"] * len(items)})
+    if "AI 라우터" in prompt:
+        request = prompt.split("[사용자 요청]")[-1]
+        if "'survey'" in request: return "hobby_recommendation"
+        if "'title'" in request: return "meeting_matching"
+        return "general_search"
+    if "helpful 또는 unhelpful" in prompt:
+        return "helpful"
+    if '"queries"' in prompt:
+        return json.dumps({"queries": ["주말 축구 모임", "풋살 같이 할 사람", "공놀이 동호회"]}, ensure_ascii=False)
+    if '"recommendations"' in prompt and '"helpful"' in prompt:
+        return json.dumps({"helpful": False, "summary": "", "recommendations": []})
+    if "JSON 형식" in prompt:
+        return json.dumps({"summary": "", "recommendations": []})
+    return "주말에 함께 축구할 모임"
+
+
+@dataclass
+class LatencyProfile:
+    """가짜 공급자별 (평균, 표준편차) 지연 시간(초)"""
+    llm: Tuple[float, float] = (0.0, 0.0)
+    gemini: Tuple[float, float] = (0.0, 0.0)
+    embedding: Tuple[float, float] = (0.0, 0.0)
+    vector_store: Tuple[float, float] = (0.0, 0.0)
+    web_search: Tuple[float, float] = (0.0, 0.0)
+    call_tools: bool = False
+    tool_calls_per_turn: int = 1
+    # LLM / Gemini 장애 주입: 일시적 오류(503) 비율, 느린 응답(straggler) 비율과 추가 지연(초)
+    error_rate: float = 0.0
+    straggler_rate: float = 0.0
+    straggler_latency: float = 0.0
+
+    def scaled(self, factor: float) -> "LatencyProfile":
+        scale = lambda pair: (pair[0] * factor, pair[1] * factor)
+        return replace(self, llm=scale(self.llm), gemini=scale(self.gemini), embedding=scale(self.embedding),
+                       vector_store=scale(self.vector_store), web_search=scale(self.web_search),
+                       straggler_latency=self.straggler_latency * factor)
+
+
+def install_fake_providers(profile: LatencyProfile):
+    """LLM / 임베딩 / 벡터 스토어 / Tavily / Gemini 를 모두 지연 시간을 가진 가짜로 바꿉니다. main import 전에 호출해야 합니다."""
+    use_fake_providers()
+    import google.generativeai as genai
+    import httpx
+    import web_search
+    from fake_providers import FakeChatModel, FakeEmbeddings, FakeGenerativeModel, FakeVectorStore, create_stub_search_app
+    from resource_pool import registry
+
+    registry.configure(
+        llm_factory=lambda model: FakeChatModel(
+            responder=fake_responder, latency=profile.llm[0], jitter=profile.llm[1], call_tools=profile.call_tools,
+            tool_calls_per_turn=profile.tool_calls_per_turn, error_rate=profile.error_rate,
+            straggler_rate=profile.straggler_rate, straggler_latency=profile.straggler_latency,
+        ),
+        embeddings_factory=lambda model: FakeEmbeddings(latency=profile.embedding[0], jitter=profile.embedding[1]),
+        vector_store_factory=lambda index_name, embedding: FakeVectorStore(
+            embedding=embedding, latency=profile.vector_store[0], jitter=profile.vector_store[1]
+        ),
+    )
+    FakeGenerativeModel.latency, FakeGenerativeModel.jitter = profile.gemini
+    FakeGenerativeModel.error_rate = profile.error_rate
+    FakeGenerativeModel.straggler_rate, FakeGenerativeModel.straggler_latency = profile.straggler_rate, profile.straggler_latency
+    genai.GenerativeModel = FakeGenerativeModel
+
+    # 웹 검색은 실제 클라이언트 코드 그대로, 네트워크 대신 프로세스 안의 스텁 검색 서버로 보냅니다.
+    from starlette.testclient import TestClient
+    stub_app = create_stub_search_app(*profile.web_search)
+    stub_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app))
+    stub_sync_client = TestClient(stub_app)  # 동기 invoke 경로용 (ASGI 앱을 동기 httpx 클라이언트로 호출)
+    web_search.search_client.api_url = "http://stub-search"
+    web_search.search_client.http_client_getter = lambda: stub_client
+    web_search.search_client.sync_http_client_getter = lambda: stub_sync_client
+
+
+def install_fake_llms(llm_latency: float = 0.0, gemini_latency: float = 0.0):
+    """레지스트리와 genai 모듈에 지연 시간을 가진 가짜 LLM을 끼워 넣습니다. main import 전에 호출해야 합니다."""
+    install_fake_providers(LatencyProfile(llm=(llm_latency, 0.0), gemini=(gemini_latency, 0.0)))
+
+
+SAMPLE_PAYLOADS = {
+    "meeting_matching": {"title": "같이 축구하실 분!", "description": "주말 오전 풋살", "time": "토 10:00", "location": "서울"},
+    "hobby_recommendation": {"survey": {str(q): 3 for q in range(1, 48)}, "image_paths": []},
+    "general_search": {"messages": [["user", "비 오는 주말에 뭐하지?"]]},
+}
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<40} mean={statistics.mean(samples) * 1000:9.3f}ms  p95={p95 * 1000:9.3f}ms  n={len(samples)}")
+
+
+def bench_graph_build(args):
+    """요청마다 그래프/에이전트를 새로 조립하던 비용과, 미리 컴파일된 객체를 재사용하는 비용을 비교합니다."""
+    use_fake_providers()
+    import main
+
+    cases = {
+        "meeting subgraph: build+compile": main.build_meeting_matching_agent,
+        "meeting subgraph: precompiled": lambda: main.meeting_agent,
+        "general search: build tool engine": main.build_general_search_agent,
+        "general search: cached tool engine": main.get_general_search_agent,
+    }
+    for name, fn in cases.items():
+        fn()  # 워밍업
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+
+async def _timed_post(client, payload):
+    start = time.perf_counter()
+    response = await client.post("/agent/invoke", json={"user_input": payload})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _run_concurrency(args):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        singles = {}
+        for route in ("meeting_matching", "hobby_recommendation"):
+            singles[route] = await _timed_post(client, SAMPLE_PAYLOADS[route])
+        slowest = max(singles.values())
+
+        payloads = [SAMPLE_PAYLOADS[("meeting_matching", "hobby_recommendation")[i % 2]] for i in range(args.requests)]
+        start = time.perf_counter()
+        await asyncio.gather(*(_timed_post(client, payload) for payload in payloads))
+        elapsed = time.perf_counter() - start
+
+    serial = sum(singles[("meeting_matching", "hobby_recommendation")[i % 2]] for i in range(args.requests))
+    print("단일 요청 소요 시간: " + ", ".join(f"{route}={t:.3f}s" for route, t in singles.items()))
+    print(f"동시 요청 {args.requests}개: {elapsed:.3f}s (가장 느린 단일 요청 {slowest:.3f}s, 직렬 실행 시 약 {serial:.3f}s)")
+    ok = elapsed <= slowest * args.tolerance
+    print("PASS" if ok else "FAIL", f"(허용 배수 {args.tolerance})")
+    return ok
+
+
+def bench_concurrency(args):
+    """N개의 동시 /agent/invoke 요청이 가장 느린 단일 요청과 비슷한 시간 안에 끝나는지 확인합니다."""
+    install_fake_llms(llm_latency=args.llm_latency, gemini_latency=args.gemini_latency)
+    if not asyncio.run(_run_concurrency(args)):
+        raise SystemExit(1)
+
+
+async def _run_meeting_modes(args):
+    import main
+
+    results = {}
+    for mode in ("loop", "fusion"):
+        samples, answers = [], []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            result = await main.master_agent.ainvoke(
+                {"user_input": SAMPLE_PAYLOADS["meeting_matching"]}, {"configurable": {"meeting_mode": mode}}
+            )
+            samples.append(time.perf_counter() - start)
+            answers.append(result.get("final_answer"))
+        report(f"meeting matching ({mode})", samples)
+        results[mode] = answers
+    return results
+
+
+def bench_meeting_modes(args):
+    """모임 매칭 loop 모드와 fusion 모드의 지연 시간을 같은 가짜 LLM 지연 조건에서 비교합니다."""
+    install_fake_llms(llm_latency=args.llm_latency)
+    asyncio.run(_run_meeting_modes(args))
+
+
+async def _run_general_search(args):
+    import main
+
+    engine = main.get_general_search_agent()
+    question = {"input": SAMPLE_PAYLOADS["general_search"]["messages"][0][1]}
+    for parallel in (False, True):
+        engine.parallel = parallel
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            result = await engine.ainvoke(question)
+            samples.append(time.perf_counter() - start)
+        report(f"general search ({'parallel' if parallel else 'sequential'} tools)", samples)
+    print(f"마지막 실행 도구: {[(step['tool'], step['status']) for step in result['intermediate_steps']]}, 부분 답변: {result['partial']}")
+    print(f"엔진 통계: {engine.stats.snapshot()}")
+
+
+def bench_general_search(args):
+    """한 턴에 도구 여러 개를 호출하는 복합 질문에서 도구 순차 실행과 동시 실행의 지연 시간을 비교합니다."""
+    install_fake_providers(LatencyProfile(
+        llm=(args.llm_latency, 0.0), web_search=(args.search_latency, 0.0), vector_store=(args.vector_latency, 0.0),
+        call_tools=True, tool_calls_per_turn=3,
+    ))
+    # 같은 질의를 반복하므로 웹 검색 캐시를 끄고 도구 실행 방식만 비교합니다.
+    os.environ.setdefault("MOIT_WEB_CACHE", "0")
+    if args.web_search_timeout:
+        os.environ["MOIT_WEB_SEARCH_TIMEOUT"] = str(args.web_search_timeout)
+    asyncio.run(_run_general_search(args))
+
+
+HYBRID_ACTIVITIES = ["축구", "풋살", "배드민턴", "등산", "독서", "보드게임", "요가", "러닝", "사진", "와인",
+                     "영어회화", "코딩", "볼링", "테니스", "클라이밍"]
+HYBRID_STYLES = ["초보 환영", "직장인", "주말 아침", "평일 저녁", "대학생", "20대", "30대", "가족과 함께"]
+HYBRID_PLACES = ["한강", "홍대", "강남", "성수", "판교", "잠실", "신촌", "을지로", "수원", "일산"]
+
+
+def make_hybrid_corpus(count: int, rng):
+    """(모임 목록, [(질의, 정답 meeting_id, 질의 종류)]) 를 만듭니다. 질의는 제목 키워드형과 풀어 쓴 문장형을 섞습니다.
+    정답이 하나로 정해지도록 (활동, 성격, 장소) 조합은 겹치지 않게 뽑습니다."""
+    import itertools
+
+    combos = list(itertools.product(HYBRID_ACTIVITIES, HYBRID_STYLES, HYBRID_PLACES))
+    start = time.time() + 86400
+    meetings, queries = [], []
+    for i, (activity, style, place) in enumerate(rng.sample(combos, min(count, len(combos)))):
+        meetings.append({
+            "meeting_id": str(i + 1),
+            "title": f"{place} {style} {activity} 모임",
+            "description": f"{place} 근처에서 {style} {activity} 같이 해요",
+            "time": time.strftime("%Y-%m-%d %H:%M", time.localtime(start + rng.randint(0, 60) * 86400)),
+            "location": "서울",
+        })
+        queries.append((f"{place}{style.replace(' ', '')} {activity}", str(i + 1), "keyword"))
+        queries.append((f"{style}끼리 {place}에서 {activity} 하는 모임 있나요", str(i + 1), "paraphrase"))
+    return meetings, queries
+
+
+async def _run_hybrid_retrieval(args):
+    import random
+    import main
+    from meeting_index import aingest_meetings
+    from lexical_index import meeting_lexical_index
+    from resource_pool import registry
+
+    rng = random.Random(args.seed)
+    meetings, queries = make_hybrid_corpus(args.meetings, rng)
+    queries = rng.sample(queries, min(args.queries, len(queries)))
+    vector_store = registry.get_vector_store(main.get_meeting_index_name())
+    for i in range(0, len(meetings), 500):
+        await aingest_meetings(vector_store, meetings[i:i + 500])
+    meeting_lexical_index.rebuild({})
+    meeting_lexical_index.upsert_meetings(meetings)
+
+    retriever = main.MeetingSearchRetriever(search_kwargs={"k": args.k})
+    for enabled in (False, True):
+        main.LEXICAL_SEARCH_ENABLED = enabled
+        before = meeting_lexical_index.snapshot()["strong_hits"]
+        samples, found = [], {"keyword": [], "paraphrase": []}
+        for query, expected, kind in queries:
+            start = time.perf_counter()
+            docs = await retriever.ainvoke(query)
+            samples.append(time.perf_counter() - start)
+            found[kind].append(expected in [doc.metadata["meeting_id"] for doc in docs])
+        name = "hybrid (bm25 + vector)" if enabled else "vector only"
+        report(name, samples)
+        recall = {kind: sum(hits) / len(hits) for kind, hits in found.items() if hits}
+        skipped = meeting_lexical_index.snapshot()["strong_hits"] - before
+        print(f"{'':<40} recall@{args.k}: " + ", ".join(f"{kind}={value:.3f}" for kind, value in recall.items())
+              + f", 임베딩 생략 {skipped}/{len(queries)}")
+
+
+def bench_hybrid_retrieval(args):
+    """키워드(BM25) + 벡터 혼합 검색과 벡터 단독 검색의 recall@k 와 지연 시간을 같은 코퍼스에서 비교합니다."""
+    install_fake_providers(LatencyProfile(
+        embedding=(args.embedding_latency, 0.0), vector_store=(args.vector_latency, 0.0),
+    ))
+    os.environ.setdefault("MOIT_WARMUP", "0")
+    asyncio.run(_run_hybrid_retrieval(args))
+
+
+async def _run_micro_batch(args):
+    import random
+    import main
+    from resource_pool import registry
+
+    # 공급자(가짜 LLM) 호출 수를 셉니다. 배치 호출 하나는 항목 수와 상관없이 한 번입니다.
+    provider_calls = {"count": 0}
+    model = registry.get_llm("gpt-4o-mini")
+    responder = model.responder
+
+    def counting_responder(prompt):
+        provider_calls["count"] += 1
+        return responder(prompt)
+    model.responder = counting_responder
+
+    rng = random.Random(args.seed)
+    questions = ["비 오는 주말에 뭐하지?", "요즘 볼만한 전시 있어?", "혼자 할 만한 거 추천해줘", "내일 등산 가도 될까?"]
+    work = [
+        ("router", {"messages": [["user", f"{rng.choice(questions)} ({i})"]]}) if rng.random() < 0.5
+        else ("helpfulness", {"query": f"주말 축구 모임 {i}", "answer": '{"summary": "축구 모임은 어떠세요?"}'})
+        for i in range(args.requests)
+    ]
+
+    async def classify(kind, payload):
+        if kind == "router":
+            return await main.tiered_router.llm_chain.ainvoke({"user_input": payload})
+        return (await main.check_helpfulness({**payload, "rewrite_count": 0}))["decision"]
+
+    for enabled in (False, True):
+        for batcher in (main.router_batcher, main.helpfulness_batcher):
+            batcher.enabled = enabled
+            batcher.max_wait = args.max_wait_ms / 1000
+            batcher.max_batch = args.max_batch
+        provider_calls["count"] = 0
+        queue = list(work)
+        samples = []
+
+        async def worker():
+            while queue:
+                kind, payload = queue.pop()
+                # 요청 사이 간격을 흉내 냅니다. (다른 처리 단계를 거쳐 분류 호출에 도착하는 시점이 흩어지도록)
+                await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+                start = time.perf_counter()
+                await classify(kind, payload)
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+        report(f"classification ({'micro-batch' if enabled else 'single calls'})", samples)
+        print(f"{'':<40} 공급자 호출 {provider_calls['count']}회 / 분류 {len(samples)}건, "
+              f"공급자 요청률 {provider_calls['count'] / wall:.1f}/s, 처리량 {len(samples) / wall:.1f}건/s")
+    print(f"배처 통계: {json.dumps({'router': main.router_batcher.stats.snapshot(), 'helpfulness': main.helpfulness_batcher.stats.snapshot()}, ensure_ascii=False)}")
+
+
+def bench_micro_batch(args):
+    """라우터/유용성 평가 같은 한 단어 분류 호출을 동시 부하에서 단건 호출할 때와 마이크로 배치할 때를 비교합니다."""
+    install_fake_providers(LatencyProfile(llm=(args.llm_latency, args.llm_jitter)))
+    os.environ.setdefault("MOIT_WARMUP", "0")
+    asyncio.run(_run_micro_batch(args))
+
+
+def _percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+async def _run_resilience(args):
+    import main
+    import resource_pool
+    from fake_providers import FakeChatModel, FakeGenerativeModel
+    from provider_guard import provider_guards
+    from resource_pool import registry
+
+    async def drive(call, calls):
+        """call() 을 동시성 args.concurrency 로 calls 번 실행하고 (지연 목록, 실패 수, 경과 시간) 을 반환합니다."""
+        queue = list(range(calls))
+        samples, failures = [], 0
+
+        async def worker():
+            nonlocal failures
+            while queue:
+                queue.pop()
+                start = time.perf_counter()
+                try:
+                    await call()
+                except Exception:
+                    failures += 1
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return samples, failures, time.perf_counter() - start
+
+    def summary(name, samples, failures, calls, provider):
+        stats = provider_guards.snapshot()["providers"].get(provider, {})
+        print(f"{name:<34} p50={_percentile(samples, 0.5) * 1000:7.0f}ms  p95={_percentile(samples, 0.95) * 1000:7.0f}ms  "
+              f"p99={_percentile(samples, 0.99) * 1000:7.0f}ms  실패 {failures}/{calls}")
+        if stats:
+            print(f"{'':<34} 헤지 {stats['hedges']}회(이김 {stats['hedge_wins']}), 재시도 {stats['retries']}회, "
+                  f"차단 {stats['short_circuits']}회, 대체 {stats['fallbacks']}회, 차단기 {stats['breaker']['state']}")
+
+    # 1. 느린 응답(straggler) + 일시적 오류: 호출 계층 없이 / 있을 때
+    llm = registry.lazy_llm("gpt-4o-mini")
+    print(f"[꼬리 지연] LLM {args.llm_latency * 1000:.0f}ms, straggler {args.straggler_rate:.0%} (+{args.straggler_latency:.1f}s), "
+          f"오류 {args.error_rate:.0%}")
+    for enabled in (False, True):
+        provider_guards.reset()
+        provider_guards.enabled = enabled
+        samples, failures, _ = await drive(lambda: llm.ainvoke("주말에 뭐하지?"), args.calls)
+        summary("LLM (호출 계층 " + ("켬)" if enabled else "끔)"), samples, failures, args.calls, "llm:gpt-4o-mini")
+
+    # 2. 기본 모델 장애: 차단기가 열리면 바로 대체 모델로 넘깁니다.
+    print("[공급자 장애] gpt-4o-mini 전부 503, 대체 모델 gpt-4o")
+    registry.configure(llm_factory=lambda model: FakeChatModel(
+        responder=fake_responder, latency=args.llm_latency, jitter=args.llm_jitter,
+        error_rate=1.0 if model == "gpt-4o-mini" else 0.0,
+    ))
+    resource_pool.LLM_FALLBACKS["gpt-4o-mini"] = ["gpt-4o"]
+    llm_with_fallback = registry.lazy_llm("gpt-4o-mini")
+    for enabled in (False, True):
+        provider_guards.reset()
+        provider_guards.enabled = enabled
+        samples, failures, _ = await drive(lambda: llm_with_fallback.ainvoke("주말에 뭐하지?"), args.calls // 4)
+        summary("LLM 장애 (호출 계층 " + ("켬)" if enabled else "끔)"), samples, failures, args.calls // 4, "llm:gpt-4o-mini")
+
+    # 3. Gemini 장애: analyze_photo_tool 이 OpenAI 비전 모델로 대체되는지 확인합니다.
+    print("[Gemini 장애] gemini-2.5-flash 전부 503, 대체 모델 " + (main.HOBBY_FALLBACK_MODEL or "없음"))
+    registry.configure(llm_factory=lambda model: FakeChatModel(responder=lambda prompt: f"[{model}] 추천 결과", latency=args.llm_latency))
+    FakeGenerativeModel.error_rate = 1.0
+    profile = main.analyze_survey_responses({str(q): 3 for q in range(1, 48)})
+    for enabled in (False, True):
+        provider_guards.reset()
+        provider_guards.enabled = enabled
+        results = []
+
+        async def recommend():
+            result = await registry.run_blocking(main.analyze_photo_tool.invoke, {"image_paths": [], "survey_profile": profile})
+            results.append(result)
+            if result.startswith("오류"):
+                raise RuntimeError(result)
+
+        samples, failures, _ = await drive(recommend, args.calls // 8)
+        summary("취미 추천 (호출 계층 " + ("켬)" if enabled else "끔)"), samples, failures, args.calls // 8, "gemini:gemini-2.5-flash")
+        if results:
+            print(f"{'':<34} 응답 예: {results[-1][:60]}")
+    FakeGenerativeModel.error_rate = 0.0
+    print(f"공급자 통계: {json.dumps(provider_guards.snapshot(), ensure_ascii=False)}")
+
+
+def bench_resilience(args):
+    """느린 응답/일시적 오류/공급자 장애를 주입한 가짜 공급자로 헤지, 백오프 재시도, 회로 차단기, 대체 경로의 효과를 잽니다."""
+    os.environ.setdefault("MOIT_BREAKER_COOLDOWN", "60")
+    install_fake_providers(LatencyProfile(
+        llm=(args.llm_latency, args.llm_jitter), gemini=(args.llm_latency, args.llm_jitter), error_rate=args.error_rate,
+        straggler_rate=args.straggler_rate, straggler_latency=args.straggler_latency,
+    ))
+    os.environ.setdefault("MOIT_WARMUP", "0")
+    asyncio.run(_run_resilience(args))
+
+
+async def _run_admission(args):
+    import httpx
+    import main
+    from admission import admission
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=180) as client:
+        async def invoke(payload, headers=None):
+            start = time.perf_counter()
+            response = await client.post("/agent/invoke", json={"user_input": payload}, headers=headers or {})
+            return response.status_code, time.perf_counter() - start
+
+        # 1. 범용 검색 + 취미 추천이 몰릴 때 모임 매칭 지연: 입장 제어 끔 / 켬
+        # 뒤에 돌린 쪽이 불리하지 않도록 끔/켬을 번갈아 args.rounds 번씩 돌려 합칩니다.
+        print(f"[혼합 부하] 공급자 동시 처리 {args.upstream_limit}개, 배경 요청 {args.background}개 동시 (범용 검색:취미 추천 = 3:1)")
+        results = {False: ([], {"ok": 0, "rejected": 0, "other": 0}), True: ([], {"ok": 0, "rejected": 0, "other": 0})}
+        for enabled in (False, True) * args.rounds:
+            admission.enabled = enabled
+            stop = asyncio.Event()
+            samples, background = results[enabled]
+
+            async def flood(worker_id):
+                i = 0
+                while not stop.is_set():
+                    i += 1
+                    if worker_id % 4 == 3:
+                        payload = SAMPLE_PAYLOADS["hobby_recommendation"]
+                    else:
+                        payload = {"messages": [["user", f"비 오는 주말에 뭐하지? ({worker_id}-{i})"]]}
+                    status, _ = await invoke(payload)
+                    key = "ok" if status == 200 else "rejected" if status == 503 else "other"
+                    background[key] += 1
+
+            async def probe():
+                for i in range(args.meetings):
+                    await asyncio.sleep(args.meeting_interval)
+                    payload = {**SAMPLE_PAYLOADS["meeting_matching"], "description": f"주말 오전 풋살 {i}"}
+                    status, elapsed = await invoke(payload, {"X-MOIT-Deadline-Ms": "30000"})
+                    if status == 200:
+                        samples.append(elapsed)
+
+            flooders = [asyncio.ensure_future(flood(worker_id)) for worker_id in range(args.background)]
+            await probe()
+            stop.set()
+            await asyncio.gather(*flooders)
+        for enabled, (samples, background) in results.items():
+            print(f"입장 제어 {'켬' if enabled else '끔'}: 모임 매칭 p50={_percentile(samples, 0.5) * 1000:7.0f}ms  "
+                  f"p95={_percentile(samples, 0.95) * 1000:7.0f}ms  성공 {len(samples)}/{args.meetings * args.rounds}  "
+                  f"배경 요청 성공 {background['ok']} / 503 {background['rejected']} / 기타 {background['other']}")
+
+        # 2. 마감 헤더: 마감이 가까우면 유용성 평가/질의 재작성 루프를 건너뜁니다. (loop 모드)
+        admission.enabled = True
+        main.MEETING_MODE = "loop"
+        print(f"[마감 전파] 모임 매칭 loop 모드, LLM {args.llm_latency * 1000:.0f}ms")
+        for deadline_ms in (None, args.deadline_ms):
+            skipped_before = dict(admission.snapshot()["skipped_work"])
+            samples, statuses = [], {}
+            for i in range(args.deadline_requests):
+                payload = {**SAMPLE_PAYLOADS["meeting_matching"], "description": f"평일 저녁 풋살 {i}"}
+                status, elapsed = await invoke(payload, {"X-MOIT-Deadline-Ms": str(deadline_ms)} if deadline_ms else None)
+                statuses[status] = statuses.get(status, 0) + 1
+                samples.append(elapsed)
+            skipped = {work: count - skipped_before.get(work, 0) for work, count in admission.snapshot()["skipped_work"].items()}
+            print(f"마감 {str(deadline_ms) + 'ms' if deadline_ms else '없음':<10} p50={_percentile(samples, 0.5) * 1000:7.0f}ms  "
+                  f"p95={_percentile(samples, 0.95) * 1000:7.0f}ms  상태 {statuses}  건너뛴 작업 {skipped}")
+    print(f"입장 제어 통계: {json.dumps(admission.snapshot(), ensure_ascii=False)}")
+
+
+def bench_admission(args):
+    """공급자 동시 처리 한도가 있는 가짜 공급자로 경로별 입장 제어(모임 매칭 우선)와 마감 전파(선택 작업 생략)의 효과를 잽니다."""
+    install_fake_providers(LatencyProfile(llm=(args.llm_latency, args.llm_jitter), gemini=(args.gemini_latency, 0.0)))
+    from fake_providers import FakeChatModel
+    from resource_pool import registry
+
+    # 공급자 쪽 동시 처리 한도(조직 단위 rate limit)를 흉내 냅니다. 한도를 넘는 호출은 도착 순서대로 기다립니다.
+    upstream = asyncio.Semaphore(args.upstream_limit)
+
+    class UpstreamLimitedChatModel(FakeChatModel):
+        async def _agenerate(self, *call_args, **kwargs):
+            async with upstream:
+                return await super()._agenerate(*call_args, **kwargs)
+
+    registry.configure(llm_factory=lambda model: UpstreamLimitedChatModel(
+        responder=fake_responder, latency=args.llm_latency, jitter=args.llm_jitter,
+    ))
+    os.environ.setdefault("MOIT_WARMUP", "0")
+    os.environ.setdefault("MOIT_HOBBY_CACHE", "0")  # 같은 설문이 반복되므로 캐시를 끄고 매번 생성합니다.
+    asyncio.run(_run_admission(args))
+
+
+def bench_survey(args):
+    """설문 N건을 한 건씩 분석하는 경로와 배치 엔진의 처리 시간을 비교합니다."""
+    import numpy as np
+    import survey_engine
+
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(1, 6, size=(survey_engine.N_QUESTIONS, args.surveys)).astype(np.float64)
+    matrix[rng.random(matrix.shape) < args.missing_rate] = np.nan
+    responses = [
+        {str(q + 1): int(v) for q, v in enumerate(column) if v == v}
+        for column in matrix.T
+    ]
+
+    # 한 건씩 처리하는 경로는 표본으로 측정해 전체 시간으로 환산합니다.
+    sample = responses[:min(args.sample, len(responses))]
+    start = time.perf_counter()
+    singles = [survey_engine.analyze_survey(response) for response in sample]
+    per_survey = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    parsed = survey_engine.responses_to_matrix(responses)
+    parse_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    columns = survey_engine.compute_feature_columns(parsed)
+    compute_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    profiles = survey_engine.columns_to_profiles(columns)
+    materialize_seconds = time.perf_counter() - start
+
+    assert profiles[:len(singles)] == singles, "배치 결과가 단건 결과와 다릅니다"
+    batch_total = parse_seconds + compute_seconds + materialize_seconds
+    print(f"설문 {args.surveys:,}건 (빈 응답 비율 {args.missing_rate:.0%})")
+    print(f"{'단건 반복 (환산)':<28} {per_survey * args.surveys:8.3f}s  ({per_survey * 1e6:.1f}us/건, 표본 {len(sample):,}건)")
+    print(f"{'배치: 행렬 변환':<28} {parse_seconds:8.3f}s")
+    print(f"{'배치: 항목 계산 (벡터화)':<28} {compute_seconds:8.3f}s  ({args.surveys / compute_seconds:,.0f}건/s)")
+    print(f"{'배치: 프로필 딕셔너리 생성':<28} {materialize_seconds:8.3f}s")
+    print(f"{'배치 합계':<28} {batch_total:8.3f}s  (단건 대비 {per_survey * args.surveys / batch_total:.1f}배)")
+
+
+# import 시점에 로드되면 안 되는 공급자 모듈 (워밍업 또는 해당 경로에서 처음 쓰일 때 import)
+LAZY_PROVIDER_MODULES = ("langchain_openai", "langchain_pinecone", "google.generativeai", "langchain.agents",
+                         "langchain_community.tools.tavily_search")
+
+
+def bench_startup_probe(args):
+    """새 프로세스 하나에서 main import 시간, 워밍업 시간, 첫 성공 응답까지의 시간을 재서 JSON 한 줄로 출력합니다."""
+    start = time.perf_counter()
+    import main
+    import_seconds = time.perf_counter() - start
+    eager = [name for name in LAZY_PROVIDER_MODULES if name in sys.modules]
+
+    # 공급자 클라이언트는 아직 만들어지지 않았으므로 import 뒤에 가짜로 바꿔 끼워도 됩니다.
+    install_fake_providers(LatencyProfile())
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        deadline = time.perf_counter() + 60
+        while client.get("/readyz").status_code != 200:
+            if time.perf_counter() > deadline:
+                raise SystemExit("워밍업이 60초 안에 끝나지 않았습니다.")
+            time.sleep(0.01)
+        response = client.post("/agent/invoke", json={"user_input": SAMPLE_PAYLOADS["meeting_matching"]})
+        response.raise_for_status()
+    print(json.dumps({
+        "import_seconds": import_seconds,
+        "warmup_seconds": main.readiness["warmup_seconds"],
+        "first_request_seconds": main.readiness["first_success_seconds"],
+        "eager_provider_modules": eager,
+    }))
+
+
+def bench_startup(args):
+    """콜드 스타트 지표를 새 프로세스에서 --runs 번 재고 중앙값을 기준선과 비교합니다. (CI 회귀 확인용)"""
+    runs = []
+    for _ in range(args.runs):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "startup-probe"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if completed.returncode != 0:
+            print(completed.stderr)
+            raise SystemExit(completed.returncode)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    metrics = ("import_seconds", "warmup_seconds", "first_request_seconds")
+    result = {name: statistics.median(run[name] for run in runs) for name in metrics}
+    result["eager_provider_modules"] = sorted({name for run in runs for name in run["eager_provider_modules"]})
+    result["runs"] = args.runs
+    result["created_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    for name in metrics:
+        print(f"{name:<24} median={result[name] * 1000:9.1f}ms  "
+              f"min={min(run[name] for run in runs) * 1000:9.1f}ms  max={max(run[name] for run in runs) * 1000:9.1f}ms")
+
+    ok = not result["eager_provider_modules"]
+    if not ok:
+        print(f"import 시점에 로드된 공급자 모듈: {result['eager_provider_modules']}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"기준선 저장: {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n기준선({baseline.get('created_at')}) 대비 (허용 배수 {args.tolerance})")
+        for name in metrics:
+            ratio = result[name] / baseline[name] if baseline.get(name) else 1.0
+            regressed = ratio > args.tolerance
+            ok = ok and not regressed
+            print(f"{name:<24} {baseline[name] * 1000:.1f} -> {result[name] * 1000:.1f}ms ({(ratio - 1) * 100:+.1f}%)"
+                  f"{'  <- 회귀' if regressed else ''}")
+    if not ok:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MOIT AI 서버 마이크로 벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    graph_build = sub.add_parser("graph-build", help="그래프 컴파일 비용 비교")
+    graph_build.add_argument("--iterations", type=int, default=50)
+    graph_build.set_defaults(func=bench_graph_build)
+
+    concurrency = sub.add_parser("concurrency", help="/agent/invoke 동시 처리 확인")
+    concurrency.add_argument("--requests", type=int, default=8)
+    concurrency.add_argument("--llm-latency", type=float, default=0.2)
+    concurrency.add_argument("--gemini-latency", type=float, default=1.0)
+    concurrency.add_argument("--tolerance", type=float, default=1.5)
+    concurrency.set_defaults(func=bench_concurrency)
+
+    meeting_modes = sub.add_parser("meeting-modes", help="모임 매칭 loop / fusion 모드 지연 비교")
+    meeting_modes.add_argument("--iterations", type=int, default=5)
+    meeting_modes.add_argument("--llm-latency", type=float, default=0.5)
+    meeting_modes.set_defaults(func=bench_meeting_modes)
+
+    general_search = sub.add_parser("general-search", help="범용 검색 도구 순차 / 동시 실행 지연 비교")
+    general_search.add_argument("--iterations", type=int, default=5)
+    general_search.add_argument("--llm-latency", type=float, default=0.3)
+    general_search.add_argument("--search-latency", type=float, default=1.0)
+    general_search.add_argument("--vector-latency", type=float, default=0.4)
+    general_search.add_argument("--web-search-timeout", type=float, help="지정하면 웹 검색 제한 시간을 바꿔 부분 답변 경로를 확인")
+    general_search.set_defaults(func=bench_general_search)
+
+    survey = sub.add_parser("survey", help="설문 프로필 단건 / 배치 엔진 처리량 비교")
+    survey.add_argument("--surveys", type=int, default=100_000)
+    survey.add_argument("--sample", type=int, default=5_000)
+    survey.add_argument("--missing-rate", type=float, default=0.05)
+    survey.set_defaults(func=bench_survey)
+
+    hybrid = sub.add_parser("hybrid-retrieval", help="키워드+벡터 혼합 검색 / 벡터 단독 검색 recall, 지연 비교")
+    hybrid.add_argument("--meetings", type=int, default=1000)
+    hybrid.add_argument("--queries", type=int, default=300)
+    hybrid.add_argument("--k", type=int, default=3)
+    hybrid.add_argument("--embedding-latency", type=float, default=0.05)
+    hybrid.add_argument("--vector-latency", type=float, default=0.08)
+    hybrid.add_argument("--seed", type=int, default=7)
+    hybrid.set_defaults(func=bench_hybrid_retrieval)
+
+    micro_batch = sub.add_parser("micro-batch", help="분류 LLM 호출 단건 / 마이크로 배치 공급자 요청률, 지연 비교")
+    micro_batch.add_argument("--requests", type=int, default=400)
+    micro_batch.add_argument("--concurrency", type=int, default=32)
+    micro_batch.add_argument("--llm-latency", type=float, default=0.3)
+    micro_batch.add_argument("--llm-jitter", type=float, default=0.1)
+    micro_batch.add_argument("--think-time", type=float, default=0.05, help="요청 사이 평균 간격(초, 지수 분포)")
+    micro_batch.add_argument("--max-wait-ms", type=float, default=10)
+    micro_batch.add_argument("--max-batch", type=int, default=8)
+    micro_batch.add_argument("--seed", type=int, default=7)
+    micro_batch.set_defaults(func=bench_micro_batch)
+
+    resilience = sub.add_parser("resilience", help="헤지/재시도/회로 차단기/대체 경로의 꼬리 지연, 실패율 비교")
+    resilience.add_argument("--calls", type=int, default=400)
+    resilience.add_argument("--concurrency", type=int, default=16)
+    resilience.add_argument("--llm-latency", type=float, default=0.2)
+    resilience.add_argument("--llm-jitter", type=float, default=0.03)
+    resilience.add_argument("--straggler-rate", type=float, default=0.05)
+    resilience.add_argument("--straggler-latency", type=float, default=2.0)
+    resilience.add_argument("--error-rate", type=float, default=0.03)
+    resilience.set_defaults(func=bench_resilience)
+
+    admission = sub.add_parser("admission", help="혼합 부하에서 경로별 입장 제어 / 마감 헤더 효과 비교")
+    admission.add_argument("--meetings", type=int, default=15)
+    admission.add_argument("--meeting-interval", type=float, default=0.05)
+    admission.add_argument("--background", type=int, default=24)
+    admission.add_argument("--rounds", type=int, default=2)
+    admission.add_argument("--upstream-limit", type=int, default=12)
+    admission.add_argument("--llm-latency", type=float, default=1.0)
+    admission.add_argument("--llm-jitter", type=float, default=0.1)
+    admission.add_argument("--gemini-latency", type=float, default=1.0)
+    admission.add_argument("--deadline-ms", type=int, default=3000)
+    admission.add_argument("--deadline-requests", type=int, default=10)
+    admission.set_defaults(func=bench_admission)
+
+    startup = sub.add_parser("startup", help="콜드 스타트(import / 워밍업 / 첫 성공 응답) 시간 측정 및 기준선 비교")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--save", help="결과를 기준선 JSON 으로 저장")
+    startup.add_argument("--compare", help="기준선 JSON 과 비교해 회귀 시 종료 코드 1")
+    startup.add_argument("--tolerance", type=float, default=1.3)
+    startup.set_defaults(func=bench_startup)
+
+    startup_probe = sub.add_parser("startup-probe", help="(startup 내부용) 단일 프로세스 측정")
+    startup_probe.set_defaults(func=bench_startup_probe)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
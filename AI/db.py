@@ -0,0 +1,51 @@
+# db.py
+# PHP 쪽(config.php)과 같은 MySQL(moit_db)에 접속하기 위한 헬퍼
+
+import os
+
+
+def get_db_connection():
+    """moit_db 에 대한 pymysql 커넥션을 반환합니다. 접속 정보는 환경 변수로 덮어쓸 수 있습니다."""
+    import pymysql
+
+    return pymysql.connect(
+        host=os.getenv("MOIT_DB_HOST", "localhost"),
+        port=int(os.getenv("MOIT_DB_PORT", "3306")),
+        user=os.getenv("MOIT_DB_USER", "moit_user"),
+        password=os.getenv("MOIT_DB_PASS", "password"),
+        database=os.getenv("MOIT_DB_NAME", "moit_db"),
+        charset="utf8mb4",
+        cursorclass=pymysql.cursors.DictCursor,
+    )
+
+
+def meeting_row_to_payload(row: dict) -> dict:
+    """meetings 테이블의 한 행을 /meetings/add 요청과 같은 형식으로 바꿉니다. (create_meeting.php 와 동일한 규칙)"""
+    meeting_date = row.get("meeting_date")
+    meeting_time = row.get("meeting_time")
+    return {
+        "meeting_id": str(row["id"]),
+        "title": row["title"],
+        "description": row["description"],
+        "time": f"{meeting_date or ''} {meeting_time or ''}".strip(),
+        "location": row.get("location") or "",
+        "category": row.get("category") or "",
+        "max_members": row.get("max_members"),
+        "current_members": row.get("current_members"),
+    }
+
+
+def save_hobby_recommendation(user_id: str, recommendation_text: str) -> int:
+    """취미 추천 결과를 ai_hobby_recommendations 에 저장하고 새 행의 id를 반환합니다. (get_ai_recommendation.php 와 같은 테이블)"""
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO ai_hobby_recommendations (user_id, recommendation_text) VALUES (%s, %s)",
+                (user_id, recommendation_text),
+            )
+            recommendation_id = cursor.lastrowid
+        connection.commit()
+        return recommendation_id
+    finally:
+        connection.close()
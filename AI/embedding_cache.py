@@ -0,0 +1,213 @@
+# embedding_cache.py
+# 임베딩 결과를 (모델 + 텍스트 해시) 기준으로 재사용하는 2단 캐시
+#   - 메모리 계층: 크기 제한 LRU
+#   - 디스크 계층: SQLite, 벡터는 float32 바이트로 압축 저장 (3072차원 = 12KB)
+#       MOIT_EMBED_CACHE_DISK_SIZE 행을 넘으면 오래 저장된 것부터 지웁니다. 비동기 경로에서는 스레드 풀에서 읽고 씁니다.
+
+import os
+import array
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+# 상대 경로는 작업 디렉터리가 아니라 이 모듈이 있는 디렉터리 기준입니다.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array.array('f', vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    values = array.array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """임베딩 함수를 감싸 같은 문자열을 다시 임베딩하지 않도록 합니다."""
+
+    def __init__(self, underlying: Embeddings, model: str, max_entries: int = None, db_path: str = None,
+                 max_disk_entries: int = None, run_blocking: Optional[Callable[..., Awaitable]] = None):
+        self.underlying = underlying
+        self.model = model
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("MOIT_EMBED_CACHE_SIZE", "10000"))
+        self.max_disk_entries = max_disk_entries if max_disk_entries is not None else int(os.getenv("MOIT_EMBED_CACHE_DISK_SIZE", "20000"))
+        db_path = db_path if db_path is not None else os.getenv("MOIT_EMBED_CACHE_PATH", "embedding_cache.sqlite3")
+        self.db_path = os.path.join(BASE_DIR, db_path) if db_path else db_path
+        # 비동기 경로에서 SQLite 를 읽고 쓸 곳. (기본: asyncio 기본 스레드 풀)
+        self.run_blocking = run_blocking or asyncio.to_thread
+        self._lock = threading.Lock()  # 메모리 계층과 통계
+        self._db_lock = threading.Lock()  # SQLite 연결 (메모리 조회가 디스크 I/O 를 기다리지 않도록 따로 둡니다)
+        self._memory = OrderedDict()
+        self._db = None
+        self._disk_entries = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_evictions": 0}
+        if self.db_path:
+            try:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+                self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except sqlite3.Error as e:
+                logging.warning(f"임베딩 디스크 캐시를 열 수 없어 메모리 캐시만 사용합니다: {e}")
+                self._db = None
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    # --- 캐시 조회/저장 ---
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.stats["memory_hits"] += 1
+        return found
+
+    def _disk_lookup(self, keys: List[str]) -> dict:
+        """블로킹: SQLite 에서 찾은 벡터를 메모리 계층에도 올립니다."""
+        if not keys or self._db is None:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._db_lock:
+            if self._db is None:
+                return {}
+            rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys).fetchall()
+        found = {key: _decode(blob) for key, blob in rows}
+        with self._lock:
+            for key, vector in found.items():
+                self._remember(key, vector)
+            self.stats["disk_hits"] += len(found)
+        return found
+
+    def _remember_all(self, items: dict):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    def _disk_store(self, items: dict):
+        """블로킹: SQLite 에 저장하고, 행 수가 상한을 넘으면 가장 먼저 저장된 행부터 지웁니다."""
+        if not items or self._db is None:
+            return
+        rows = [(key, self.model, len(vector), _encode(vector)) for key, vector in items.items()]
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)", rows)
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = self._disk_entries - self.max_disk_entries
+            if overflow > 0:
+                # INSERT OR REPLACE 는 rowid 를 새로 받으므로 rowid 순서가 곧 저장 순서입니다.
+                self._db.execute("DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)", (overflow,))
+                self._disk_entries -= overflow
+            self._db.commit()
+        if overflow > 0:
+            with self._lock:
+                self.stats["disk_evictions"] += overflow
+
+    def _split(self, keys: List[str], texts: List[str], found: dict) -> dict:
+        # 같은 배치 안의 중복 문자열은 한 번만 임베딩합니다.
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        with self._lock:
+            self.stats["misses"] += len(pending)
+        return pending
+
+    def _plan(self, texts: List[str]):
+        keys = [self._key(text) for text in texts]
+        found = self._memory_lookup(list(dict.fromkeys(keys)))
+        found.update(self._disk_lookup([key for key in dict.fromkeys(keys) if key not in found]))
+        return keys, found, self._split(keys, texts, found)
+
+    async def _aplan(self, texts: List[str]):
+        # 메모리 계층만 이벤트 루프에서 보고, 디스크 계층은 스레드 풀에서 조회합니다.
+        keys = [self._key(text) for text in texts]
+        found = self._memory_lookup(list(dict.fromkeys(keys)))
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self._db is not None:
+            found.update(await self.run_blocking(self._disk_lookup, missing))
+        return keys, found, self._split(keys, texts, found)
+
+    def _store(self, items: dict):
+        self._remember_all(items)
+        self._disk_store(items)
+
+    async def _astore(self, items: dict):
+        self._remember_all(items)
+        if self._db is not None:
+            await self.run_blocking(self._disk_store, items)
+
+    # --- Embeddings 인터페이스 ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._plan(texts)
+        if pending:
+            vectors = self.underlying.embed_documents(list(pending.values()))
+            fresh = dict(zip(pending.keys(), vectors))
+            self._store(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._plan([text])
+        if pending:
+            vector = self.underlying.embed_query(text)
+            self._store({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = await self._aplan(texts)
+        if pending:
+            vectors = await self.underlying.aembed_documents(list(pending.values()))
+            fresh = dict(zip(pending.keys(), vectors))
+            await self._astore(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, pending = await self._aplan([text])
+        if pending:
+            vector = await self.underlying.aembed_query(text)
+            await self._astore({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    # --- 상태 ---
+    def cache_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries if self._db is not None else 0,
+                "max_disk_entries": self.max_disk_entries,
+            }
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,319 @@
+# fake_providers.py
+# 외부 API 없이 서버를 돌려보기 위한 로컬 가짜 공급자 (테스트/부하 측정용)
+
+import os
+import json
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+from meeting_index import matches_filter
+
+# 지연 시간 표본은 고정 시드 난수로 뽑아, 같은 순서로 호출하면 같은 지연이 나오도록 합니다.
+_latency_rng = random.Random(int(os.getenv("MOIT_FAKE_SEED", "0")))
+_latency_lock = threading.Lock()
+
+
+def sample_latency(mean: float, jitter: float = 0.0) -> float:
+    """평균 mean, 표준편차 jitter 인 정규분포에서 0 이상인 지연 시간을 뽑습니다."""
+    if mean <= 0 and jitter <= 0:
+        return 0.0
+    with _latency_lock:
+        return max(0.0, _latency_rng.gauss(mean, jitter)) if jitter > 0 else mean
+
+
+def sample_chance(rate: float) -> bool:
+    """rate 확률로 True (오류/지연 주입용, 같은 고정 시드 난수 사용)"""
+    if rate <= 0:
+        return False
+    with _latency_lock:
+        return _latency_rng.random() < rate
+
+
+class FakeProviderError(RuntimeError):
+    """가짜 공급자가 주입한 일시적 오류. 실제 SDK 예외처럼 status_code(503)를 가집니다."""
+
+    status_code = 503
+
+
+class FaultInjection:
+    """가짜 공급자 공통 장애 주입: error_rate 확률로 503 오류, straggler_rate 확률로 straggler_latency 초 추가 지연"""
+
+    error_rate = 0.0
+    straggler_rate = 0.0
+    straggler_latency = 0.0
+
+    def call_latency(self, latency: float, jitter: float) -> float:
+        extra = self.straggler_latency if sample_chance(self.straggler_rate) else 0.0
+        return sample_latency(latency, jitter) + extra
+
+    def maybe_fail(self, name: str):
+        if sample_chance(self.error_rate):
+            raise FakeProviderError(f"{name}: 주입된 일시적 오류 (503)")
+
+
+class FakeEmbeddings(Embeddings):
+    """문자 바이그램을 해시해 만든 결정적 임베딩. 비슷한 문장은 비슷한 벡터가 됩니다."""
+
+    def __init__(self, size: int = 256, latency: float = 0.0, jitter: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.jitter = jitter
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        chars = text.replace(" ", "")
+        grams = [chars[i:i + 2] for i in range(max(len(chars) - 1, 1))]
+        for gram in grams:
+            bucket = int.from_bytes(hashlib.md5(gram.encode("utf-8")).digest()[:4], "little") % self.size
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(sample_latency(self.latency, self.jitter))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(sample_latency(self.latency, self.jitter))
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        return self._embed(text)
+
+
+class FakeVectorStore(VectorStore):
+    """순수 파이썬 리스트로 구현한 인메모리 벡터 스토어. Pinecone과 같은 코사인 점수 체계를 따릅니다."""
+
+    def __init__(self, embedding: Embeddings, latency: float = 0.0, jitter: float = 0.0):
+        self._embedding = embedding
+        self._records = {}  # id -> (vector, text, metadata)
+        self.latency = latency
+        self.jitter = jitter
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+            self._records[id_] = (vector, text, dict(metadata))
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        for id_ in ids or []:
+            self._records.pop(id_, None)
+        return True
+
+    def _score(self, query_vector: List[float], k: int, metadata_filter: dict = None) -> List[Tuple[Document, float]]:
+        scored = []
+        for vector, text, metadata in self._records.values():
+            if not matches_filter(metadata, metadata_filter):
+                continue
+            score = sum(a * b for a, b in zip(query_vector, vector))
+            scored.append((Document(page_content=text, metadata=metadata), score))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        query_vector = self._embedding.embed_query(query)
+        time.sleep(sample_latency(self.latency, self.jitter))
+        return self._score(query_vector, k, kwargs.get("filter"))
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        query_vector = await self._embedding.aembed_query(query)
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        return self._score(query_vector, k, kwargs.get("filter"))
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, **kwargs)]
+
+    async def aadd_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                         ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = await self._embedding.aembed_documents(texts)
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+            self._records[id_] = (vector, text, dict(metadata))
+        return ids
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        return self.delete(ids)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # PineconeVectorStore(cosine)와 동일하게 [-1, 1] 점수를 [0, 1]로 변환합니다.
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "FakeVectorStore":
+        store = cls(embedding=embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
+
+
+class FakeChatModel(FaultInjection, BaseChatModel):
+    """지연 시간과 장애를 흉내 내는 가짜 채팅 모델. responder(프롬프트 문자열) -> 응답 문자열"""
+
+    responder: Callable[[str], str] = lambda prompt: "general_search"
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    straggler_rate: float = 0.0
+    straggler_latency: float = 0.0
+    # True 이면 도구가 바인딩된 호출의 첫 턴에서 앞쪽 도구 tool_calls_per_turn 개를 한꺼번에 호출하는 응답을 돌려줍니다. (에이전트 경로 부하 측정용)
+    call_tools: bool = False
+    tool_calls_per_turn: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "moit-fake-chat"
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[list] = None) -> ChatResult:
+        if self.call_tools and tools and not any(isinstance(message, ToolMessage) for message in messages):
+            question = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            tool_calls = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {
+                        "name": spec["function"]["name"],
+                        # 인자가 없는 도구(get_current_date 등)에는 빈 인자를 보냅니다.
+                        "arguments": json.dumps(
+                            {"query": question} if "query" in spec["function"].get("parameters", {}).get("properties", {}) else {},
+                            ensure_ascii=False,
+                        ),
+                    },
+                }
+                for spec in tools[:max(self.tool_calls_per_turn, 1)]
+            ]
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", additional_kwargs={"tool_calls": tool_calls}))])
+        prompt = "\n".join(str(message.content) for message in messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.responder(prompt)))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.call_latency(self.latency, self.jitter))
+        self.maybe_fail(self._llm_type)
+        return self._respond(messages, kwargs.get("tools"))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.call_latency(self.latency, self.jitter))
+        self.maybe_fail(self._llm_type)
+        return self._respond(messages, kwargs.get("tools"))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        # 첫 토큰까지 지연 시간의 일부만 기다리고, 나머지는 단어 단위로 나눠 흘려보냅니다.
+        message = self._respond(messages, kwargs.get("tools")).generations[0].message
+        latency = self.call_latency(self.latency, self.jitter)
+        self.maybe_fail(self._llm_type)
+        if message.additional_kwargs.get("tool_calls"):
+            await asyncio.sleep(latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs=message.additional_kwargs))
+            return
+        words = message.content.split(" ")
+        await asyncio.sleep(latency / 4)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(latency * 3 / 4 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+class FakeGenerativeModel(FaultInjection):
+    """genai.GenerativeModel 대체품. generate_content는 실제 SDK처럼 블로킹으로 동작합니다.
+
+    latency / jitter / error_rate / straggler_* 는 클래스 속성으로 바꿔 모든 인스턴스에 적용합니다.
+    """
+
+    latency = 0.0
+    jitter = 0.0
+
+    def __init__(self, model_name: str = "gemini-fake", **kwargs: Any):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream: bool = False, **kwargs: Any):
+        text = f"[{self.model_name}] 추천 결과 (입력 파트 {len(contents)}개)"
+        # 토큰 수는 대략적인 추정치입니다. (텍스트 4글자당 1토큰, 이미지 1장당 258토큰)
+        text_tokens = sum(len(part) // 4 for part in contents if isinstance(part, str))
+        image_tokens = 258 * sum(1 for part in contents if not isinstance(part, str))
+        usage = SimpleNamespace(prompt_token_count=text_tokens + image_tokens, candidates_token_count=len(text) // 2)
+        latency = self.call_latency(self.latency, self.jitter)
+        if stream:
+            return self._stream(text, latency, usage)
+        time.sleep(latency)
+        self.maybe_fail(self.model_name)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _stream(self, text: str, latency: float, usage):
+        # 실제 SDK처럼 첫 조각은 빨리, 나머지는 전체 지연 시간에 걸쳐 나눠서 돌려줍니다.
+        words = text.split(" ")
+        time.sleep(latency / 10)
+        self.maybe_fail(self.model_name)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(latency * 9 / 10 / len(words))
+            yield SimpleNamespace(text=word if i == 0 else " " + word, usage_metadata=usage if i == len(words) - 1 else None)
+
+
+def create_stub_search_app(latency: float = 0.0, jitter: float = 0.0):
+    """Tavily POST /search 를 흉내 내는 스텁 검색 서버(ASGI 앱). 질의마다 결정적인 가짜 결과를 돌려줍니다.
+
+    GET /stats 로 받은 검색 요청 수를 확인할 수 있어, 캐시 적중 여부를 테스트할 때 씁니다.
+    """
+    from fastapi import FastAPI
+
+    app = FastAPI(title="MOIT stub search")
+    stats = {"requests": 0, "queries": {}}
+
+    @app.post("/search")
+    async def search(body: dict):
+        query = str(body.get("query", ""))
+        stats["requests"] += 1
+        stats["queries"][query] = stats["queries"].get(query, 0) + 1
+        await asyncio.sleep(sample_latency(latency, jitter))
+        digest = hashlib.md5(query.encode("utf-8")).hexdigest()[:8]
+        return {
+            "query": query,
+            "results": [
+                {"title": f"결과 {i + 1}", "url": f"https://example.com/{digest}/{i}",
+                 "content": f"'{query}' 에 대한 검색 결과 {i + 1}", "score": round(1.0 - i * 0.1, 2)}
+                for i in range(int(body.get("max_results", 5)))
+            ],
+        }
+
+    @app.get("/stats")
+    async def search_stats():
+        return stats
+
+    return app
@@ -0,0 +1,174 @@
+# image_pipeline.py
+# 취미 추천용 사진을 Gemini에 보내기 전에 줄이고 다시 인코딩하는 전처리 단계
+#   - 디코딩은 전용 스레드 풀에서 병렬로 수행
+#   - EXIF 회전 보정 후 긴 변 기준으로 축소, JPEG/WebP/PNG로 재인코딩 (MOIT_IMAGE_FORMAT)
+#   - 파일 핸들은 즉시 닫고, 결과는 파일 내용 해시 기준으로 캐시
+
+import io
+import os
+import base64
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+SUPPORTED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'HEIC', 'HEIF', 'MPO'}
+# 재인코딩 출력 형식과 Gemini/OpenAI 로 보낼 MIME 타입
+OUTPUT_MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+EXIF_ORIENTATION = 0x0112
+
+
+def content_hash(path: str) -> str:
+    """파일 내용의 sha256 해시를 반환합니다. 파일을 읽을 수 없으면 경로 기반 표식을 돌려줍니다."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    except OSError:
+        return f"unreadable:{path}"
+    return digest.hexdigest()
+
+
+@dataclass
+class ProcessedImage:
+    path: str
+    mime_type: str
+    data: bytes
+    original_bytes: int
+    cache_hit: bool = False
+
+    def as_gemini_part(self) -> dict:
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def as_openai_part(self) -> dict:
+        """OpenAI 비전 모델 메시지의 image_url 파트 (Gemini 대체 경로용)"""
+        return {"type": "image_url", "image_url": {"url": f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"}}
+
+
+class ImagePreprocessor:
+    """사진 축소/재인코딩 + 내용 해시 캐시"""
+
+    def __init__(self, max_edge: int = None, output_format: str = None, quality: int = None,
+                 cache_bytes: int = None, workers: int = None):
+        self.max_edge = max_edge or int(os.getenv("MOIT_IMAGE_MAX_EDGE", "1024"))
+        self.output_format = (output_format or os.getenv("MOIT_IMAGE_FORMAT", "JPEG")).upper()
+        if self.output_format not in OUTPUT_MIME_TYPES:
+            raise ValueError(f"지원하지 않는 출력 이미지 형식({self.output_format}), 가능한 값: {', '.join(OUTPUT_MIME_TYPES)}")
+        self.quality = quality or int(os.getenv("MOIT_IMAGE_QUALITY", "85"))
+        self.cache_bytes = cache_bytes if cache_bytes is not None else int(os.getenv("MOIT_IMAGE_CACHE_MB", "64")) * 1024 * 1024
+        self._executor = ThreadPoolExecutor(max_workers=workers or int(os.getenv("MOIT_IMAGE_WORKERS", "4")),
+                                            thread_name_prefix="moit-image")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self.totals = {"images": 0, "cache_hits": 0, "original_bytes": 0, "processed_bytes": 0, "seconds": 0.0}
+
+    @property
+    def mime_type(self) -> str:
+        return OUTPUT_MIME_TYPES[self.output_format]
+
+    # --- 캐시 ---
+    def _cache_key(self, raw: bytes) -> str:
+        digest = hashlib.sha256(raw).hexdigest()
+        return f"{digest}:{self.max_edge}:{self.output_format}:{self.quality}"
+
+    def _cache_get(self, key: str) -> Optional[ProcessedImage]:
+        with self._lock:
+            item = self._cache.get(key)
+            if item is not None:
+                self._cache.move_to_end(key)
+            return item
+
+    def _cache_put(self, key: str, item: ProcessedImage):
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = item
+            self._cached_bytes += len(item.data)
+            while self._cached_bytes > self.cache_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted.data)
+
+    # --- 단일 이미지 처리 ---
+    def _encode(self, raw: bytes) -> bytes:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(raw)) as img:
+            image_format = (img.format or '').upper()
+            if image_format not in SUPPORTED_FORMATS:
+                raise ValueError(f"지원하지 않는 이미지 형식({img.format})")
+            if image_format == 'MPO':
+                # MPO 파일은 첫 번째 프레임(일반적으로 JPEG)만 사용합니다.
+                img.seek(0)
+            # 회전 정보가 없거나 1(그대로)인 사진만 원본 바이트를 그대로 보낼 수 있습니다.
+            upright = img.getexif().get(EXIF_ORIENTATION, 1) == 1
+            oriented = ImageOps.exif_transpose(img)
+            try:
+                if self.output_format == "JPEG" or oriented.mode not in ("RGB", "RGBA"):
+                    converted = oriented.convert("RGB")
+                else:
+                    converted = oriented
+                converted.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+                buffer = io.BytesIO()
+                converted.save(buffer, format=self.output_format, quality=self.quality, optimize=True)
+                encoded = buffer.getvalue()
+                if converted is not oriented:
+                    converted.close()
+            finally:
+                if oriented is not img:
+                    oriented.close()
+        # 이미 충분히 작은 JPEG는 재인코딩 결과가 더 클 수 있으므로 원본을 그대로 씁니다. (회전 보정이 필요 없을 때만)
+        if image_format == 'JPEG' and self.output_format == "JPEG" and upright and len(raw) <= len(encoded):
+            return raw
+        return encoded
+
+    def preprocess(self, path: str) -> ProcessedImage:
+        with open(path, "rb") as f:
+            raw = f.read()
+        key = self._cache_key(raw)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return ProcessedImage(path=path, mime_type=cached.mime_type, data=cached.data,
+                                  original_bytes=len(raw), cache_hit=True)
+        item = ProcessedImage(path=path, mime_type=self.mime_type, data=self._encode(raw), original_bytes=len(raw))
+        self._cache_put(key, item)
+        return item
+
+    # --- 여러 이미지 처리 ---
+    def preprocess_many(self, paths: List[str]):
+        """여러 사진을 병렬로 전처리합니다. (처리된 이미지 목록, 요청 단위 통계) 를 반환하며 실패한 사진은 건너뜁니다."""
+        start = time.perf_counter()
+        futures = [(path, self._executor.submit(self.preprocess, path)) for path in paths]
+        images = []
+        for path, future in futures:
+            try:
+                images.append(future.result())
+            except Exception as e:
+                logging.warning(f"이미지 파일을 처리하는 데 실패하여 건너뜁니다: {path}, 오류: {e}")
+        elapsed = time.perf_counter() - start
+        original = sum(image.original_bytes for image in images)
+        processed = sum(len(image.data) for image in images)
+        stats = {
+            "images": len(images),
+            "cache_hits": sum(1 for image in images if image.cache_hit),
+            "original_bytes": original,
+            "processed_bytes": processed,
+            "bytes_saved": original - processed,
+            "seconds": round(elapsed, 4),
+        }
+        with self._lock:
+            for key in ("images", "cache_hits", "original_bytes", "processed_bytes"):
+                self.totals[key] += stats[key]
+            self.totals["seconds"] += elapsed
+        return images, stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_preprocessor = ImagePreprocessor()
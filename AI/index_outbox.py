@@ -0,0 +1,333 @@
+# index_outbox.py
+# 모임 벡터 인덱스 변경(추가/삭제)을 바로 반영하지 않고 내구성 있는 대기열에 모았다가 묶어서 반영합니다. (write-behind)
+#   - 대기열은 SQLite(index_mutations 테이블)이며 meeting_id 당 한 행만 유지합니다.
+#       같은 모임을 여러 번 추가/수정하면 마지막 내용 하나로 합쳐지고,
+#       아직 반영 전인 추가 뒤에 삭제가 오면 임베딩 없이 삭제 하나로 바뀝니다.
+#   - 주기(MOIT_INDEX_FLUSH_INTERVAL) 또는 쌓인 건수(MOIT_INDEX_FLUSH_SIZE)가 차면 배치 임베딩+업서트 / 배치 삭제로 반영합니다.
+#   - 반영에 실패한 변경은 대기열에 남아 다음 주기에 다시 시도됩니다.
+#   - mirrors(예: 키워드 인덱스)는 벡터 인덱스 반영이 성공한 변경을 같은 순서로 받아 함께 갱신합니다.
+#   - reconcile() 은 meetings 테이블과 인덱스를 비교해 빠진/남은/내용이 다른 모임을 대기열에 넣습니다.
+#   - sweep_expired() 는 시작 시각이 지난 모임을 인덱스에서 빼고, 정원 마감/재모집으로 상태가 바뀐 모임을 다시 씁니다.
+
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional
+
+from meeting_index import STATUS_ENDED, aingest_meetings, meeting_to_record
+
+RECONCILE_FIELDS = ("title", "description", "time", "location", "region", "category", "status", "starts_at")
+
+
+class IndexOutbox:
+    """meeting_id 단위로 합쳐지는 인덱스 변경 대기열"""
+
+    def __init__(self, vector_store_getter: Callable, path: str = None, flush_interval: float = None,
+                 flush_size: int = None, max_batch: int = None, mirrors: list = None):
+        self.vector_store_getter = vector_store_getter
+        self.mirrors = mirrors or []
+        self.path = path if path is not None else os.getenv("MOIT_INDEX_OUTBOX_PATH", "index_outbox.sqlite3")
+        self.flush_interval = flush_interval or float(os.getenv("MOIT_INDEX_FLUSH_INTERVAL", "2"))
+        self.flush_size = flush_size or int(os.getenv("MOIT_INDEX_FLUSH_SIZE", "64"))
+        self.max_batch = max_batch or int(os.getenv("MOIT_INDEX_FLUSH_MAX_BATCH", "256"))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS index_mutations (
+                meeting_id TEXT PRIMARY KEY,
+                op TEXT NOT NULL,
+                payload TEXT,
+                version INTEGER NOT NULL DEFAULT 1,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )"""
+        )
+        self._db.commit()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats = {"enqueued": 0, "coalesced": 0, "cancelled_upserts": 0, "flushes": 0,
+                      "upserted": 0, "deleted": 0, "failures": 0}
+
+    # --- 대기열 ---
+    # 대기열 메서드는 SQLite 에 바로 commit 하므로 이벤트 루프에서는 registry.run_blocking 으로 부릅니다.
+    def _enqueue_many(self, mutations: List[tuple]):
+        """[(meeting_id, op, payload)] 를 한 트랜잭션으로 대기열에 넣습니다."""
+        with self._lock:
+            for meeting_id, op, payload in mutations:
+                row = self._db.execute("SELECT op FROM index_mutations WHERE meeting_id = ?", (meeting_id,)).fetchone()
+                self.stats["enqueued"] += 1
+                if row is not None:
+                    self.stats["coalesced"] += 1
+                    if row[0] == "upsert" and op == "delete":
+                        self.stats["cancelled_upserts"] += 1
+                # 같은 meeting_id 의 대기 중인 변경은 마지막 것 하나로 덮어씁니다. version 은 반영 도중 덮어쓰였는지 확인하는 데 씁니다.
+                self._db.execute(
+                    """INSERT INTO index_mutations (meeting_id, op, payload, version, enqueued_at, attempts, last_error)
+                       VALUES (?, ?, ?, 1, ?, 0, NULL)
+                       ON CONFLICT(meeting_id) DO UPDATE SET
+                           op = excluded.op, payload = excluded.payload, version = index_mutations.version + 1,
+                           enqueued_at = excluded.enqueued_at, attempts = 0, last_error = NULL""",
+                    (meeting_id, op, json.dumps(payload, ensure_ascii=False) if payload is not None else None, time.time()),
+                )
+            self._db.commit()
+            pending = self._db.execute("SELECT COUNT(*) FROM index_mutations").fetchone()[0]
+        if pending >= self.flush_size:
+            self.wake()
+
+    def _enqueue(self, meeting_id: str, op: str, payload: Optional[dict]):
+        self._enqueue_many([(meeting_id, op, payload)])
+
+    def wake(self):
+        """주기를 기다리지 않고 바로 반영하도록 깨웁니다. 작업 스레드에서 불러도 안전합니다."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def enqueue_upsert(self, meeting: dict):
+        self._enqueue(str(meeting["meeting_id"]), "upsert", meeting)
+
+    def enqueue_upserts(self, meetings: List[dict]):
+        self._enqueue_many([(str(meeting["meeting_id"]), "upsert", meeting) for meeting in meetings])
+
+    def enqueue_delete(self, meeting_id: str):
+        self._enqueue(str(meeting_id), "delete", None)
+
+    def discard(self, meeting_ids: List[str]) -> int:
+        """대기 중인 변경을 버립니다. 대기열을 거치지 않고 인덱스에 바로 쓰기 전에 불러,
+        더 오래된 추가/삭제가 나중에 반영되면서 방금 쓴 내용을 덮어쓰지 않게 합니다."""
+        with self._lock:
+            cursor = self._db.executemany("DELETE FROM index_mutations WHERE meeting_id = ?",
+                                          [(str(meeting_id),) for meeting_id in meeting_ids])
+            self._db.commit()
+            return cursor.rowcount
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM index_mutations").fetchone()[0]
+
+    def _take_batch(self) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT meeting_id, op, payload, version FROM index_mutations ORDER BY enqueued_at LIMIT ?",
+                (self.max_batch,),
+            ).fetchall()
+
+    def _ack(self, rows: List[tuple]):
+        with self._lock:
+            # 반영하는 사이에 새 변경으로 덮어쓰인 행(version 이 바뀐 행)은 남겨 두고 다음 번에 반영합니다.
+            self._db.executemany(
+                "DELETE FROM index_mutations WHERE meeting_id = ? AND version = ?",
+                [(meeting_id, version) for meeting_id, _, _, version in rows],
+            )
+            self._db.commit()
+
+    def _record_failure(self, rows: List[tuple], error: str):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE index_mutations SET attempts = attempts + 1, last_error = ? WHERE meeting_id = ? AND version = ?",
+                [(error, meeting_id, version) for meeting_id, _, _, version in rows],
+            )
+            self._db.commit()
+
+    # --- 반영 ---
+    async def flush(self) -> dict:
+        """대기열을 비울 때까지 배치 단위로 인덱스에 반영합니다."""
+        result = {"upserted": 0, "deleted": 0, "failed": 0}
+        async with self._flush_lock or asyncio.Lock():
+            while True:
+                rows = self._take_batch()
+                if not rows:
+                    break
+                upserts = [row for row in rows if row[1] == "upsert"]
+                deletes = [row for row in rows if row[1] == "delete"]
+                vector_store = self.vector_store_getter()
+                failed = False
+                for group, apply in ((upserts, self._apply_upserts), (deletes, self._apply_deletes)):
+                    if not group:
+                        continue
+                    try:
+                        await apply(vector_store, group)
+                        self._ack(group)
+                        result["upserted" if group is upserts else "deleted"] += len(group)
+                    except Exception as e:
+                        failed = True
+                        result["failed"] += len(group)
+                        self._record_failure(group, str(e))
+                        self.stats["failures"] += 1
+                        logging.error(f"벡터 인덱스 반영 실패 ({len(group)}건, 다음 주기에 재시도): {e}", exc_info=True)
+                if failed:
+                    break
+        self.stats["flushes"] += 1
+        self.stats["upserted"] += result["upserted"]
+        self.stats["deleted"] += result["deleted"]
+        if result["upserted"] or result["deleted"]:
+            logging.info(f"--- 벡터 인덱스 반영: 추가/수정 {result['upserted']}건, 삭제 {result['deleted']}건 ---")
+        return result
+
+    async def _apply_upserts(self, vector_store, rows: List[tuple]):
+        meetings = [json.loads(payload) for _, _, payload, _ in rows]
+        await aingest_meetings(vector_store, meetings)
+        for mirror in self.mirrors:
+            mirror.upsert_meetings(meetings)
+
+    async def _apply_deletes(self, vector_store, rows: List[tuple]):
+        ids = [meeting_id for meeting_id, _, _, _ in rows]
+        await vector_store.adelete(ids=ids)
+        for mirror in self.mirrors:
+            mirror.delete(ids)
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            result = await self.flush()
+            # 실패가 이어지면 최대 1분까지 간격을 늘려 외부 서비스를 두드리지 않도록 합니다.
+            backoff = min(backoff * 2, 60.0) if result["failed"] else self.flush_interval
+
+    # --- 수명 주기 ---
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        pending = self.pending_count()
+        if pending:
+            logging.info(f"--- 벡터 인덱스 대기열 복구: 미반영 변경 {pending}건 ---")
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """주기 작업을 멈추고 남은 변경을 한 번 더 반영해 봅니다. 반영하지 못한 변경은 다음 실행에서 이어집니다."""
+        self._loop = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except Exception as e:
+            logging.warning(f"종료 전 벡터 인덱스 반영 실패 (다음 실행에서 이어서 반영합니다): {e}")
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            pending = self._db.execute("SELECT op, COUNT(*), MIN(enqueued_at), MAX(attempts) FROM index_mutations GROUP BY op").fetchall()
+        oldest = min((row[2] for row in pending), default=None)
+        return {
+            **self.stats,
+            "pending": {op: count for op, count, _, _ in pending},
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+            "max_attempts": max((row[3] for row in pending), default=0),
+        }
+
+
+# --- 인덱스 / 테이블 대조 ---
+def list_index_records(vector_store) -> Dict[str, dict]:
+    """인덱스에 들어 있는 meeting_id -> 메타데이터 를 반환합니다."""
+    if hasattr(vector_store, "all_ids"):  # LocalVectorStore
+        return {doc.metadata["meeting_id"]: doc.metadata for doc in vector_store.get_by_ids(vector_store.all_ids())}
+    if hasattr(vector_store, "_records"):  # FakeVectorStore
+        return {id_: metadata for id_, (_, _, metadata) in vector_store._records.items()}
+    index = getattr(vector_store, "_index", None)
+    if index is None:
+        raise NotImplementedError(f"{type(vector_store).__name__} 는 id 목록 조회를 지원하지 않습니다.")
+    # Pinecone: list() 로 id 페이지를 받고, fetch() 로 메타데이터를 가져옵니다. (서버리스 인덱스)
+    records = {}
+    for page in index.list():
+        ids = list(page)
+        for i in range(0, len(ids), 100):
+            fetched = index.fetch(ids=ids[i:i + 100])
+            for id_, vector in fetched.vectors.items():
+                records[id_] = dict(vector.metadata or {})
+    return records
+
+
+def reconcile(vector_store, outbox: IndexOutbox, rows: List[dict], dry_run: bool = False) -> dict:
+    """meetings 테이블 행(meeting_row_to_payload 형식)과 인덱스를 비교해 차이를 대기열에 넣습니다."""
+    start = time.perf_counter()
+    indexed = list_index_records(vector_store)
+    expected = {}
+    for meeting in rows:
+        meeting_id, _, metadata = meeting_to_record(meeting)
+        # 이미 지난 모임은 인덱스에 있을 필요가 없으므로, 남아 있으면 고아로 보고 삭제합니다.
+        if metadata["status"] != STATUS_ENDED:
+            expected[meeting_id] = (meeting, metadata)
+
+    missing = [meeting_id for meeting_id in expected if meeting_id not in indexed]
+    orphaned = [meeting_id for meeting_id in indexed if meeting_id not in expected]
+    stale = [
+        meeting_id for meeting_id, (_, metadata) in expected.items()
+        if meeting_id in indexed and any(str(indexed[meeting_id].get(field, "")) != str(metadata.get(field, "")) for field in RECONCILE_FIELDS)
+    ]
+    if not dry_run:
+        for meeting_id in missing + stale:
+            outbox.enqueue_upsert(expected[meeting_id][0])
+        for meeting_id in orphaned:
+            outbox.enqueue_delete(meeting_id)
+        outbox.wake()
+    report = {
+        "table_rows": len(expected),
+        "index_records": len(indexed),
+        "missing": len(missing),
+        "orphaned": len(orphaned),
+        "stale": len(stale),
+        "enqueued": 0 if dry_run else len(missing) + len(stale) + len(orphaned),
+        "dry_run": dry_run,
+        "seconds": round(time.perf_counter() - start, 3),
+        "sample": {"missing": missing[:10], "orphaned": orphaned[:10], "stale": stale[:10]},
+    }
+    logging.info(f"--- 인덱스 대조: 누락 {len(missing)}, 고아 {len(orphaned)}, 내용 불일치 {len(stale)} (dry_run={dry_run}) ---")
+    return report
+
+
+def sweep_expired(vector_store, outbox: IndexOutbox, load_payloads: Optional[Callable] = None,
+                  now: Optional[float] = None) -> dict:
+    """인덱스를 훑어 시작 시각이 지난 모임은 삭제, 상태(open/full)가 바뀐 모임은 다시 쓰도록 대기열에 넣습니다.
+
+    load_payloads(ids) 는 meetings 테이블에서 해당 모임들을 meeting_row_to_payload 형식으로 읽어옵니다.
+    주지 않으면 시간 기준 만료만 처리합니다. 실제 반영은 대기열이 배치 삭제/업서트로 묶어서 합니다.
+    """
+    start = time.perf_counter()
+    now = time.time() if now is None else now
+    indexed = list_index_records(vector_store)
+    ended = [
+        meeting_id for meeting_id, metadata in indexed.items()
+        if isinstance(metadata.get("starts_at"), (int, float)) and metadata["starts_at"] < now
+    ]
+    changed = []
+    if load_payloads is not None:
+        expired = set(ended)
+        live = [meeting_id for meeting_id in indexed if meeting_id not in expired]
+        for meeting in load_payloads(live) if live else []:
+            meeting_id, _, metadata = meeting_to_record(meeting, now)
+            if metadata["status"] == STATUS_ENDED:
+                ended.append(meeting_id)
+            elif indexed.get(meeting_id, {}).get("status") != metadata["status"]:
+                changed.append(meeting)
+    for meeting_id in ended:
+        outbox.enqueue_delete(meeting_id)
+    for meeting in changed:
+        outbox.enqueue_upsert(meeting)
+    if ended or changed:
+        outbox.wake()
+    logging.info(f"--- 만료 모임 정리: 삭제 {len(ended)}, 상태 갱신 {len(changed)} (인덱스 {len(indexed)}건) ---")
+    return {
+        "index_records": len(indexed),
+        "evicted": len(ended),
+        "status_updated": len(changed),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
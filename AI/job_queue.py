@@ -0,0 +1,299 @@
+# job_queue.py
+# 오래 걸리는 작업(취미 추천 등)을 위한 내구성 있는 비동기 작업 큐
+#   - 작업 상태는 SQLite(jobs 테이블)에 저장되므로 서버가 재시작되어도 남아 있습니다.
+#   - 크기가 정해진 작업자 풀이 작업을 처리하고, 재시작 시 queued/running 상태였던 작업을 다시 이어서 처리합니다.
+#   - 끝난 작업은 상태 조회(GET)로 가져가거나, webhook_url 이 있으면 결과를 POST 로 전달받습니다.
+#   - 일시적 오류(provider_guard.is_retryable)로 실패한 작업은 max_attempts 까지 지수 백오프 뒤 다시 큐에 넣습니다.
+#   - 처리 함수는 checkpoint 에 중간 결과(예: 저장한 DB 행 id)를 남겨, 다시 실행될 때 같은 부수 효과를 되풀이하지 않게 합니다.
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+from provider_guard import is_retryable
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class JobStore:
+    """jobs 테이블에 대한 얇은 래퍼. 모든 메서드는 스레드 안전합니다."""
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else os.getenv("MOIT_JOB_DB_PATH", "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                user_id TEXT,
+                webhook_url TEXT,
+                webhook_status TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                checkpoint TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "checkpoint" not in columns:
+            # checkpoint 열이 생기기 전에 만든 jobs.sqlite3
+            self._db.execute("ALTER TABLE jobs ADD COLUMN checkpoint TEXT")
+        self._db.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def create(self, kind: str, payload: dict, user_id: str = None, webhook_url: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, status, payload, user_id, webhook_url, created_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), user_id, webhook_url, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["checkpoint"] = json.loads(job["checkpoint"]) if job["checkpoint"] else {}
+        return job
+
+    def mark_running(self, job_id: str) -> int:
+        """running 으로 바꾸고 시도 횟수를 반환합니다."""
+        self._execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+            (time.time(), job_id),
+        )
+        with self._lock:
+            return self._db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    def mark_succeeded(self, job_id: str, result: dict):
+        self._execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ? WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id),
+        )
+
+    def mark_queued(self, job_id: str, error: str):
+        """일시적 오류로 실패한 작업을 다시 queued 로 돌립니다. (마지막 오류는 남겨 둡니다)"""
+        self._execute("UPDATE jobs SET status = 'queued', error = ? WHERE id = ?", (error, job_id))
+
+    def save_checkpoint(self, job_id: str, values: dict):
+        """작업의 중간 결과를 기존 checkpoint 에 합쳐 저장합니다."""
+        with self._lock:
+            row = self._db.execute("SELECT checkpoint FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            checkpoint = json.loads(row[0]) if row and row[0] else {}
+            checkpoint.update(values)
+            self._db.execute("UPDATE jobs SET checkpoint = ? WHERE id = ?", (json.dumps(checkpoint, ensure_ascii=False), job_id))
+            self._db.commit()
+
+    def mark_failed(self, job_id: str, error: str):
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?", (error, time.time(), job_id))
+
+    def mark_webhook(self, job_id: str, webhook_status: str):
+        self._execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (webhook_status, job_id))
+
+    def pending_ids(self) -> list:
+        """재시작 시 다시 처리해야 할 작업 (queued + 처리 도중 끊긴 running) 을 생성 순서대로 반환합니다."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def queue_position(self, job_id: str, created_at: float) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (created_at,)
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def prune(self, older_than_seconds: float) -> int:
+        cursor = self._execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (time.time() - older_than_seconds,),
+        )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """작업 종류별 처리 함수를 크기 제한 작업자 풀로 실행합니다."""
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable[[dict, dict], Awaitable[dict]]],
+                 concurrency: int = None, max_attempts: int = None, http_client_getter: Callable = None):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency or int(os.getenv("MOIT_JOB_WORKERS", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("MOIT_JOB_MAX_ATTEMPTS", "3"))
+        self.retention_seconds = float(os.getenv("MOIT_JOB_RETENTION_HOURS", "72")) * 3600
+        self.retry_base = float(os.getenv("MOIT_JOB_RETRY_BASE_SECONDS", "5"))
+        self.http_client_getter = http_client_getter
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._webhooks = set()
+        self._retries = set()  # 백오프 뒤 작업을 다시 큐에 넣는 태스크
+
+    # --- 수명 주기 ---
+    def start(self):
+        """작업자를 띄우고, 이전 실행에서 끝나지 않은 작업을 다시 큐에 넣습니다."""
+        self._queue = asyncio.Queue()
+        pruned = self.store.prune(self.retention_seconds)
+        pending = self.store.pending_ids()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending or pruned:
+            logging.info(f"--- 작업 큐 복구: 미완료 작업 {len(pending)}건 재개, 오래된 작업 {pruned}건 정리 ---")
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        # 처리 중이던 작업은 running 상태로 남으며, 다음 시작 때 다시 처리됩니다.
+        # 백오프 중이던 작업은 queued 상태로 남아 있으므로 다음 시작 때 다시 처리됩니다.
+        for task in self._workers + list(self._webhooks) + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._webhooks, *self._retries, return_exceptions=True)
+        self._workers = []
+
+    # --- 제출 / 조회 ---
+    def submit(self, kind: str, payload: dict, user_id: str = None, webhook_url: str = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"알 수 없는 작업 종류: {kind}")
+        job_id = self.store.create(kind, payload, user_id=user_id, webhook_url=webhook_url)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        view = {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "user_id": job["user_id"],
+            "attempts": job["attempts"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+        if job["status"] == "queued":
+            view["queue_position"] = self.store.queue_position(job["id"], job["created_at"])
+        if job["status"] == "succeeded":
+            view["result"] = job["result"]
+        if job["status"] == "failed":
+            view["error"] = job["error"]
+        if job["webhook_url"]:
+            view["webhook_status"] = job["webhook_status"]
+        return view
+
+    def stats(self) -> dict:
+        return {"workers": self.concurrency, "queued_in_memory": self._queue.qsize() if self._queue else 0, **self.store.counts()}
+
+    # --- 실행 ---
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"작업 처리 중 예기치 못한 오류 (job {job_id}): {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] not in ("queued", "running"):
+            return
+        if job["attempts"] >= self.max_attempts:
+            # 처리 도중 서버가 여러 번 죽은 작업은 더 이상 재시도하지 않습니다.
+            self.store.mark_failed(job_id, f"최대 시도 횟수({self.max_attempts})를 넘었습니다.")
+            await self._notify(job_id)
+            return
+
+        attempt = self.store.mark_running(job_id)
+        start = time.perf_counter()
+        logging.info(f"--- 작업 시작: {job['kind']} (job {job_id}, 시도 {attempt}) ---")
+        try:
+            result = await self.handlers[job["kind"]](job["payload"], job)
+        except Exception as e:
+            if is_retryable(e) and attempt < self.max_attempts:
+                delay = min(self.retry_base * 2 ** (attempt - 1), 300.0)
+                logging.warning(f"작업 일시적 오류, {delay:.0f}초 뒤 다시 시도합니다: {job['kind']} (job {job_id}, 시도 {attempt}/{self.max_attempts}): {e}")
+                self.store.mark_queued(job_id, str(e))
+                self._requeue_later(job_id, delay)
+                return
+            logging.error(f"작업 실패: {job['kind']} (job {job_id}): {e}", exc_info=True)
+            self.store.mark_failed(job_id, str(e))
+        else:
+            self.store.mark_succeeded(job_id, result)
+            logging.info(f"--- 작업 완료: {job['kind']} (job {job_id}, {time.perf_counter() - start:.1f}s) ---")
+        await self._notify(job_id)
+
+    def _requeue_later(self, job_id: str, delay: float):
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._queue.put_nowait(job_id)
+        task = asyncio.create_task(requeue())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    def checkpoint(self, job_id: str, **values):
+        """처리 함수가 중간 결과를 남길 때 씁니다. 다시 실행되면 job["checkpoint"] 로 돌려받습니다."""
+        self.store.save_checkpoint(job_id, values)
+
+    async def _notify(self, job_id: str):
+        job = self.store.get(job_id)
+        if not job or not job["webhook_url"] or self.http_client_getter is None:
+            return
+        # 웹훅 전달은 작업자를 붙잡지 않도록 별도 태스크로 보냅니다.
+        task = asyncio.create_task(self._deliver_webhook(job_id, job["webhook_url"]))
+        self._webhooks.add(task)
+        task.add_done_callback(self._webhooks.discard)
+
+    async def _deliver_webhook(self, job_id: str, url: str, attempts: int = 3):
+        body = self.status(job_id)
+        for attempt in range(1, attempts + 1):
+            try:
+                response = await self.http_client_getter().post(url, json=body, timeout=10)
+                if response.status_code < 500:
+                    self.store.mark_webhook(job_id, f"delivered:{response.status_code}")
+                    return
+                reason = f"HTTP {response.status_code}"
+            except Exception as e:
+                reason = str(e) or type(e).__name__
+            logging.warning(f"웹훅 전달 실패 (job {job_id}, 시도 {attempt}/{attempts}): {reason}")
+            if attempt < attempts:
+                await asyncio.sleep(2 ** attempt)
+        self.store.mark_webhook(job_id, f"failed:{reason}")
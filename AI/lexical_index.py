@@ -0,0 +1,150 @@
+# lexical_index.py
+# 모임 제목/설명에 대한 프로세스 내부 BM25 키워드 인덱스 (문자 바이그램)
+#   - 한국어는 띄어쓰기가 제각각이라("축구하실 분" / "축구 하실분") 공백을 뺀 문자 2-gram 을 색인 단위로 씁니다.
+#   - 제목은 설명보다 중요하므로 두 번 색인합니다.
+#   - 벡터 인덱스와 같은 변경(추가/삭제)을 받아 함께 갱신하고, 서버 시작 시 벡터 인덱스 메타데이터로 다시 만듭니다.
+#   - 검색 결과에는 BM25 점수와 함께 "질의 바이그램 중 문서에 있는 비율(IDF 가중)" 을 붙입니다.
+#       이 비율이 충분히 높으면(강한 키워드 일치) 임베딩/벡터 검색 없이 바로 결과로 씁니다.
+
+import os
+import re
+import math
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from meeting_index import matches_filter, meeting_to_record, record_text
+
+TITLE_BOOST = 2
+
+
+def normalize_text(text: str) -> str:
+    """전각/반각, 대소문자, 문장부호 차이를 없앤 문자열"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    """공백을 뺀 문자 n-gram. n 보다 짧은 단어 하나짜리 질의("책")는 그대로 한 토큰으로 씁니다."""
+    chars = normalize_text(text).replace(" ", "")
+    if len(chars) < n:
+        return [chars] if chars else []
+    return [chars[i:i + n] for i in range(len(chars) - n + 1)]
+
+
+class LexicalIndex:
+    """meeting_id 단위로 갱신되는 BM25 역색인 (스레드 안전)"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, strong_match: float = None, min_match: float = None):
+        self.k1 = k1
+        self.b = b
+        # 강한 일치: 상위 문서가 질의 바이그램(IDF 가중)의 이 비율 이상을 포함하면 벡터 검색을 건너뜁니다.
+        self.strong_match = strong_match or float(os.getenv("MOIT_LEXICAL_STRONG_MATCH", "0.8"))
+        # 이 비율보다 낮게 겹치는 문서는 우연한 바이그램 일치로 보고 결과에서 뺍니다.
+        self.min_match = min_match or float(os.getenv("MOIT_LEXICAL_MIN_MATCH", "0.3"))
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._terms: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._documents: Dict[str, Tuple[str, dict]] = {}
+        self.ready = False
+        self.stats = {"searches": 0, "strong_hits": 0, "upserts": 0, "deletes": 0, "rebuilds": 0}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    # --- 갱신 ---
+    def _remove(self, doc_id: str):
+        terms = self._terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+        self._documents.pop(doc_id, None)
+
+    def _add(self, doc_id: str, page_content: str, metadata: dict):
+        self._remove(doc_id)
+        grams = char_ngrams(metadata.get("title", "")) * TITLE_BOOST + char_ngrams(metadata.get("description", ""))
+        terms = Counter(grams)
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._terms[doc_id] = terms
+        self._lengths[doc_id] = len(grams)
+        self._total_length += len(grams)
+        self._documents[doc_id] = (page_content, dict(metadata))
+
+    def upsert_meetings(self, meetings: List[dict]):
+        """/meetings/add 요청 형식의 모임들을 색인합니다. (같은 id 는 덮어씁니다)"""
+        records = [meeting_to_record(meeting) for meeting in meetings]
+        with self._lock:
+            for doc_id, page_content, metadata in records:
+                self._add(doc_id, page_content, metadata)
+            self.stats["upserts"] += len(records)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(str(doc_id))
+            self.stats["deletes"] += len(ids)
+
+    def rebuild(self, records: Dict[str, dict]):
+        """벡터 인덱스의 meeting_id -> 메타데이터 (list_index_records 결과) 로 인덱스를 새로 만듭니다."""
+        with self._lock:
+            self._postings, self._terms, self._lengths, self._documents = {}, {}, {}, {}
+            self._total_length = 0
+            for doc_id, metadata in records.items():
+                if {"title", "description", "time", "location"} <= metadata.keys():
+                    self._add(str(doc_id), record_text(metadata), metadata)
+            self.ready = True
+            self.stats["rebuilds"] += 1
+        logging.info(f"키워드 인덱스 구성 완료: 모임 {len(self._documents)}건, 바이그램 {len(self._postings)}개")
+
+    # --- 검색 ---
+    def search(self, query: str, k: int = 4, metadata_filter: Optional[dict] = None) -> Tuple[List[Tuple[Document, float, float]], bool]:
+        """(문서, BM25 점수, 질의 일치 비율) 목록과 강한 일치 여부를 반환합니다."""
+        terms = set(char_ngrams(query))
+        with self._lock:
+            self.stats["searches"] += 1
+            count = len(self._documents)
+            if not terms or not count:
+                return [], False
+            average_length = self._total_length / count
+            scores, matched = {}, {}
+            total_idf = 0.0
+            for term in terms:
+                postings = self._postings.get(term, {})
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                total_idf += idf
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] = matched.get(doc_id, 0.0) + idf
+            hits = []
+            for doc_id in sorted(scores, key=scores.get, reverse=True):
+                coverage = matched[doc_id] / total_idf if total_idf else 0.0
+                page_content, metadata = self._documents[doc_id]
+                if coverage < self.min_match or not matches_filter(metadata, metadata_filter):
+                    continue
+                hits.append((Document(page_content=page_content, metadata=dict(metadata)), scores[doc_id], coverage))
+                if len(hits) >= k:
+                    break
+            strong = bool(hits) and len(terms) > 1 and max(coverage for _, _, coverage in hits) >= self.strong_match
+            if strong:
+                self.stats["strong_hits"] += 1
+            return hits, strong
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "ready": self.ready, "documents": len(self._documents), "terms": len(self._postings)}
+
+
+meeting_lexical_index = LexicalIndex()
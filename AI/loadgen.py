@@ -0,0 +1,261 @@
+# loadgen.py
+# 외부 API 비용 없이 /agent/invoke 처리량을 재는 부하 생성기
+#   - 기본은 지연 시간/흔들림(jitter)을 가진 가짜 공급자를 끼운 main 앱을 프로세스 안에서 직접 호출합니다.
+#   - --url 을 주면 이미 떠 있는 서버로 요청을 보냅니다. (이때 공급자는 서버 설정을 따릅니다)
+#   - 페이로드는 PHP 화면이 실제로 보내는 형태를 섞어서 만듭니다.
+#       create_meeting.php  -> {"messages": [["user", {title, description, location, time}]]}
+#       ai_search.php       -> {"messages": [["user", "자유 텍스트"]]}
+#       get_ai_recommendation.php -> {"survey": {...}, "image_paths": [...]}
+# 사용법: python loadgen.py --requests 200 --concurrency 16 --save baseline.json
+#         python loadgen.py --requests 200 --concurrency 16 --compare baseline.json
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import LatencyProfile, install_fake_providers
+
+ROUTE_LABELS = {"meeting": "meeting_matching", "search": "general_search", "hobby": "hobby_recommendation"}
+
+MEETING_TEMPLATES = [
+    ("주말 아침 한강 러닝", "토요일 아침 7시에 반포한강공원에서 5km 가볍게 뛰어요", "서울 서초구"),
+    ("같이 축구하실 분!", "일요일 오전 풋살장 대관했습니다. 초보 환영", "서울 마포구"),
+    ("퇴근 후 보드게임", "수요일 저녁 보드게임 카페에서 2~3시간 즐겨요", "서울 강남구"),
+    ("독서 모임 멤버 모집", "한 달에 한 권, 에세이 위주로 읽고 이야기 나눠요", "경기 성남시"),
+    ("초보 등산 모임", "북한산 둘레길 천천히 걸으실 분", "서울 은평구"),
+    ("사진 출사", "주말 오후 서울숲 출사, 폰카도 괜찮아요", "서울 성동구"),
+    ("영어 회화 스터디", "화/목 저녁 온라인으로 프리토킹", "온라인"),
+    ("뜨개질 같이 해요", "카페에서 각자 작품 뜨면서 수다", "부산 해운대구"),
+]
+
+SEARCH_QUERIES = [
+    "비 오는 주말에 뭐하지?",
+    "오늘 서울 날씨 어때?",
+    "강남역 근처 조용한 카페 추천해줘",
+    "이번 주말 전시회 뭐 있어?",
+    "혼자 할 만한 실내 운동 알려줘",
+    "서울에서 주말에 할 만한 클래스 있어?",
+    "내일 미세먼지 어때?",
+    "초보자가 시작하기 좋은 악기는?",
+]
+
+
+def make_sample_images(directory: str, count: int = 4):
+    """취미 추천 요청에 붙일 휴대폰 사진 크기의 JPEG 파일을 만듭니다."""
+    from PIL import Image
+
+    rng = random.Random(7)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"hobby_{i}.jpg")
+        image = Image.effect_noise((2016, 1512), 40 + i * 10).convert("RGB")
+        tint = Image.new("RGB", image.size, tuple(rng.randint(0, 255) for _ in range(3)))
+        Image.blend(image, tint, 0.5).save(path, quality=92)
+        paths.append(path)
+    return paths
+
+
+def make_payload(kind: str, rng: random.Random, image_paths):
+    if kind == "meeting":
+        title, description, location = rng.choice(MEETING_TEMPLATES)
+        meeting = {
+            "title": title,
+            "description": f"{description} #{rng.randint(1, 10_000)}",
+            "location": location,
+            "time": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(7, 21):02d}:00",
+        }
+        return {"messages": [["user", meeting]]}
+    if kind == "search":
+        return {"messages": [["user", f"{rng.choice(SEARCH_QUERIES)} ({rng.randint(1, 10_000)})"]]}
+    survey = {str(q): rng.randint(1, 5) for q in range(1, 48)}
+    return {"survey": survey, "image_paths": rng.sample(image_paths, rng.randint(0, min(3, len(image_paths))))}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        kind, weight = part.split("=")
+        if kind not in ROUTE_LABELS:
+            raise SystemExit(f"알 수 없는 경로 종류: {kind} (가능: {', '.join(ROUTE_LABELS)})")
+        mix[kind] = float(weight)
+    return mix
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples, errors: int, wall_seconds: float) -> dict:
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "rps": round(len(samples) / wall_seconds, 3) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 1) if samples else 0.0,
+    }
+
+
+async def run_load(client, jobs, concurrency: int, timeout: float):
+    """동시 작업자 concurrency 개가 jobs 를 순서대로 가져가 처리하는 닫힌 루프 부하"""
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    results = []
+
+    async def worker():
+        while True:
+            try:
+                kind, payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            ok = False
+            try:
+                response = await client.post("/agent/invoke", json={"user_input": payload}, timeout=timeout)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            results.append((kind, time.perf_counter() - start, ok))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def build_report(results, wall_seconds: float, config: dict) -> dict:
+    routes = {}
+    for kind in ROUTE_LABELS:
+        samples = [seconds for k, seconds, ok in results if k == kind and ok]
+        errors = sum(1 for k, _, ok in results if k == kind and not ok)
+        if samples or errors:
+            routes[ROUTE_LABELS[kind]] = summarize(samples, errors, wall_seconds)
+    overall = summarize([seconds for _, seconds, ok in results if ok], sum(1 for *_, ok in results if not ok), wall_seconds)
+    return {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": config,
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": overall,
+        "routes": routes,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n총 {report['overall']['requests']}건, {report['wall_seconds']:.2f}s")
+    print(f"{'route':<22}{'n':>6}{'err':>5}{'rps':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, stats in list(report["routes"].items()) + [("overall", report["overall"])]:
+        print(f"{name:<22}{stats['requests']:>6}{stats['errors']:>5}{stats['rps']:>9.2f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> bool:
+    """기준선 대비 p95 지연이 tolerance 배를 넘거나 처리량이 1/tolerance 미만이면 회귀로 봅니다."""
+    print(f"\n기준선({baseline.get('created_at')}) 대비 (허용 배수 {tolerance})")
+    ok = True
+    names = list(current["routes"]) + ["overall"]
+    for name in names:
+        now = current["overall"] if name == "overall" else current["routes"][name]
+        before = baseline["overall"] if name == "overall" else baseline.get("routes", {}).get(name)
+        if not before:
+            print(f"{name:<22} 기준선 없음")
+            continue
+        p95_ratio = now["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        rps_ratio = now["rps"] / before["rps"] if before["rps"] else 1.0
+        regressed = p95_ratio > tolerance or rps_ratio < 1 / tolerance or now["errors"] > before["errors"]
+        ok = ok and not regressed
+        print(f"{name:<22} p95 {before['p95_ms']:.1f} -> {now['p95_ms']:.1f}ms ({(p95_ratio - 1) * 100:+.1f}%), "
+              f"rps {before['rps']:.2f} -> {now['rps']:.2f} ({(rps_ratio - 1) * 100:+.1f}%)"
+              f"{'  <- 회귀' if regressed else ''}")
+    return ok
+
+
+async def main_async(args):
+    import httpx
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*mix.items())
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        image_paths = make_sample_images(image_dir, args.images) if args.images else []
+        jobs = []
+        for _ in range(args.requests):
+            kind = rng.choices(kinds, weights=weights)[0]
+            jobs.append((kind, make_payload(kind, rng, image_paths)))
+
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                       limits=httpx.Limits(max_connections=args.concurrency))
+        else:
+            import main
+            if not args.verbose:
+                # 요청마다 찍히는 노드 로그가 결과 표를 가리지 않도록 경고 이상만 남깁니다.
+                logging.getLogger().setLevel(logging.WARNING)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadgen", timeout=args.timeout)
+        async with client:
+            if args.warmup:
+                await run_load(client, jobs[:args.warmup], min(args.concurrency, args.warmup), args.timeout)
+            results, wall_seconds = await run_load(client, jobs, args.concurrency, args.timeout)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "compare")}
+    return build_report(results, wall_seconds, config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MOIT /agent/invoke 오프라인 부하 측정")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="meeting=0.4,search=0.3,hobby=0.3", help="경로별 비율 (meeting/search/hobby)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--images", type=int, default=4, help="취미 추천 요청에 섞어 넣을 샘플 사진 수")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="이미 떠 있는 서버 주소 (지정하면 가짜 공급자를 쓰지 않음)")
+    parser.add_argument("--save", help="결과를 기준선 JSON으로 저장")
+    parser.add_argument("--compare", help="기준선 JSON과 비교 (회귀 시 종료 코드 1)")
+    parser.add_argument("--tolerance", type=float, default=1.2)
+    parser.add_argument("--verbose", action="store_true", help="서버 INFO 로그를 그대로 출력")
+    # 가짜 공급자 지연 시간 (평균/표준편차, 초). --time-scale 로 전체를 한 번에 줄이거나 늘릴 수 있습니다.
+    parser.add_argument("--llm-latency", type=float, nargs=2, default=(0.6, 0.2), metavar=("MEAN", "JITTER"))
+    parser.add_argument("--gemini-latency", type=float, nargs=2, default=(3.0, 0.8), metavar=("MEAN", "JITTER"))
+    parser.add_argument("--embedding-latency", type=float, nargs=2, default=(0.15, 0.05), metavar=("MEAN", "JITTER"))
+    parser.add_argument("--vector-latency", type=float, nargs=2, default=(0.06, 0.02), metavar=("MEAN", "JITTER"))
+    parser.add_argument("--search-latency", type=float, nargs=2, default=(0.8, 0.3), metavar=("MEAN", "JITTER"))
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if not args.url:
+        profile = LatencyProfile(
+            llm=tuple(args.llm_latency), gemini=tuple(args.gemini_latency), embedding=tuple(args.embedding_latency),
+            vector_store=tuple(args.vector_latency), web_search=tuple(args.search_latency), call_tools=True,
+        ).scaled(args.time_scale)
+        install_fake_providers(profile)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n기준선 저장: {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare_reports(report, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
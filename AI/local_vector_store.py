@@ -0,0 +1,294 @@
+# local_vector_store.py
+# Pinecone 대신 쓸 수 있는 프로세스 내부 벡터 인덱스 (MOIT_VECTOR_BACKEND=local)
+#   - 정규화된 벡터를 NumPy 행렬 하나에 보관하고 내적으로 코사인 유사도를 계산합니다.
+#   - meeting_id(= 벡터 id) 기준 upsert / delete 를 지원합니다.
+#   - 디스크 스냅샷은 vectors.npy + records.json 이며, 재시작 시 memory-map 으로 읽어옵니다.
+#       변경마다 전체를 다시 쓰지 않고, 변경 후 MOIT_LOCAL_INDEX_FLUSH_SECONDS 동안 모아서 별도 스레드에서 한 번 기록합니다.
+#       (검색을 막지 않도록 잠금은 행렬을 복사하는 동안만 잡고, 종료 시 close() 가 남은 변경을 기록합니다)
+
+import os
+import json
+import uuid
+import logging
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from meeting_index import matches_filter
+
+
+class LocalVectorStore(VectorStore):
+    """NumPy 행렬 + 메타데이터 배열로 구성된 인메모리 벡터 스토어"""
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None, flush_interval: float = None):
+        self._embedding = embedding
+        self.path = path
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("MOIT_LOCAL_INDEX_FLUSH_SECONDS", "5"))
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # 스냅샷 기록은 한 번에 하나씩
+        self._dirty = False
+        self._flush_timer = None
+        self._vectors = None  # (capacity, dim) float32, 앞의 _size 행만 유효
+        self._size = 0
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._rows = {}  # id -> 행 번호
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self):
+        return self._size
+
+    # --- 내부 행렬 관리 ---
+    def _ensure_capacity(self, dim: int, needed: int):
+        if self._vectors is None:
+            self._vectors = np.zeros((max(needed, 64), dim), dtype=np.float32)
+            return
+        capacity = self._vectors.shape[0]
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+        elif self._vectors.flags.writeable:
+            return
+        # 용량이 부족하거나, memory-map 으로 읽은 읽기 전용 스냅샷이면 쓰기 가능한 배열로 옮깁니다.
+        grown = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _upsert(self, ids: List[str], vectors: np.ndarray, texts: List[str], metadatas: List[dict]):
+        with self._lock:
+            self._ensure_capacity(vectors.shape[1], self._size + len(ids))
+            for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+                row = self._rows.get(id_)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[id_] = row
+                    self._ids.append(id_)
+                    self._texts.append(text)
+                    self._metadatas.append(dict(metadata))
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = dict(metadata)
+                self._vectors[row] = vector
+
+    # --- VectorStore 인터페이스 ---
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._normalize(self._embedding.embed_documents(texts))
+        self._upsert(ids, vectors, texts, metadatas)
+        self._mark_dirty()
+        return ids
+
+    async def aadd_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                         ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._normalize(await self._embedding.aembed_documents(texts))
+        self._upsert(ids, vectors, texts, metadatas)
+        self._mark_dirty()
+        return ids
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """이미 계산된 임베딩을 그대로 추가합니다."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self._upsert(ids, self._normalize(embeddings), list(texts), metadatas)
+        self._mark_dirty()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        with self._lock:
+            removed = False
+            for id_ in ids or []:
+                row = self._rows.pop(id_, None)
+                if row is None:
+                    continue
+                self._ensure_capacity(self._vectors.shape[1], self._size)
+                last = self._size - 1
+                if row != last:
+                    # 마지막 행을 빈 자리로 옮겨 행렬을 연속적으로 유지합니다.
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size -= 1
+                removed = True
+        if removed:
+            self._mark_dirty()
+        return True
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        with self._lock:
+            return [
+                Document(page_content=self._texts[self._rows[id_]], metadata=dict(self._metadatas[self._rows[id_]]))
+                for id_ in ids if id_ in self._rows
+            ]
+
+    def all_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._ids)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        query = self._normalize(embedding)[0]
+        metadata_filter = kwargs.get("filter")
+        with self._lock:
+            if self._size == 0:
+                return []
+            if metadata_filter:
+                # 메타데이터 필터(Pinecone 문법)로 후보 행을 먼저 고른 뒤 그 행들만 점수를 계산합니다.
+                rows = np.fromiter((row for row in range(self._size) if matches_filter(self._metadatas[row], metadata_filter)),
+                                   dtype=np.int64)
+                if rows.size == 0:
+                    return []
+                scores = self._vectors[rows] @ query
+            else:
+                rows = None
+                scores = self._vectors[:self._size] @ query
+            k = min(k, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            indices = rows[top] if rows is not None else top
+            return [
+                (Document(page_content=self._texts[row], metadata=dict(self._metadatas[row])), float(score))
+                for row, score in zip(indices.tolist(), scores[top].tolist())
+            ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = await self._embedding.aembed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, **kwargs)]
+
+    async def _asimilarity_search_with_relevance_scores(self, query: str, k: int = 4,
+                                                        **kwargs: Any) -> List[Tuple[Document, float]]:
+        relevance_score_fn = self._select_relevance_score_fn()
+        return [(doc, relevance_score_fn(score)) for doc, score in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # PineconeVectorStore(cosine)와 같은 변환을 써서 score_threshold 0.75 의 의미를 동일하게 유지합니다.
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "LocalVectorStore":
+        store = cls(embedding=embedding, path=kwargs.get("path"))
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
+
+    # --- 스냅샷 ---
+    def _mark_dirty(self):
+        """변경을 기록해 두고, 예약된 스냅샷이 없으면 flush_interval 뒤로 예약합니다."""
+        if not self.path:
+            return
+        if self.flush_interval <= 0:
+            self.save()
+            return
+        with self._lock:
+            self._dirty = True
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(self.flush_interval, self._flush_scheduled)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_scheduled(self):
+        with self._lock:
+            self._flush_timer = None
+        try:
+            self.save()
+        except Exception as e:
+            logging.error(f"로컬 벡터 인덱스 스냅샷 기록 실패 ({self.path}): {e}")
+            with self._lock:
+                self._dirty = True
+
+    def save(self):
+        """현재 인덱스를 디스크에 기록합니다. path가 없으면 아무것도 하지 않습니다."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                # 잠금은 복사하는 동안만 잡고, 파일 기록은 잠금 밖에서 합니다.
+                self._dirty = False
+                dim = self._vectors.shape[1] if self._vectors is not None else 0
+                vectors = self._vectors[:self._size].copy() if self._vectors is not None else np.zeros((0, dim), dtype=np.float32)
+                records = {"ids": list(self._ids), "texts": list(self._texts), "metadatas": list(self._metadatas)}
+            os.makedirs(self.path, exist_ok=True)
+            tmp_vectors = os.path.join(self.path, "vectors.tmp.npy")
+            tmp_records = os.path.join(self.path, "records.tmp.json")
+            np.save(tmp_vectors, np.ascontiguousarray(vectors))
+            with open(tmp_records, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_vectors, os.path.join(self.path, "vectors.npy"))
+            os.replace(tmp_records, os.path.join(self.path, "records.json"))
+
+    def flush(self):
+        """예약된 스냅샷을 기다리지 않고 남은 변경을 바로 기록합니다."""
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+            dirty = self._dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.save()
+
+    def close(self):
+        self.flush()
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "LocalVectorStore":
+        """스냅샷이 있으면 memory-map 으로 읽어오고, 없으면 빈 인덱스를 만듭니다."""
+        store = cls(embedding=embedding, path=path)
+        vectors_path = os.path.join(path, "vectors.npy")
+        records_path = os.path.join(path, "records.json")
+        if os.path.exists(vectors_path) and os.path.exists(records_path):
+            with open(records_path, encoding="utf-8") as f:
+                records = json.load(f)
+            vectors = np.load(vectors_path, mmap_mode="r")
+            store._ids = records["ids"]
+            store._texts = records["texts"]
+            store._metadatas = records["metadatas"]
+            store._rows = {id_: row for row, id_ in enumerate(store._ids)}
+            store._size = len(store._ids)
+            store._vectors = vectors if store._size else None
+            logging.info(f"로컬 벡터 인덱스 스냅샷 로드: {path} ({store._size}개)")
+        return store
@@ -1,43 +1,120 @@
 # main_V3.py (main_tea.py 기반 + StateGraph 취미 추천 에이전트 이식)
 
 # --- 1. 기본 라이브러리 import ---
-from fastapi import FastAPI, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()  # 콜드 스타트(import -> 첫 성공 응답) 측정 기준점
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 import requests
 import json
-from datetime import datetime # 오늘 날짜 확인을 위해 추가
+import asyncio
+import hashlib
 from typing import List, TypedDict, Optional
 import logging
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
 # --- 2. 로깅 기본 설정 ---
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:     %(message)s')
 
 # --- 3. LangChain, LangGraph 및 AI 관련 라이브러리 import ---
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import chain
-from langchain_pinecone import PineconeVectorStore # ReAct Agent
-from langgraph.prebuilt import create_react_agent
-from langchain.agents import AgentExecutor, create_openai_tools_agent
+from langchain_core.runnables import chain, RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, END
 from langchain_core.tools import tool
-from tenacity import retry, stop_after_attempt, wait_fixed
-import google.generativeai as genai # Gemini 추가
-from requests.exceptions import Timeout, ConnectionError
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain.tools.retriever import create_retriever_tool
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.pydantic_v1 import BaseModel as SchemaModel, Field
+from langchain_core.output_parsers import PydanticOutputParser
+from resource_pool import registry, get_meeting_index_name, STREAM_TOKENS_TAG
+from router_tiers import ROUTES, TieredRouter
+from micro_batcher import MicroBatcher
+from provider_guard import provider_guards, StreamInterruptedError
+from admission import (admission, has_time_for, hold_slot_until, time_left, start_request, within_deadline,
+                       run_until_disconnect, AdmissionRejected, DeadlineExceeded, ClientDisconnected, DEADLINE_HEADER,
+                       OPTIONAL_WORK_RESERVES)
+from tool_engine import ParallelToolAgent
+from web_search import build_web_search_tool, web_search_cache, today
+from meeting_index import meeting_to_record, aingest_meetings, normalize_region, upcoming_filter
+from image_pipeline import image_preprocessor, content_hash
+from survey_engine import analyze_survey
+from ttl_cache import AsyncTTLCache
+from job_queue import JobRunner, JobStore
+from db import save_hobby_recommendation, get_db_connection
+from index_outbox import IndexOutbox, list_index_records, reconcile, sweep_expired
+from lexical_index import meeting_lexical_index
+from prompt_budget import count_tokens, fit_profile, format_meeting_context, prompt_stats, router_view
+from backfill import load_meeting_payloads, load_meeting_payloads_by_ids
+from telemetry import telemetry_handler, span, start_trace, log_trace, metrics_payload, REQUEST_DURATION, STARTUP_SECONDS
+# google.generativeai, langchain_openai, langchain_pinecone, Tavily/AgentExecutor 같은 무거운 공급자 모듈은
+# 모듈 로드 시점이 아니라 워밍업 단계나 그 모듈이 필요한 경로에서 처음 쓰일 때 import 합니다.
 
 # --- 4. 환경 설정 및 FastAPI 앱 초기화 ---
 load_dotenv()
+
+job_runner: Optional[JobRunner] = None
+index_outbox: Optional[IndexOutbox] = None
+
+# 모임 추가/삭제를 바로 Pinecone에 반영하지 않고 대기열에 모았다가 묶어서 반영합니다. (0이면 요청마다 즉시 반영)
+INDEX_WRITE_BEHIND = os.getenv("MOIT_INDEX_WRITE_BEHIND", "1") == "1"
+# 시작 시각이 지난 모임을 인덱스에서 빼는 주기(초). 0이면 끕니다. 삭제는 위 대기열을 거쳐 배치로 반영됩니다.
+INDEX_SWEEP_INTERVAL = float(os.getenv("MOIT_INDEX_SWEEP_INTERVAL", "600"))
+# 정리할 때 meetings 테이블에서 정원 마감/재모집 같은 상태 변화도 확인합니다.
+INDEX_SWEEP_CHECK_DB = os.getenv("MOIT_INDEX_SWEEP_DB", "1") == "1"
+sweep_task: Optional[asyncio.Task] = None
+last_sweep: Optional[dict] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 서버 시작 시 임베딩/벡터 스토어/LLM 클라이언트를 한 번만 만들고, 종료 시 HTTP 세션을 닫습니다.
+    global job_runner, index_outbox, warmup_task, sweep_task
+    if WARMUP_ENABLED:
+        # 워밍업은 백그라운드에서 돌리고, 끝날 때까지 /readyz 는 503 을 반환합니다. (/healthz 는 바로 200)
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        readiness["ready"] = True
+    # 취미 추천 비동기 작업 큐: 이전 실행에서 끝나지 않은 작업도 여기서 다시 이어서 처리합니다.
+    job_runner = JobRunner(
+        JobStore(),
+        {"hobby_recommendation": run_hobby_recommendation_job},
+        http_client_getter=lambda: registry.http_async_client,
+    )
+    job_runner.start()
+    if INDEX_WRITE_BEHIND:
+        # 이전 실행에서 반영하지 못한 인덱스 변경도 여기서 이어서 반영합니다.
+        index_outbox = IndexOutbox(
+            lambda: registry.get_vector_store(get_meeting_index_name()),
+            mirrors=[meeting_lexical_index] if LEXICAL_SEARCH_ENABLED else None,
+        )
+        index_outbox.start()
+        if INDEX_SWEEP_INTERVAL > 0:
+            sweep_task = asyncio.create_task(run_index_sweeper())
+    yield
+    readiness["ready"] = False
+    if warmup_task is not None:
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    await job_runner.stop()
+    job_runner.store.close()
+    if sweep_task is not None:
+        sweep_task.cancel()
+        await asyncio.gather(sweep_task, return_exceptions=True)
+    if index_outbox is not None:
+        await index_outbox.stop()
+    image_preprocessor.shutdown()
+    await registry.ashutdown()
+
 app = FastAPI(
     title="MOIT AI Agent Server v3 (StateGraph 이식)",
     description="main_tea.py 기반 위에 StateGraph 취미 추천 에이전트를 이식한 버전",
     version="3.0.0",
+    lifespan=lifespan,
 )
 
 # --- CORS 미들웨어 추가 ---
@@ -50,17 +127,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- 요청 시간 측정 미들웨어 ---
+# 모든 요청의 처리 시간은 /metrics 로 내보내고, "X-MOIT-Timing: 1" 헤더가 있으면
+# 노드/LLM/임베딩/검색 구간별 시간 분해를 Server-Timing 응답 헤더와 로그로 남깁니다.
+# "X-MOIT-Deadline-Ms" 헤더(클라이언트가 더 기다릴 수 있는 시간)는 요청 마감 시각으로 그래프 끝까지 전파됩니다.
+TIMING_HEADER = "x-moit-timing"
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    trace = start_trace() if request.headers.get(TIMING_HEADER) == "1" else None
+    start_request(request.headers.get(DEADLINE_HEADER))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            log_trace(request.url.path, trace)
+        return response
+    finally:
+        # 경로 변수(/meetings/delete/{meeting_id})가 라벨을 늘리지 않도록 라우트 템플릿을 씁니다.
+        route = request.scope.get("route")
+        REQUEST_DURATION.labels(request.method, getattr(route, "path", "unmatched"), str(status)).observe(time.perf_counter() - start)
+        if readiness["first_success_seconds"] is None and status < 400 and getattr(route, "path", None) not in PROBE_ROUTES:
+            readiness["first_success_seconds"] = time.perf_counter() - _IMPORT_STARTED
+            STARTUP_SECONDS.labels("first_request").set(readiness["first_success_seconds"])
+            logging.info(f"--- 첫 성공 응답까지 {readiness['first_success_seconds']:.2f}s (import 시작 기준) ---")
+
 # --- AI 모델 및 API 키 설정 ---
-try:
-    gemini_api_key = os.getenv("GOOGLE_API_KEY")
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-    else:
-        logging.warning("GOOGLE_API_KEY가 .env 파일에 설정되지 않았습니다. 사진 분석 기능이 작동하지 않을 수 있습니다.")
-except Exception as e:
-    logging.warning(f"Gemini API 키 설정 실패: {e}")
+_genai = None
+
+def get_genai():
+    """google.generativeai 를 처음 쓸 때 import 하고 API 키를 설정합니다. (사진 분석 경로와 워밍업에서만 사용)"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai # Gemini 추가
+        try:
+            gemini_api_key = os.getenv("GOOGLE_API_KEY")
+            if gemini_api_key:
+                genai.configure(api_key=gemini_api_key)
+            else:
+                logging.warning("GOOGLE_API_KEY가 .env 파일에 설정되지 않았습니다. 사진 분석 기능이 작동하지 않을 수 있습니다.")
+        except Exception as e:
+            logging.warning(f"Gemini API 키 설정 실패: {e}")
+        _genai = genai
+    return _genai
+
+llm = registry.lazy_llm("gpt-4o-mini")
+
+def structured_chain(prompt: ChatPromptTemplate, schema, model=None):
+    """구조화 출력을 지원하는 모델이면 with_structured_output을, 아니면 JSON 파서를 사용합니다. (기본 모델: meeting_llm)
+
+    모델은 지연 생성(LazyLLM)이라 지원 여부를 첫 호출 때 알 수 있으므로, 조립 시점이 아니라 호출 시점에 대체 경로로 넘어갑니다.
+    """
+    model = model or meeting_llm
+    parser = PydanticOutputParser(pydantic_object=schema)
+    fallback = prompt.partial(format_instructions=parser.get_format_instructions()) | model | parser
+    return (prompt | model.with_structured_output(schema)).with_fallbacks(
+        [fallback], exceptions_to_handle=(NotImplementedError,),
+    )
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+class ClassificationLabels(SchemaModel):
+    labels: List[str] = Field(description="각 항목의 분류 결과. 항목 순서대로, 항목 수와 같은 길이")
+
+def clean_label(label: str) -> str:
+    return str(label).strip().lower().replace("'", "").replace('"', '')
 
 
 # --- 5. 마스터 에이전트 로직 전체 정의 ---
@@ -69,34 +201,64 @@ llm = ChatOpenAI(model="gpt-4o-mini")
 class MasterAgentState(TypedDict):
     user_input: dict
     route: str
+    route_tier: str # 라우팅을 결정한 단계 (rule / centroid / llm)
     final_answer: str
 
 # 5-2. 라우터 노드 정의
+ROUTE_GUIDE = """[경로 설명]
+    - `meeting_matching`: 사용자가 '새로운 모임'을 만들려고 할 때, 기존에 있던 '유사한 모임'을 추천해주는 경로입니다. 입력에 'title', 'description' 키가 포함되어 있으면 이 경로일 확률이 높습니다.
+    - `hobby_recommendation`: 사용자에게 '새로운 취미' 자체를 추천해주는 경로입니다. 입력에 'survey' 키가 포함되어 있으면 이 경로일 확률이 매우 높습니다.
+    - `general_search`: 사용자가 날씨, 맛집, 특정 정보 검색 등 '일반적인 질문'을 하거나, '모임/취미 추천' 이외의 대화를 시도할 때 사용되는 경로입니다. 예를 들어 "주말에 비 오는데 뭐하지?" 와 같은 질문이 해당됩니다."""
+
 router_prompt = ChatPromptTemplate.from_template(
     """당신은 사용자의 요청을 분석하여 어떤 담당자에게 전달해야 할지 결정하는 AI 라우터입니다.
     사용자의 요청을 보고, 아래 세 가지 경로 중 가장 적절한 경로 하나만 골라 그 이름만 정확히 답변해주세요.
  
-    [경로 설명]
-    - `meeting_matching`: 사용자가 '새로운 모임'을 만들려고 할 때, 기존에 있던 '유사한 모임'을 추천해주는 경로입니다. 입력에 'title', 'description' 키가 포함되어 있으면 이 경로일 확률이 높습니다.
-    - `hobby_recommendation`: 사용자에게 '새로운 취미' 자체를 추천해주는 경로입니다. 입력에 'survey' 키가 포함되어 있으면 이 경로일 확률이 매우 높습니다.
-    - `general_search`: 사용자가 날씨, 맛집, 특정 정보 검색 등 '일반적인 질문'을 하거나, '모임/취미 추천' 이외의 대화를 시도할 때 사용되는 경로입니다. 예를 들어 "주말에 비 오는데 뭐하지?" 와 같은 질문이 해당됩니다.
+    {route_guide}
  
     [사용자 요청]:
     {user_input}
  
     [판단 결과 (meeting_matching, hobby_recommendation, 또는 general_search)]:
     """
+).partial(route_guide=ROUTE_GUIDE)
+# 라우터에는 경로 판단에 필요한 키 이름과 짧은 미리보기만 넘깁니다. (긴 설명/설문 값 제외)
+router_chain = RunnableLambda(lambda inputs: {"user_input": router_view(inputs["user_input"])}) | router_prompt | llm | StrOutputParser()
+
+# 동시에 들어온 LLM 라우터 호출은 짧게 모아 한 번의 다항목 구조화 호출로 처리합니다. (한가할 때는 단건 호출)
+router_batch_prompt = ChatPromptTemplate.from_template(
+    """당신은 사용자의 요청을 분석하여 어떤 담당자에게 전달해야 할지 결정하는 AI 라우터입니다.
+    아래 [요청]들은 서로 다른 사용자가 보낸 것입니다. 각 요청을 따로 판단하여, 요청 순서대로 경로 이름 하나씩을 labels 배열에 담아 답변해주세요. 배열 길이는 반드시 {count}개여야 합니다.
+
+    {route_guide}
+    {format_instructions}
+    {items}"""
+).partial(route_guide=ROUTE_GUIDE, format_instructions="")
+router_batch_chain = structured_chain(router_batch_prompt, ClassificationLabels, model=llm)
+
+async def route_batch(user_inputs: list) -> list:
+    items = "\n".join(f"[요청 {i + 1}]: {router_view(user_input)}" for i, user_input in enumerate(user_inputs))
+    result = await router_batch_chain.ainvoke({"count": len(user_inputs), "items": items})
+    labels = [clean_label(label) for label in result.labels]
+    # 알 수 없는 경로가 나온 항목은 None 으로 돌려 단건 호출로 다시 판단합니다.
+    return [label if label in ROUTES else None for label in labels] if len(labels) == len(user_inputs) else []
+
+router_batcher = MicroBatcher(
+    "router", lambda user_input: router_chain.ainvoke({"user_input": user_input}), route_batch,
 )
-router_chain = router_prompt | llm | StrOutputParser()
 
-def route_request(state: MasterAgentState):
+async def classify_route(inputs: dict) -> str:
+    return await router_batcher.submit(inputs["user_input"])
+
+# 스키마 규칙 -> 임베딩 중심점 분류기 -> LLM 순서로 시도하는 단계형 라우터
+tiered_router = TieredRouter(RunnableLambda(classify_route), lambda: registry.get_embeddings())
+
+async def route_request(state: MasterAgentState):
     """사용자의 입력을 보고 어떤 전문가에게 보낼지 결정하는 노드"""
     logging.info("--- ROUTING ---")
-    # [수정] 불필요한 로그 라인을 제거하고, invoke에 user_input을 직접 전달합니다.
-    route_decision = router_chain.invoke({"user_input": state['user_input']})
-    cleaned_decision = route_decision.strip().lower().replace("'", "").replace('"', '')
-    logging.info(f"라우팅 결정: {cleaned_decision}")
-    return {"route": cleaned_decision}
+    cleaned_decision, tier = await tiered_router.route(state['user_input'])
+    logging.info(f"라우팅 결정: {cleaned_decision} (결정 단계: {tier})")
+    return {"route": cleaned_decision, "route_tier": tier}
 
 # 5-3. 전문가 호출 노드들 정의
 
@@ -104,42 +266,27 @@ def route_request(state: MasterAgentState):
 @tool
 def get_current_date() -> str:
     """오늘 날짜를 'YYYY년 MM월 DD일' 형식의 문자열로 반환합니다. '오늘', '내일', '이번 주'와 같은 상대적인 시간 표현을 정확히 해석해야 할 때 사용하세요."""
-    return datetime.now().strftime("%Y년 %m월 %d일")
+    return today().strftime("%Y년 %m월 %d일")
 
 
 # 전문가 0: 범용 검색 에이전트 (신규 추가)
-def call_general_search_agent(state: MasterAgentState):
-    """'범용 검색 에이전트'를 호출하여 웹 검색 또는 내부 모임 DB 검색을 수행하는 노드"""
-    logging.info("--- CALLING: General Search Agent ---")
+# 도구별 제한 시간(초). 넘기면 해당 도구 결과 없이 부분 답변을 만듭니다.
+GENERAL_SEARCH_TOOL_TIMEOUTS = {
+    "web_search": float(os.getenv("MOIT_WEB_SEARCH_TIMEOUT", "8")),
+    "moit_internal_meeting_search": float(os.getenv("MOIT_MEETING_SEARCH_TIMEOUT", "5")),
+    "get_current_date": 1.0,
+}
 
-    # 1. 도구 정의
-    # 1-1. 웹 검색 도구
-    tavily_tool = TavilySearchResults(max_results=3, name="web_search")
-    tavily_tool.description = "날씨, 뉴스, 맛집, 특정 주제에 대한 최신 정보 등 외부 세계에 대한 질문에 답할 때 사용합니다."
-
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    def web_search_with_retry(query: str):
-        """날씨, 뉴스, 맛집, 특정 주제에 대한 최신 정보 등 외부 세계에 대한 질문에 답할 때 사용합니다."""
-        try:
-            return tavily_tool.invoke({"query": query})
-        except (Timeout, ConnectionError) as e:
-            logging.error(f"Web search failed due to connection error or timeout: {e}")
-            raise  # 다시 시도하려면 예외를 다시 발생시킵니다.
-        except Exception as e:
-            logging.error(f"Web search failed with error: {e}")
-            return f"오류: 웹 검색에 실패했습니다. {e}"  # 오류 메시지 반환
-        except Exception as e:
-            logging.error(f"Web search failed with error: {e}")
-            raise  # Re-raise the exception to trigger retry
+def build_general_search_agent():
+    """'범용 검색 에이전트'(도구 + 프롬프트 + 병렬 도구 실행 엔진)를 조립합니다. 요청마다가 아니라 프로세스당 한 번만 호출됩니다."""
+    from langchain.tools.retriever import create_retriever_tool
 
+    # 1. 도구 정의
+    # 1-1. 웹 검색 도구 (질의 + 날짜 구간 키로 캐시, 만료된 결과는 백그라운드에서 갱신)
+    tavily_tool = build_web_search_tool(max_results=3)
 
-    web_search_with_retry.description = "날씨, 뉴스, 맛집, 특정 주제에 대한 최신 정보 등 외부 세계에 대한 질문에 답할 때 사용합니다."
-    # 1-2. 내부 모임 DB 검색 도구 (기존 로직 재활용)
-    meeting_index_name = os.getenv("PINECONE_INDEX_NAME_MEETING")
-    if not meeting_index_name: raise ValueError("'.env' 파일에 PINECONE_INDEX_NAME_MEETING 변수를 설정해야 합니다.")
-    embedding_function = OpenAIEmbeddings(model='text-embedding-3-large')
-    vector_store = PineconeVectorStore.from_existing_index(index_name=meeting_index_name, embedding=embedding_function)
-    retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={'k': 3})
+    # 1-2. 내부 모임 DB 검색 도구 (기존 로직 재활용, 시작 전 + 모집 중인 모임만)
+    retriever = MeetingSearchRetriever(search_kwargs={'k': 3})
     
     moit_meeting_retriever_tool = create_retriever_tool(
         retriever,
@@ -148,13 +295,11 @@ def call_general_search_agent(state: MasterAgentState):
     )
 
     # 1-3. 오늘 날짜 확인 도구
-    get_current_date_tool = get_current_date
-    tools = [web_search_with_retry, moit_meeting_retriever_tool]
-
-    tools = [tavily_tool, moit_meeting_retriever_tool, get_current_date_tool]
+    tools = [tavily_tool, moit_meeting_retriever_tool, get_current_date]
 
-    # 2. ReAct 에이전트 생성
-    # [중요] ReAct 프롬프트에 에이전트의 역할과 도구 사용법을 명확히 지시합니다.
+    # 2. 도구 호출 에이전트 생성
+    # [중요] 프롬프트에 에이전트의 역할과 도구 사용법을 명확히 지시합니다.
+    # 서로 의존하지 않는 도구는 한 번에 함께 호출하도록 안내해, 엔진이 동시에 실행할 수 있게 합니다.
     react_prompt = ChatPromptTemplate.from_messages(
 
         [
@@ -162,25 +307,37 @@ def call_general_search_agent(state: MasterAgentState):
             당신은 세 가지 도구를 사용할 수 있습니다: 'web_search', 'moit_internal_meeting_search', 'get_current_date'.
 
             [지침]
-            1. **시간 인식**: 질문에 '오늘', '내일' 등 상대적 시간이 있으면, 먼저 `get_current_date`로 오늘 날짜를 확인하고, 그 다음 `web_search`로 가장 공신력있는 정보를 찾으세요. (예: 날씨는 네이버날씨(weather.naver.com)를 통해 검색하세요)
+            1. **시간 인식**: 질문에 '오늘', '내일' 등 상대적 시간이 있으면 `get_current_date`로 오늘 날짜를 확인하고, `web_search`로 가장 공신력있는 정보를 찾으세요. (예: 날씨는 네이버날씨(weather.naver.com)를 통해 검색하세요)
             2. **모임 검색**: "축구 하고 싶은데 모임 없나?"처럼 MOIT 서비스 내 모임을 찾는 요청에는 `moit_internal_meeting_search`를 사용하세요.
-            3. **복합 질문 처리**: "비 오는 주말에 ?" 같은 질문에는, `web_search`로 날씨를 확인한 후, 그 결과를 이용해 `moit_internal_meeting_search`로 '실내 모임'을 찾거나 없다면 새로운 취미를 추천해주는 등 도구를 조합하여 최적의 답을 찾으세요.
+            3. **복합 질문 처리**: "비 오는 주말에 뭐하지?" 같은 질문에는 `web_search`(날씨 확인)와 `moit_internal_meeting_search`('실내 모임' 검색)를 한 번에 함께 호출하고, 결과를 조합해 실내 모임을 추천하거나 없다면 새로운 취미를 추천하세요.
             4. **일반 질문**: 그 외 모든 일반적인 질문(뉴스, 맛집, 상식, 추천)은 `web_search`를 사용하세요.
+            5. **동시 호출**: 서로의 결과가 필요 없는 도구 호출은 항상 한 번에 함께 요청하세요.
             
             최종 답변은 항상 친절한 말투로 정리하고, 모임을 추천할 때는 참여를 유도하는 문구를 포함해주세요.
             """),
-            MessagesPlaceholder(variable_name="chat_history"),
+            MessagesPlaceholder(variable_name="chat_history", optional=True),
             ("human", "{input}"), # "user_input" 대신 "input" 사용
             MessagesPlaceholder(variable_name="agent_scratchpad"),
-            MessagesPlaceholder(variable_name="chat_history", optional=True),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
         ]
     )
-    
-    general_agent_runnable = create_react_agent(llm, tools, react_prompt)
-    agent = create_openai_tools_agent(llm, tools, react_prompt)
-    general_agent_runnable = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    # 최종 답변 토큰을 /agent/stream 으로 흘려보낼 수 있도록 태그를 붙입니다.
+    return ParallelToolAgent(
+        llm.with_config(tags=[STREAM_TOKENS_TAG]), tools, react_prompt, tool_timeouts=GENERAL_SEARCH_TOOL_TIMEOUTS,
+    )
+
+_general_agent_executor = None
+
+def get_general_search_agent():
+    """미리 조립해 둔 범용 검색 에이전트를 반환합니다. (벡터 스토어 연결이 필요하므로 첫 사용 시 조립)"""
+    global _general_agent_executor
+    if _general_agent_executor is None:
+        _general_agent_executor = build_general_search_agent()
+    return _general_agent_executor
+
+async def call_general_search_agent(state: MasterAgentState):
+    """'범용 검색 에이전트'를 호출하여 웹 검색 또는 내부 모임 DB 검색을 수행하는 노드"""
+    logging.info("--- CALLING: General Search Agent ---")
+    general_agent_runnable = get_general_search_agent()
 
     # 3. 에이전트 실행
     # MasterAgent의 user_input 형식에 맞게 실제 질문을 추출합니다.
@@ -193,72 +350,131 @@ def call_general_search_agent(state: MasterAgentState):
 
     input_data = {"input": user_question, "chat_history": []} # chat_history 추가
     logging.info(f"범용 검색 에이전트에게 전달된 질문: {user_question}") # 로깅 수정
-    logging.info(f"general_agent_runnable.invoke에 전달되는 입력: {input_data}") # 로깅 추가
 
-    result = general_agent_runnable.invoke(input_data) # input_data를 사용하여 호출
-    logging.info(f"범용 검색 에이전트에게 전달된 질문: {user_question}")
+    async with admission.slot("general_search"):
+        # 요청 마감에서 답변 정리 시간을 뺀 만큼만 도구 루프에 씁니다.
+        left = time_left()
+        budget = None if left is None else left - OPTIONAL_WORK_RESERVES["general_search_answer"]
+        result = await within_deadline(general_agent_runnable.ainvoke(input_data, deadline=budget)) # 한 번의 루프로 실행 (도구는 턴마다 동시 실행)
     
-    result = general_agent_runnable.invoke({"input": user_question})
-    
-    final_answer = result.get("output", "질문을 이해하지 못했습니다. 다시 질문해주세요.")
-    logging.info(f"범용 검색 에이전트의 최종 답변: {final_answer}")
+    final_answer = result.get("output") or "질문을 이해하지 못했습니다. 다시 질문해주세요."
+    logging.info(f"범용 검색 에이전트의 최종 답변: {final_answer} (도구 호출 {len(result['intermediate_steps'])}회, 부분 답변: {result['partial']})")
     
     return {"final_answer": final_answer}
 
 # 전문가 1: 모임 매칭 에이전트 (SubGraph) - main_tea.py 코드 기반
-def call_meeting_matching_agent(state: MasterAgentState):
-    """'모임 매칭 에이전트'를 독립적인 SubGraph로 실행하고 결과를 받아오는 노드"""
-    logging.info("--- CALLING: Meeting Matching Agent ---")
-
-    class MeetingAgentState(TypedDict):
-        title: str; description: str; time: str; location: str; query: str
-        context: List[Document]; answer: str; decision: str; rewrite_count: int
-
-    meeting_llm = ChatOpenAI(model="gpt-4o-mini")
-    meeting_index_name = os.getenv("PINECONE_INDEX_NAME_MEETING")
-    if not meeting_index_name: raise ValueError("'.env' 파일에 PINECONE_INDEX_NAME_MEETING 변수를 설정해야 합니다.")
-    
-    embedding_function = OpenAIEmbeddings(model='text-embedding-3-large')
-    vector_store = PineconeVectorStore.from_existing_index(index_name=meeting_index_name, embedding=embedding_function)
-    retriever = vector_store.as_retriever(
+# 서브그래프와 체인은 모듈 로드 시 한 번만 컴파일하고, 요청별 입력은 state로만 전달합니다.
+class MeetingAgentState(TypedDict):
+    title: str; description: str; time: str; location: str; query: str
+    context: List[Document]; answer: str; decision: str; rewrite_count: int
+
+meeting_llm = registry.lazy_llm("gpt-4o-mini")
+
+# 유사도 순위를 매기기 전에 메타데이터 필터로 "시작 전 + 모집 중 (+ 같은 지역)" 모임만 남깁니다.
+MEETING_FILTER_ENABLED = os.getenv("MOIT_MEETING_FILTER", "1") == "1"
+MEETING_REGION_FILTER = os.getenv("MOIT_MEETING_REGION_FILTER", "1") == "1"
+# 모임 제목/설명 키워드 인덱스(BM25)를 벡터 검색과 합칩니다. 강한 키워드 일치면 임베딩 호출 없이 바로 답합니다.
+LEXICAL_SEARCH_ENABLED = os.getenv("MOIT_LEXICAL_SEARCH", "1") == "1"
+
+class MeetingSearchRetriever(BaseRetriever):
+    """호출할 때마다 현재 시각으로 필터를 만들어 키워드 인덱스와 공유 벡터 스토어를 검색합니다.
+    같은 지역 결과가 없으면 지역 조건만 빼고 다시 찾습니다."""
+    search_type: str = "similarity"
+    search_kwargs: dict = {}
+    region: str = ""
+
+    def _filter(self, region: str) -> Optional[dict]:
+        if not MEETING_FILTER_ENABLED:
+            return None
+        return upcoming_filter(region if MEETING_REGION_FILTER else None)
+
+    def _retriever(self, region: str):
+        search_kwargs = dict(self.search_kwargs)
+        metadata_filter = self._filter(region)
+        if metadata_filter:
+            search_kwargs["filter"] = metadata_filter
+        vector_store = registry.get_vector_store(get_meeting_index_name())
+        return vector_store.as_retriever(search_type=self.search_type, search_kwargs=search_kwargs)
+
+    def _lexical(self, query: str, region: str):
+        if not LEXICAL_SEARCH_ENABLED or not meeting_lexical_index.ready:
+            return [], False
+        hits, strong = meeting_lexical_index.search(query, self.search_kwargs.get("k", 4), self._filter(region))
+        return [doc for doc, _, _ in hits], strong
+
+    def _fuse(self, vector_docs: List[Document], lexical_docs: List[Document]) -> List[Document]:
+        if not lexical_docs:
+            return vector_docs
+        return reciprocal_rank_fusion([vector_docs, lexical_docs])[:self.search_kwargs.get("k", 4)]
+
+    def _should_widen(self, docs: List[Document], region: str) -> bool:
+        return not docs and bool(region) and MEETING_FILTER_ENABLED and MEETING_REGION_FILTER
+
+    def _search(self, query: str, region: str, run_manager) -> List[Document]:
+        lexical_docs, strong = self._lexical(query, region)
+        if strong:
+            return lexical_docs
+        vector_docs = self._retriever(region).invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(vector_docs, lexical_docs)
+
+    async def _asearch(self, query: str, region: str, run_manager) -> List[Document]:
+        lexical_docs, strong = self._lexical(query, region)
+        if strong:
+            logging.info(f"키워드 인덱스 강한 일치로 벡터 검색을 건너뜁니다: {query}")
+            return lexical_docs
+        vector_docs = await self._retriever(region).ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(vector_docs, lexical_docs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self._search(query, self.region, run_manager)
+        if self._should_widen(docs, self.region):
+            docs = self._search(query, "", run_manager)
+        return docs
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        docs = await self._asearch(query, self.region, run_manager)
+        if self._should_widen(docs, self.region):
+            logging.info(f"같은 지역({self.region})의 모임이 없어 지역 조건 없이 다시 검색합니다.")
+            docs = await self._asearch(query, "", run_manager)
+        return docs
+
+def get_meeting_retriever(location: str = ""):
+    """유사도 임계값 검색기를 만듭니다. (가벼운 래퍼 생성만 수행, location 이 있으면 같은 지역 우선)"""
+    return MeetingSearchRetriever(
         search_type="similarity_score_threshold",
-        search_kwargs={'score_threshold': 0.75, 'k': 2}
-    )  
+        search_kwargs={'score_threshold': 0.75, 'k': 2},
+        region=normalize_region(location),
+    )
 
-    prepare_query_prompt = ChatPromptTemplate.from_template(
-        """당신은 사용자가 입력한 정보를 바탕으로 유사한 다른 정보를 검색하기 위한 최적의 검색어를 만드는 전문가입니다.
+prepare_query_prompt = ChatPromptTemplate.from_template(
+    """당신은 사용자가 입력한 정보를 바탕으로 유사한 다른 정보를 검색하기 위한 최적의 검색어를 만드는 전문가입니다.
         아래 [모임 정보]를 종합하여, 벡터 데이터베이스에서 유사한 모임을 찾기 위한 가장 핵심적인 검색 질문을 한 문장으로 만들어주세요.
         [모임 정보]:
 - 제목: {title}
 - 설명: {description}
 - 시간: {time}
 - 장소: {location}"""
-    )
-    prepare_query_chain = prepare_query_prompt | meeting_llm | StrOutputParser()
-    def prepare_query(m_state: MeetingAgentState):
-        logging.info("--- (Sub) Preparing Query ---")
-        query = prepare_query_chain.invoke({"title": m_state['title'], "description": m_state['description'], "time": m_state.get('time', ''), "location": m_state.get('location', '')})
-        logging.info(f"생성된 검색어: {query}")
-        return {"query": query}
-
-    def retrieve(m_state: MeetingAgentState):
-        logging.info("--- (Sub) Retrieving Context from DB ---")
-        context = retriever.invoke(m_state["query"])
-        logging.info(f"DB에서 {len(context)}개의 유사 문서를 찾았습니다.")
-        return {"context": context}
-
-    generate_prompt = ChatPromptTemplate.from_template(
-        """당신은 사용자의 요청을 매우 엄격하게 분석하여 유사한 모임을 추천하는 MOIT 플랫폼의 AI입니다.
+)
+prepare_query_chain = prepare_query_prompt | meeting_llm | StrOutputParser()
+async def prepare_query(m_state: MeetingAgentState):
+    logging.info("--- (Sub) Preparing Query ---")
+    query = await prepare_query_chain.ainvoke({"title": m_state['title'], "description": m_state['description'], "time": m_state.get('time', ''), "location": m_state.get('location', '')})
+    logging.info(f"생성된 검색어: {query}")
+    return {"query": query}
+
+async def retrieve(m_state: MeetingAgentState):
+    logging.info("--- (Sub) Retrieving Context from DB ---")
+    context = await get_meeting_retriever(m_state.get("location", "")).ainvoke(m_state["query"])
+    logging.info(f"DB에서 {len(context)}개의 유사 문서를 찾았습니다.")
+    return {"context": context}
+
+# 고정 지시문을 앞에, 요청마다 바뀌는 입력/검색 결과를 맨 뒤에 두어 프롬프트 접두사 캐시가 맞도록 합니다.
+meeting_generate_prompt = ChatPromptTemplate.from_template(
+    """당신은 사용자의 요청을 매우 엄격하게 분석하여 유사한 모임을 추천하는 MOIT 플랫폼의 AI입니다.
         사용자가 만들려는 모임과 **주제, 활동 내용이 명확하게 일치하는** 기존 모임만 추천해야 합니다.
 
-        [사용자 입력 정보]:
-        {query}
-
-        [검색된 유사 모임 정보]:
-        {context}
-
         [지시사항]:
-        1. [검색된 유사 모임 정보]의 각 항목을 [사용자 입력 정보]와 비교하여, **정말로 관련성이 높다고 판단되는 모임만** 골라냅니다. (예: '축구' 모임을 찾는 사용자에게 '야구' 모임은 추천하지 않습니다.)
+        1. 아래 [검색된 유사 모임 정보]의 각 항목을 [사용자 입력 정보]와 비교하여, **정말로 관련성이 높다고 판단되는 모임만** 골라냅니다. (예: '축구' 모임을 찾는 사용자에게 '야구' 모임은 추천하지 않습니다.)
         2. 1번에서 골라낸 모임이 있다면, 해당 모임을 기반으로 사용자에게 제안할 추천사를 친절한 말투("~는 어떠세요?")로 작성합니다.
         3. 1번에서 골라낸 모임의 `meeting_id`와 `title`을 추출하여 `recommendations` 배열을 구성합니다. **추천할 모임이 하나뿐이라면, 배열에 하나만 포함합니다.**
         4. 최종 답변을 아래와 같은 JSON 형식으로만 제공해주세요. 다른 텍스트는 절대 포함하지 마세요.
@@ -277,64 +493,96 @@ def call_meeting_matching_agent(state: MasterAgentState):
             "summary": "",
             "recommendations": []
         }}
+
+        [사용자 입력 정보]:
+        {query}
+
+        [검색된 유사 모임 정보]:
+        {context}
         """
-    )
-    generate_chain = generate_prompt | meeting_llm | StrOutputParser()
-    def generate(m_state: MeetingAgentState):
-        logging.info("--- (Sub) Generating Final Answer ---")
-        context_str = ""
-        for i, doc in enumerate(m_state['context']):
-            metadata = doc.metadata or {}
-            meeting_id = metadata.get('meeting_id', 'N/A')
-            title = metadata.get('title', 'N/A')
-            context_str += f"모임 {i+1}:\n  - meeting_id: {meeting_id}\n  - title: {title}\n  - content: {doc.page_content}\n\n"
-        if not m_state['context']: context_str = "유사한 모임을 찾지 못했습니다."
-        logging.info(f"--- (Sub) 최종 추천 생성을 위해 LLM에 전달할 컨텍스트 ---\n{context_str}")
-        answer = generate_chain.invoke({"context": context_str, "query": m_state['query']})
-        return {"answer": answer}
-
-    check_helpfulness_prompt = ChatPromptTemplate.from_template(
-        """당신은 AI 답변을 평가하는 엄격한 평가관입니다. 주어진 [AI 답변]이 사용자의 [원본 질문] 의도에 대해 유용한 제안을 하는지 평가해주세요.
+)
+generate_chain = meeting_generate_prompt | meeting_llm | StrOutputParser()
+async def generate(m_state: MeetingAgentState):
+    logging.info("--- (Sub) Generating Final Answer ---")
+    context_str = format_meeting_context(m_state['context'], chain="meeting_generate")
+    logging.info(f"--- (Sub) 최종 추천 생성을 위해 LLM에 전달할 컨텍스트 ---\n{context_str}")
+    answer = await generate_chain.ainvoke({"context": context_str, "query": m_state['query']})
+    return {"answer": answer}
+
+check_helpfulness_prompt = ChatPromptTemplate.from_template(
+    """당신은 AI 답변을 평가하는 엄격한 평가관입니다. 주어진 [AI 답변]이 사용자의 [원본 질문] 의도에 대해 유용한 제안을 하는지 평가해주세요.
         다른 설명은 일절 추가하지 말고, 오직 'helpful' 또는 'unhelpful' 둘 중 하나의 단어로만 답변해야 합니다.
 
         [원본 질문]: {query}
         [AI 답변]: {answer}
-        
+
         [평가 결과 (helpful 또는 unhelpful)]:"""
+)
+check_helpfulness_chain = check_helpfulness_prompt | meeting_llm | StrOutputParser()
+
+check_helpfulness_batch_prompt = ChatPromptTemplate.from_template(
+    """당신은 AI 답변을 평가하는 엄격한 평가관입니다. 아래 [평가 항목]마다 [AI 답변]이 [원본 질문] 의도에 대해 유용한 제안을 하는지 따로 평가해주세요.
+        항목 순서대로 'helpful' 또는 'unhelpful' 중 하나를 labels 배열에 담아 답변해야 합니다. 배열 길이는 반드시 {count}개여야 합니다.
+        {format_instructions}
+        {items}"""
+).partial(format_instructions="")
+check_helpfulness_batch_chain = structured_chain(check_helpfulness_batch_prompt, ClassificationLabels)
+
+async def check_helpfulness_batch(items: list) -> list:
+    text = "\n".join(
+        f"[평가 항목 {i + 1}]\n[원본 질문]: {item['query']}\n[AI 답변]: {item['answer']}\n" for i, item in enumerate(items)
     )
-    check_helpfulness_chain = check_helpfulness_prompt | meeting_llm | StrOutputParser()
-    def check_helpfulness(m_state: MeetingAgentState):
-        logging.info("--- (Sub) Checking Helpfulness ---")
-        raw_result = check_helpfulness_chain.invoke({"query": m_state['query'], "answer": m_state['answer']})
-        
-        cleaned_result = raw_result.strip().lower().replace('"', '').replace("'", "")
-        decision = "helpful" if cleaned_result == "helpful" else "unhelpful"
-        
-        logging.info(f"답변 유용성 평가 (Raw): {raw_result} -> (Parsed): {decision}")
-        return {"decision": decision}
+    result = await check_helpfulness_batch_chain.ainvoke({"count": len(items), "items": text})
+    labels = [clean_label(label) for label in result.labels]
+    return [label if label in ("helpful", "unhelpful") else None for label in labels] if len(labels) == len(items) else []
+
+helpfulness_batcher = MicroBatcher("helpfulness", check_helpfulness_chain.ainvoke, check_helpfulness_batch)
+
+def has_recommendations(answer: str) -> bool:
+    """생성된 답변 JSON에 추천 모임이 하나라도 있는지 (마감이 가까워 LLM 평가를 건너뛸 때의 판정)"""
+    try:
+        return bool(json.loads(answer.strip().removeprefix("```json").strip("`").strip()).get("recommendations"))
+    except (ValueError, AttributeError):
+        return False
+
+async def check_helpfulness(m_state: MeetingAgentState):
+    logging.info("--- (Sub) Checking Helpfulness ---")
+    if not has_time_for("check_helpfulness"):
+        return {"decision": "helpful" if has_recommendations(m_state['answer']) else "unhelpful"}
+    raw_result = await helpfulness_batcher.submit({"query": m_state['query'], "answer": m_state['answer']})
+
+    cleaned_result = raw_result.strip().lower().replace('"', '').replace("'", "")
+    decision = "helpful" if cleaned_result == "helpful" else "unhelpful"
 
-    rewrite_query_prompt = ChatPromptTemplate.from_template(
-        """당신은 더 나은 검색 결과를 위해 질문을 재구성하는 프롬프트 엔지니어입니다.
+    logging.info(f"답변 유용성 평가 (Raw): {raw_result} -> (Parsed): {decision}")
+    return {"decision": decision}
+
+rewrite_query_prompt = ChatPromptTemplate.from_template(
+    """당신은 더 나은 검색 결과를 위해 질문을 재구성하는 프롬프트 엔지니어입니다.
         [원본 질문]은 벡터 검색에서 좋은 결과를 얻지 못했습니다. 원본 질문의 핵심 의도는 유지하되, 완전히 다른 관점에서 접근하거나, 더 구체적인 키워드를 사용하여 관련성 높은 모임을 찾을 수 있는 새로운 검색 질문을 하나만 만들어주세요.
         [원본 질문]: {query}
         [새로운 검색 질문]:"""
-    )
-    rewrite_query_chain = rewrite_query_prompt | meeting_llm | StrOutputParser()
-    def rewrite_query(m_state: MeetingAgentState):
-        logging.info("--- (Sub) Rewriting Query ---")
-        new_query = rewrite_query_chain.invoke({"query": m_state['query']})
-        logging.info(f"재작성된 검색어: {new_query}")
-        count = m_state.get('rewrite_count', 0) + 1
-        return {"query": new_query, "rewrite_count": count}
-
-    def decide_to_continue(state: MeetingAgentState):
-        if state.get("rewrite_count", 0) >= 2: 
-            logging.info(f"--- 재시도 횟수({state.get('rewrite_count', 0)}) 초과했기에 루프를 종료합니다. ---")
-            return END
-        if state.get("decision") == "helpful":
-            return END
-        return "rewrite_query"
-
+)
+rewrite_query_chain = rewrite_query_prompt | meeting_llm | StrOutputParser()
+async def rewrite_query(m_state: MeetingAgentState):
+    logging.info("--- (Sub) Rewriting Query ---")
+    new_query = await rewrite_query_chain.ainvoke({"query": m_state['query']})
+    logging.info(f"재작성된 검색어: {new_query}")
+    count = m_state.get('rewrite_count', 0) + 1
+    return {"query": new_query, "rewrite_count": count}
+
+def decide_to_continue(state: MeetingAgentState):
+    if state.get("rewrite_count", 0) >= 2: 
+        logging.info(f"--- 재시도 횟수({state.get('rewrite_count', 0)}) 초과했기에 루프를 종료합니다. ---")
+        return END
+    if state.get("decision") == "helpful":
+        return END
+    if not has_time_for("rewrite_query"):
+        return END
+    return "rewrite_query"
+
+def build_meeting_matching_agent():
+    """모임 매칭 서브그래프를 조립하고 컴파일합니다."""
     graph_builder = StateGraph(MeetingAgentState)
     graph_builder.add_node("prepare_query", prepare_query)
     graph_builder.add_node("retrieve", retrieve)
@@ -347,7 +595,138 @@ def call_meeting_matching_agent(state: MasterAgentState):
     graph_builder.add_edge("generate", "check_helpfulness")
     graph_builder.add_conditional_edges("check_helpfulness", decide_to_continue)
     graph_builder.add_edge("rewrite_query", "retrieve")
-    meeting_agent = graph_builder.compile()
+    agent = graph_builder.compile()
+    agent.name = "meeting"  # 구간 이름(meeting/<노드>)에 쓰입니다.
+    return agent
+
+meeting_agent = build_meeting_matching_agent()
+
+# --- 모임 매칭 fusion 모드 ---
+# 질의 변형 여러 개를 LLM 한 번으로 만들고 -> 동시에 검색해 RRF로 합친 뒤 -> 구조화 출력 한 번으로 추천과 유용성 판정을 함께 받습니다.
+# (기존 prepare_query -> retrieve -> generate -> check_helpfulness -> rewrite_query 루프는 MOIT_MEETING_MODE=loop 로 계속 사용 가능)
+MEETING_MODE = os.getenv("MOIT_MEETING_MODE", "loop")
+FUSION_QUERY_COUNT = int(os.getenv("MOIT_FUSION_QUERY_COUNT", "3"))
+FUSION_TOP_K = 3
+RRF_K = 60
+
+class FusionMeetingAgentState(TypedDict):
+    title: str; description: str; time: str; location: str
+    queries: List[str]; context: List[Document]; answer: str; decision: str
+
+class MeetingQueryVariants(SchemaModel):
+    queries: List[str] = Field(description="서로 다른 관점에서 작성한 검색 질문 목록")
+
+class MeetingRecommendationItem(SchemaModel):
+    meeting_id: str = Field(description="추천하는 기존 모임의 meeting_id")
+    title: str = Field(description="추천하는 기존 모임의 제목")
+
+class MeetingVerdict(SchemaModel):
+    helpful: bool = Field(description="검색된 모임 중 사용자의 모임과 주제/활동이 명확히 일치하는 것이 있으면 true")
+    summary: str = Field(description="추천사. 추천할 모임이 없으면 빈 문자열")
+    recommendations: List[MeetingRecommendationItem] = Field(description="추천할 모임 목록. 없으면 빈 배열")
+
+generate_queries_prompt = ChatPromptTemplate.from_template(
+    """당신은 사용자가 입력한 정보를 바탕으로 유사한 모임을 찾기 위한 검색 질문을 만드는 전문가입니다.
+아래 [모임 정보]의 핵심 의도는 유지하되, 서로 다른 관점(활동 종류, 분위기, 대상, 구체적인 키워드)에서 작성한 검색 질문을 {count}개 만들어주세요.
+{format_instructions}
+[모임 정보]:
+- 제목: {title}
+- 설명: {description}
+- 시간: {time}
+- 장소: {location}"""
+).partial(format_instructions="")
+generate_queries_chain = structured_chain(generate_queries_prompt, MeetingQueryVariants)
+
+async def generate_queries(f_state: FusionMeetingAgentState):
+    logging.info("--- (Fusion) Generating Query Variants ---")
+    base_query = f"{f_state['title']} {f_state['description']}".strip()
+    if not has_time_for("query_variants"):
+        return {"queries": [base_query]}
+    try:
+        variants = await generate_queries_chain.ainvoke({
+            "title": f_state['title'], "description": f_state['description'],
+            "time": f_state.get('time', ''), "location": f_state.get('location', ''), "count": FUSION_QUERY_COUNT,
+        })
+        queries = [q for q in variants.queries if q.strip()][:FUSION_QUERY_COUNT]
+    except Exception as e:
+        logging.warning(f"질의 변형 생성 실패, 원본 질의만 사용합니다: {e}")
+        queries = []
+    # 원본 제목+설명도 항상 하나의 질의로 포함합니다.
+    queries = list(dict.fromkeys([base_query] + queries))
+    logging.info(f"생성된 검색어 {len(queries)}개: {queries}")
+    return {"queries": queries}
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """여러 검색 결과를 RRF 점수로 합치고 meeting_id 기준으로 중복을 제거합니다."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = (doc.metadata or {}).get('meeting_id') or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked]
+
+async def retrieve_fused(f_state: FusionMeetingAgentState):
+    logging.info("--- (Fusion) Retrieving Context Concurrently ---")
+    retriever = get_meeting_retriever(f_state.get("location", ""))
+    result_lists = await asyncio.gather(*(retriever.ainvoke(query) for query in f_state["queries"]))
+    context = reciprocal_rank_fusion(result_lists)[:FUSION_TOP_K]
+    logging.info(f"질의 {len(result_lists)}개의 검색 결과를 합쳐 {len(context)}개의 유사 문서를 찾았습니다.")
+    return {"context": context}
+
+generate_verdict_prompt = ChatPromptTemplate.from_template(
+    """당신은 사용자의 요청을 매우 엄격하게 분석하여 유사한 모임을 추천하는 MOIT 플랫폼의 AI입니다.
+사용자가 만들려는 모임과 **주제, 활동 내용이 명확하게 일치하는** 기존 모임만 추천해야 합니다. (예: '축구' 모임을 찾는 사용자에게 '야구' 모임은 추천하지 않습니다.)
+추천할 모임이 있으면 helpful을 true로 하고 친절한 말투("~는 어떠세요?")의 summary와 recommendations를 채우세요.
+추천할 모임이 없으면 helpful은 false, summary는 빈 문자열, recommendations는 빈 배열로 답하세요.
+{format_instructions}
+[사용자 모임 정보]:
+- 제목: {title}
+- 설명: {description}
+
+[검색된 유사 모임 정보]:
+{context}"""
+).partial(format_instructions="")
+generate_verdict_chain = structured_chain(generate_verdict_prompt, MeetingVerdict)
+
+async def generate_with_verdict(f_state: FusionMeetingAgentState):
+    logging.info("--- (Fusion) Generating Answer With Verdict ---")
+    if not f_state['context']:
+        return {"answer": json.dumps({"summary": "", "recommendations": []}), "decision": "unhelpful"}
+    verdict = await generate_verdict_chain.ainvoke({
+        "title": f_state['title'], "description": f_state['description'],
+        "context": format_meeting_context(f_state['context'], chain="meeting_verdict"),
+    })
+    answer = json.dumps({
+        "summary": verdict.summary,
+        "recommendations": [{"meeting_id": item.meeting_id, "title": item.title} for item in verdict.recommendations],
+    }, ensure_ascii=False)
+    decision = "helpful" if verdict.helpful and verdict.recommendations else "unhelpful"
+    logging.info(f"답변 유용성 판정: {decision}")
+    return {"answer": answer, "decision": decision}
+
+def build_fusion_meeting_matching_agent():
+    """fusion 모드 모임 매칭 서브그래프를 조립하고 컴파일합니다."""
+    graph_builder = StateGraph(FusionMeetingAgentState)
+    graph_builder.add_node("generate_queries", generate_queries)
+    graph_builder.add_node("retrieve_fused", retrieve_fused)
+    graph_builder.add_node("generate_with_verdict", generate_with_verdict)
+    graph_builder.set_entry_point("generate_queries")
+    graph_builder.add_edge("generate_queries", "retrieve_fused")
+    graph_builder.add_edge("retrieve_fused", "generate_with_verdict")
+    graph_builder.add_edge("generate_with_verdict", END)
+    agent = graph_builder.compile()
+    agent.name = "meeting_fusion"
+    return agent
+
+fusion_meeting_agent = build_fusion_meeting_matching_agent()
+
+async def call_meeting_matching_agent(state: MasterAgentState, config: RunnableConfig):
+    """'모임 매칭 에이전트'를 독립적인 SubGraph로 실행하고 결과를 받아오는 노드"""
+    logging.info("--- CALLING: Meeting Matching Agent ---")
+    # 요청별로 config["configurable"]["meeting_mode"] 를 주면 환경 변수 설정보다 우선합니다. (지연/품질 비교용)
+    meeting_mode = config.get("configurable", {}).get("meeting_mode", MEETING_MODE)
 
     # create_meeting.php에서 오는 데이터 형식에 맞게 실제 데이터를 추출합니다.
     user_input = state['user_input'].get('messages', [[]])[0][1] if 'messages' in state['user_input'] else state['user_input']
@@ -356,10 +735,14 @@ def call_meeting_matching_agent(state: MasterAgentState):
         "description": user_input.get("description", ""),
         "time": user_input.get("time", ""),
         "location": user_input.get("location", ""),
-        "rewrite_count": 0
     }
     
-    final_result_state = meeting_agent.invoke(initial_state, {"recursion_limit": 15})
+    async with admission.slot("meeting_matching"):
+        if meeting_mode == "fusion":
+            final_result_state = await within_deadline(fusion_meeting_agent.ainvoke(initial_state, {"recursion_limit": 5}))
+        else:
+            initial_state["rewrite_count"] = 0
+            final_result_state = await within_deadline(meeting_agent.ainvoke(initial_state, {"recursion_limit": 15}))
 
     final_decision = final_result_state.get("decision")
     final_answer = final_result_state.get("answer")
@@ -375,11 +758,39 @@ def call_meeting_matching_agent(state: MasterAgentState):
 
 # --- 전문가 2: 취미 추천 에이전트 (StateGraph 기반으로 교체) ---
 
-# [수정] 취미 추천 에이전트가 사용하는 헬퍼 함수
-def normalize(value, min_val, max_val):
-    """(기존 _normalize에서 이름 변경)"""
-    if value is None: return None
-    return round((value - min_val) / (max_val - min_val), 4)
+# Gemini 취미 추천 프롬프트의 고정 지시문. 요청마다 같은 문자열을 맨 앞에 두어 Gemini 의 암묵적 프롬프트 캐시가 맞도록 합니다.
+HOBBY_PROMPT_PREFIX = """# 페르소나 (Persona)
+당신은 사용자의 내면을 깊이 이해하고 공감하는 '디지털 치료 레크리에이션 전문가'입니다.
+
+# 이미지 분석 지시 (Image Analysis Directive)
+이 사용자가 '즐거웠던 순간'으로 직접 선택한 사진들(프롬프트 맨 뒤에 첨부)을 분석해 주세요. 사진 속의 명확한 사물이나 활동뿐만 아니라, 전체적인 분위기, 색감, 빛, 구도, 질감 등에서 느껴지는 감성적인 단서를 포착해 주세요.
+
+# 핵심 과제 및 결과물 형식 (Core Task & Output Format)
+아래의 [사용자 프로필]과 이미지 분석을 종합하여, 사용자에게 맞춤형 취미 추천 메시지를 작성해주세요. 결과물은 아래 두 부분으로 구성되어야 하며, 반드시 지정된 형식을 준수해야 합니다.
+
+### 1. 사용자 분석 요약
+"안녕하세요, 사용자님의 내면 깊은 곳을 이해하고 공감하는 디지털 치료 레크리에이션 전문가입니다." 라는 문장으로 시작해주세요.
+그 다음, [사용자 프로필]과 [이미지 분석] 결과를 종합하여 파악한 사용자의 성향, 잠재된 욕구, 선호도 등을 1~2 문단으로 요약하여 친절하게 설명해주세요.
+예시: "사용자님의 소중한 '즐거웠던 순간' 사진과 현재 프로필을 면밀히 살펴보았습니다. 강한 에너지와 자기 계발 의지, 그리고 진정한 '연결'을 향한 갈망을 느낄 수 있었습니다..."
+
+### 2. 맞춤 취미 제안 (3가지)
+분석 요약에 이어서, 이 사용자가 지금 바로 시작할 수 있는 맞춤형 취미 3가지를 추천해주세요.
+각 취미는 다음 형식을 반드시 준수하여 설명해야 합니다. **`###`나 `**` 같은 마크다운 문법은 절대 사용하지 마세요.**
+
+---
+[첫 번째 추천 취미]
+여기에 취미의 이름을 적어주세요.
+
+[추천 이유]
+여기에 왜 이 취미가 사용자에게 적합한지, 프로필과 사진 분석 결과를 바탕으로 자연스럽게 설명해주세요. `자연(0.75)`와 같은 내부 분석 점수는 절대 노출하지 마세요.
+
+[부드러운 첫걸음]
+여기에 사용자가 부담 없이 시작할 수 있는 구체적인 첫 행동을 초대하는 말투로 제안해주세요.
+
+---
+(두 번째, 세 번째 취미도 위와 동일한 형식으로 반복)
+
+"""
 
 def generate_prompt(profile):
     """[신규 추가] 사용자 프로필 딕셔너리를 받아 Gemini에게 보낼 자연어 프롬프트를 생성합니다."""
@@ -427,11 +838,9 @@ def generate_prompt(profile):
     # --- ★★★ 여기까지 ★★★ ---
 
 
-    # 최종 프롬프트 조합
-    prompt = f"""# 페르소나 (Persona)
-당신은 사용자의 내면을 깊이 이해하고 공감하는 '디지털 치료 레크리에이션 전문가'입니다.
-
-# 컨텍스트: 사용자 프로필 (Context: User Profile)
+    # 최종 프롬프트 조합: 고정 지시문(HOBBY_PROMPT_PREFIX) 뒤에 이 사용자의 프로필만 붙입니다.
+    # 금지 규칙은 프로필이 예산을 넘어도 잘리지 않도록 따로 넘깁니다.
+    profile_text = f"""# 컨텍스트: 사용자 프로필 (Context: User Profile)
 아래는 사용자의 현재 상태를 분석한 데이터입니다. 이 정보는 반드시 지켜야 할 가이드라인입니다.
 {fsc_summary}
 {pssr_summary}
@@ -439,96 +848,17 @@ def generate_prompt(profile):
 {dls_summary}
 {ip_summary} 
 
-{hard_constraints}
-
-# 이미지 분석 지시 (Image Analysis Directive)
-이제 이 사용자가 '즐거웠던 순간'으로 직접 선택한 아래 사진들을 분석해 주세요. 사진 속의 명확한 사물이나 활동뿐만 아니라, 전체적인 분위기, 색감, 빛, 구도, 질감 등에서 느껴지는 감성적인 단서를 포착해 주세요.
-
-# 핵심 과제 및 결과물 형식 (Core Task & Output Format)
-위의 사용자 프로필과 이미지 분석을 종합하여, 사용자에게 맞춤형 취미 추천 메시지를 작성해주세요. 결과물은 아래 두 부분으로 구성되어야 하며, 반드시 지정된 형식을 준수해야 합니다.
-
-### 1. 사용자 분석 요약
-"안녕하세요, 사용자님의 내면 깊은 곳을 이해하고 공감하는 디지털 치료 레크리에이션 전문가입니다." 라는 문장으로 시작해주세요.
-그 다음, [사용자 프로필]과 [이미지 분석] 결과를 종합하여 파악한 사용자의 성향, 잠재된 욕구, 선호도 등을 1~2 문단으로 요약하여 친절하게 설명해주세요.
-예시: "사용자님의 소중한 '즐거웠던 순간' 사진과 현재 프로필을 면밀히 살펴보았습니다. 강한 에너지와 자기 계발 의지, 그리고 진정한 '연결'을 향한 갈망을 느낄 수 있었습니다..."
-
-### 2. 맞춤 취미 제안 (3가지)
-분석 요약에 이어서, 이 사용자가 지금 바로 시작할 수 있는 맞춤형 취미 3가지를 추천해주세요.
-각 취미는 다음 형식을 반드시 준수하여 설명해야 합니다. **`###`나 `**` 같은 마크다운 문법은 절대 사용하지 마세요.**
-
----
-[첫 번째 추천 취미]
-여기에 취미의 이름을 적어주세요.
-
-[추천 이유]
-여기에 왜 이 취미가 사용자에게 적합한지, 프로필과 사진 분석 결과를 바탕으로 자연스럽게 설명해주세요. `자연(0.75)`와 같은 내부 분석 점수는 절대 노출하지 마세요.
-
-[부드러운 첫걸음]
-여기에 사용자가 부담 없이 시작할 수 있는 구체적인 첫 행동을 초대하는 말투로 제안해주세요.
-
----
-(두 번째, 세 번째 취미도 위와 동일한 형식으로 반복)
 """
+    prompt = fit_profile(HOBBY_PROMPT_PREFIX, profile_text, hard_constraints + "\n")
     print("Gemini 프롬프트 생성 완료.")
     return prompt
 
 # 2-1. 취미 추천에 사용될 도구(Tool) 정의
-@tool
-def analyze_survey_tool(survey_json_string: str) -> dict:
-    """[수정] 사용자의 설문 응답(JSON 문자열)을 입력받아, IP 프로필이 포함된 수치적 성향 프로필(딕셔너리)을 반환합니다."""
+def analyze_survey_responses(responses: dict) -> dict:
+    """설문 응답 딕셔너리를 IP 프로필이 포함된 수치적 성향 프로필로 변환합니다. (survey_engine 배치 엔진을 크기 1로 사용)"""
     logging.info("--- 📊 '설문 분석 전문가'가 작업을 시작합니다. (IP 프로필 포함) ---")
     try:
-        responses = json.loads(survey_json_string)
-
-        # --- 새로운 calculate_user_profile_normalized 로직 시작 ---
-        
-        # features 딕셔너리에 'IP' (Interest Profile) 키를 추가합니다.
-        features = {'FSC': {}, 'PSSR': {}, 'MP': {}, 'DLS': {}, 'IP': {}}
-        
-        def to_int(q_num_str):
-            return responses.get(q_num_str)
-
-        # --- FSC (기존과 동일) ---
-        features['FSC']['time_availability'] = normalize(to_int('1'), 1, 4)
-        features['FSC']['financial_budget'] = normalize(to_int('2'), 1, 4)
-        features['FSC']['energy_level'] = normalize(to_int('3'), 1, 5)
-        features['FSC']['mobility'] = normalize(to_int('4'), 1, 5)
-        features['FSC']['has_physical_constraints'] = True if to_int('5') in [1, 2, 3] else False
-        features['FSC']['has_housing_constraints'] = True if to_int('12') in [2, 3, 4] else False
-        features['FSC']['preferred_space'] = 'indoor' if to_int('6') == 1 else 'outdoor'
-
-        # --- PSSR (기존과 동일) ---
-        q13 = to_int('13') or 3; q14_r = 6 - (to_int('14') or 3); q16 = to_int('16') or 3
-        self_criticism_raw = (q13 + q14_r + q16) / 3
-        features['PSSR']['self_criticism_score'] = normalize(self_criticism_raw, 1, 5)
-        q15 = to_int('15') or 3; q18 = to_int('18') or 3; q20 = to_int('20') or 3
-        social_anxiety_raw = (q15 + q18 + q20) / 3
-        features['PSSR']['social_anxiety_score'] = normalize(social_anxiety_raw, 1, 5)
-        features['PSSR']['isolation_level'] = normalize(to_int('21'), 1, 5)
-        features['PSSR']['structure_preference_score'] = normalize(to_int('27'), 1, 5)
-        features['PSSR']['avoidant_coping_score'] = normalize(to_int('29'), 1, 5)
-
-        # --- MP (한국어 값으로 업데이트) ---
-        motivation_map = {1: '성취', 2: '회복', 3: '연결', 4: '활력'}
-        features['MP']['core_motivation'] = motivation_map.get(to_int('31'))
-        features['MP']['value_profile'] = {'knowledge': normalize(to_int('33'), 1, 5), 'stability': normalize(to_int('34'), 1, 5),'relationship': normalize(to_int('35'), 1, 5), 'health': normalize(to_int('36'), 1, 5),'creativity': normalize(to_int('37'), 1, 5), 'control': normalize(to_int('38'), 1, 5),}
-        features['MP']['process_orientation_score'] = normalize(6 - (to_int('41') or 3), 1, 5)
-
-        # --- DLS (한국어 값으로 업데이트) ---
-        sociality_map = {1: '단독형', 2: '병렬형', 3: '저강도 상호작용형', 4: '고강도 상호작용형'}
-        features['DLS']['preferred_sociality_type'] = sociality_map.get(to_int('39'))
-        group_size_map = {1: '1:1', 2: '소규모 그룹', 3: '대규모 그룹'}
-        features['DLS']['preferred_group_size'] = group_size_map.get(to_int('40'))
-        features['DLS']['autonomy_preference_score'] = normalize(to_int('42'), 1, 5)
-        
-        # --- ★★★ 추가된 IP (Interest Profile) 로직 ★★★ ---
-        features['IP']['nature_interest'] = normalize(to_int('43'), 1, 5)
-        features['IP']['craft_interest'] = normalize(to_int('44'), 1, 5)
-        features['IP']['intellect_interest'] = normalize(to_int('45'), 1, 5)
-        features['IP']['art_interest'] = normalize(to_int('46'), 1, 5)
-        features['IP']['activity_interest'] = normalize(to_int('47'), 1, 5)
-        # --- ★★★ 여기까지 ★★★ ---
-        
+        features = analyze_survey(responses)
         logging.info("--- ✅ 설문 분석이 성공적으로 완료되었습니다. ---")
         return features
     except Exception as e:
@@ -536,11 +866,82 @@ def analyze_survey_tool(survey_json_string: str) -> dict:
         return {"error": f"설문 분석 중 오류가 발생했습니다: {e}"}
 
 @tool
-def analyze_photo_tool(image_paths: list[str], survey_profile: dict) -> str:
-    """[수정] 사용자의 사진(image_paths)과 설문 프로필(survey_profile)을 모두 입력받아,
-    두 정보를 종합하여 최종 취미 추천 메시지를 생성하고 반환합니다."""
-    from PIL import Image
-    
+def analyze_survey_tool(survey_json_string: str) -> dict:
+    """[수정] 사용자의 설문 응답(JSON 문자열)을 입력받아, IP 프로필이 포함된 수치적 성향 프로필(딕셔너리)을 반환합니다."""
+    try:
+        responses = json.loads(survey_json_string)
+    except Exception as e:
+        logging.error(f"설문 분석 중 오류 발생: {e}", exc_info=True)
+        return {"error": f"설문 분석 중 오류가 발생했습니다: {e}"}
+    return analyze_survey_responses(responses)
+
+# 취미 추천 생성 모델과, Gemini 장애 시 대신 쓸 OpenAI 비전 모델 (빈 값이면 대체하지 않습니다)
+HOBBY_GEMINI_MODEL = "gemini-2.5-flash"
+HOBBY_FALLBACK_MODEL = os.getenv("MOIT_PHOTO_FALLBACK_MODEL", "gpt-4o-mini")
+
+def track_chunks(on_chunk):
+    """on_chunk 를 감싸 조각을 하나라도 내보냈는지 기록합니다. (내보낸 뒤의 실패는 재시도/대체하지 않습니다)"""
+    if on_chunk is None:
+        return None, lambda: False
+    emitted = []
+
+    def sink(text: str):
+        emitted.append(True)
+        on_chunk(text)
+    return sink, lambda: bool(emitted)
+
+def call_gemini(contents: list, on_chunk=None) -> str:
+    """Gemini 로 추천 메시지를 생성합니다. on_chunk가 주어지면 생성되는 조각을 스트리밍으로 전달합니다."""
+    model = get_genai().GenerativeModel(HOBBY_GEMINI_MODEL)
+    sink, started = track_chunks(on_chunk)
+    # [수정] generate_prompt로 생성한 프롬프트와 이미지 파트를 함께 전달
+    with span("llm", HOBBY_GEMINI_MODEL, model=HOBBY_GEMINI_MODEL) as gemini_span:
+        try:
+            if sink is None:
+                response = model.generate_content(contents)
+                recommendation = response.text
+                usage = getattr(response, "usage_metadata", None)
+            else:
+                # 스트리밍 모드: 생성되는 대로 조각을 on_chunk로 흘려보냅니다.
+                pieces, usage = [], None
+                for chunk in model.generate_content(contents, stream=True):
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if chunk.text:
+                        pieces.append(chunk.text)
+                        sink(chunk.text)
+                recommendation = "".join(pieces)
+        except Exception as e:
+            if started():
+                raise StreamInterruptedError(f"Gemini 스트리밍 중단: {e}") from e
+            raise
+        if usage is not None:
+            gemini_span["prompt_tokens"] = getattr(usage, "prompt_token_count", 0) or 0
+            gemini_span["completion_tokens"] = getattr(usage, "candidates_token_count", 0) or 0
+    return recommendation
+
+def call_vision_fallback(texts: list, images: list, on_chunk=None) -> str:
+    """Gemini 대신 OpenAI 비전 모델에 같은 프롬프트와 전처리된 사진을 보내 추천 메시지를 생성합니다."""
+    from langchain_core.messages import HumanMessage
+    logging.warning(f"--- ↪️ Gemini 대신 {HOBBY_FALLBACK_MODEL} 로 취미 추천을 생성합니다. ---")
+    message = HumanMessage(content=[{"type": "text", "text": "".join(texts)}] + [image.as_openai_part() for image in images])
+    model = registry.get_llm(HOBBY_FALLBACK_MODEL)
+    sink, started = track_chunks(on_chunk)
+    if sink is None:
+        return model.invoke([message]).content
+    pieces = []
+    try:
+        for chunk in model.stream([message]):
+            if chunk.content:
+                pieces.append(chunk.content)
+                sink(chunk.content)
+    except Exception as e:
+        if started():
+            raise StreamInterruptedError(f"{HOBBY_FALLBACK_MODEL} 스트리밍 중단: {e}") from e
+        raise
+    return "".join(pieces)
+
+def generate_hobby_recommendation(image_paths: list[str], survey_profile: dict, on_chunk=None) -> str:
+    """사진과 설문 프로필로 Gemini 추천 메시지를 생성합니다. on_chunk가 주어지면 생성되는 조각을 스트리밍으로 전달합니다."""
     # 1. 프로필을 기반으로 Gemini에게 보낼 프롬프트를 생성합니다.
     try:
         prompt_text = generate_prompt(survey_profile)
@@ -557,36 +958,42 @@ def analyze_photo_tool(image_paths: list[str], survey_profile: dict) -> str:
         logging.info(f"--- 📸 '디지털 치료 레크리에이션 전문가'가 작업을 시작합니다. (이미지 {len(image_paths)}개) ---")
         image_parts = []
 
-    # 3. 이미지 파일을 처리합니다.
+    # 3. 이미지 파일을 처리합니다. (EXIF 회전 보정 + 축소 + 재인코딩, 내용 해시 캐시)
     try:
-        for path in image_paths:
-            try:
-                img = Image.open(path)
-                # Pillow가 지원하지만 Gemini가 지원하지 않는 형식을 대비해 format 확인
-                if img.format.upper() == 'MPO':
-                    # MPO 파일의 경우, 첫 번째 프레임(일반적으로 JPEG)을 사용
-                    img.seek(0)
-                    # MPO에서 추출한 이미지는 format 속성이 없을 수 있으므로, JPEG로 간주하고 추가
-                    image_parts.append(img.copy()) # copy()로 안전하게 추가
-                    logging.info(f"MPO 형식 파일에서 JPEG 프레임을 추출했습니다: {path}")
-                elif img.format.upper() in ['JPEG', 'PNG', 'WEBP', 'HEIC', 'HEIF']:
-                    image_parts.append(img)
-                else:
-                    logging.warning(f"지원하지 않는 이미지 형식({img.format})을 건너뜁니다: {path}")
-            except Exception as img_e:
-                logging.warning(f"이미지 파일을 여는 데 실패하여 건너뜁니다: {path}, 오류: {img_e}")
+        processed = []
+        if image_paths:
+            processed, image_stats = image_preprocessor.preprocess_many(image_paths)
+            image_parts.extend(image.as_gemini_part() for image in processed)
+            logging.info(
+                f"--- 🖼️ 이미지 전처리 완료: {image_stats['images']}개 (캐시 {image_stats['cache_hits']}개), "
+                f"{image_stats['original_bytes']:,}B -> {image_stats['processed_bytes']:,}B "
+                f"({image_stats['bytes_saved']:,}B 절감), {image_stats['seconds'] * 1000:.1f}ms ---"
+            )
         
-        # 4. Gemini 모델을 호출합니다.
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        # [수정] generate_prompt로 생성한 프롬프트와 이미지 파트를 함께 전달
-        response = model.generate_content([prompt_text] + image_parts) 
+        # 4. Gemini 모델을 호출합니다. 공급자 호출 계층이 느린 호출은 헤지하고, 일시적 오류는 백오프로 재시도하며,
+        #    Gemini 가 차단되었거나 계속 실패하면 OpenAI 비전 모델로 같은 프롬프트와 사진을 보냅니다.
+        #    스트리밍은 조각이 두 번 나가지 않도록 헤지하지 않습니다.
+        contents = [prompt_text] + image_parts
+        texts = [prompt_text] + [part for part in image_parts if isinstance(part, str)]
+        fallbacks = [(
+            f"llm:{HOBBY_FALLBACK_MODEL}", lambda: call_vision_fallback(texts, processed, on_chunk),
+        )] if HOBBY_FALLBACK_MODEL else []
+        recommendation = provider_guards.call(
+            f"gemini:{HOBBY_GEMINI_MODEL}", lambda: call_gemini(contents, on_chunk), fallbacks, hedge=on_chunk is None,
+        )
         
         logging.info("--- ✅ 최종 추천 메시지 생성이 성공적으로 완료되었습니다. ---")
-        return response.text
+        return recommendation
     except Exception as e:
         logging.error(f"Gemini 추천 생성 중 오류 발생: {e}", exc_info=True)
         return f"오류: Gemini를 통한 최종 추천 생성 중 문제가 발생했습니다: {e}"
 
+@tool
+def analyze_photo_tool(image_paths: list[str], survey_profile: dict) -> str:
+    """[수정] 사용자의 사진(image_paths)과 설문 프로필(survey_profile)을 모두 입력받아,
+    두 정보를 종합하여 최종 취미 추천 메시지를 생성하고 반환합니다."""
+    return generate_hobby_recommendation(image_paths, survey_profile)
+
 # 2-2. 취미 추천 StateGraph 정의 [수정]
 class HobbyAgentState(TypedDict):
     survey_data: dict
@@ -598,16 +1005,65 @@ class HobbyAgentState(TypedDict):
 
 def analyze_survey_node(state: HobbyAgentState):
     """설문 데이터를 분석하여 정량 프로필을 생성하는 노드"""
-    survey_json_string = json.dumps(state["survey_data"], ensure_ascii=False)
-    survey_profile = analyze_survey_tool.invoke({"survey_json_string": survey_json_string})
+    # JSON 문자열로 왕복하지 않고 설문 딕셔너리를 그대로 엔진에 넘깁니다.
+    survey_profile = analyze_survey_responses(state["survey_data"])
     return {"survey_profile": survey_profile}
 
-def analyze_photo_node(state: HobbyAgentState):
+# 같은 설문 프로필 + 같은 사진으로 다시 요청하면 Gemini를 다시 부르지 않도록 결과를 캐시합니다.
+# (더블 클릭처럼 동시에 들어온 동일 요청은 진행 중인 생성 하나를 함께 기다립니다.)
+HOBBY_CACHE_ENABLED = os.getenv("MOIT_HOBBY_CACHE", "1") == "1"
+hobby_result_cache = AsyncTTLCache(
+    "hobby_recommendation",
+    ttl=float(os.getenv("MOIT_HOBBY_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("MOIT_HOBBY_CACHE_SIZE", "512")),
+)
+
+def hobby_cache_key(survey_profile: dict, image_paths: List[str]) -> str:
+    """정규화된 설문 프로필과 사진 내용 해시로 캐시 키를 만듭니다. (사진 순서는 무시)"""
+    image_hashes = sorted(content_hash(path) for path in image_paths)
+    material = json.dumps({"profile": survey_profile, "images": image_hashes}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def is_cacheable_recommendation(recommendation) -> bool:
+    return isinstance(recommendation, str) and bool(recommendation) and not recommendation.startswith("오류")
+
+async def analyze_photo_node(state: HobbyAgentState, config: RunnableConfig):
     """[수정] 사진과 설문 프로필을 종합하여 최종 추천을 생성하는 노드"""
-    final_recommendation = analyze_photo_tool.invoke({
-        "image_paths": state.get("image_paths", []),
-        "survey_profile": state["survey_profile"]
-    })
+    # /agent/stream 으로 들어온 요청이면 Gemini 생성 조각을 바로 흘려보낼 token_sink가 config에 들어 있습니다.
+    token_sink = config.get("configurable", {}).get("token_sink")
+    image_paths = state.get("image_paths", [])
+    survey_profile = state["survey_profile"]
+    if image_paths and not has_time_for("hobby_photos"):
+        # 마감이 가까우면 사진 분석 없이 설문 프로필만으로 추천합니다.
+        image_paths = []
+
+    async def generate():
+        # Gemini SDK 호출과 PIL 디코딩은 블로킹이므로 크기 제한 스레드 풀에서 실행합니다.
+        if token_sink is not None:
+            work = registry.submit_blocking(
+                generate_hobby_recommendation, image_paths, survey_profile, on_chunk=token_sink
+            )
+        else:
+            work = registry.submit_blocking(analyze_photo_tool.invoke, {
+                "image_paths": image_paths,
+                "survey_profile": survey_profile
+            })
+        # 요청이 끊기거나 마감이 지나도 이미 시작된 Gemini 호출은 멈출 수 없으므로, 끝날 때까지 취미 추천 자리를 붙잡아 둡니다.
+        hold_slot_until(work)
+        return await asyncio.wrap_future(work)
+
+    if not HOBBY_CACHE_ENABLED or "error" in survey_profile:
+        return {"final_recommendation": await generate()}
+
+    cache_key = await registry.run_blocking(hobby_cache_key, survey_profile, image_paths)
+    final_recommendation, status = await hobby_result_cache.get_or_compute(
+        cache_key, generate, should_cache=is_cacheable_recommendation
+    )
+    if status != "miss":
+        logging.info(f"--- ♻️ 취미 추천 결과 재사용 ({status}) ---")
+        if token_sink is not None:
+            # 캐시/공유 결과는 이미 완성된 문장이므로 한 번에 흘려보냅니다.
+            token_sink(final_recommendation)
     return {"final_recommendation": final_recommendation}
 
 # 2-3. 취미 추천 StateGraph 컴파일 [수정]
@@ -620,9 +1076,10 @@ hobby_graph_builder.add_edge("analyze_survey", "analyze_photo_and_recommend") #
 hobby_graph_builder.add_edge("analyze_photo_and_recommend", END) # [수정] 엣지 연결
 
 hobby_supervisor_agent = hobby_graph_builder.compile()
+hobby_supervisor_agent.name = "hobby"
 
 # 2-4. 마스터 에이전트가 호출할 함수
-def call_multimodal_hobby_agent(state: MasterAgentState):
+async def call_multimodal_hobby_agent(state: MasterAgentState):
     """'StateGraph 기반 취미 추천 에이전트'를 호출하고 결과를 받아오는 노드"""
     logging.info("--- CALLING: StateGraph Hobby Supervisor Agent (IP Profile Ver.) ---")
 
@@ -632,7 +1089,8 @@ def call_multimodal_hobby_agent(state: MasterAgentState):
 
     input_data = {"survey_data": survey_data, "image_paths": image_paths}
     
-    final_state = hobby_supervisor_agent.invoke(input_data, config={"recursion_limit": 10})
+    async with admission.slot("hobby_recommendation"):
+        final_state = await within_deadline(hobby_supervisor_agent.ainvoke(input_data, config={"recursion_limit": 10}))
     
     final_answer = final_state.get("final_recommendation", "오류: 최종 추천을 생성하는 데 실패했습니다.")
                 
@@ -664,6 +1122,7 @@ master_graph_builder.add_edge("hobby_recommender", END)
 master_graph_builder.add_edge("general_searcher", END) # 새 노드 종료점 연결
 
 master_agent = master_graph_builder.compile()
+master_agent.name = "master"
 
 
 # --- 6. API 엔드포인트 정의 ---
@@ -671,42 +1130,133 @@ class UserRequest(BaseModel):
     user_input: dict
 
 @app.post("/agent/invoke")
-async def invoke_agent(request: UserRequest):
+async def invoke_agent(request: UserRequest, http_request: Request):
     try:
         input_data = {"user_input": request.user_input}
-        result = master_agent.invoke(input_data, {"recursion_limit": 5}) # 마스터 에이전트에도 안전장치 추가
+        # 클라이언트가 연결을 끊거나 마감이 지나면 그래프와 진행 중인 공급자 호출을 함께 취소합니다.
+        result = await run_until_disconnect(http_request, master_agent.ainvoke(input_data, {"recursion_limit": 5, "callbacks": [telemetry_handler]})) # 마스터 에이전트에도 안전장치 추가
         return {"final_answer": result.get("final_answer", "오류: 최종 답변을 생성하지 못했습니다.")}
+    except AdmissionRejected as e:
+        logging.warning(f"요청 거절: {e}")
+        return JSONResponse(status_code=503, content={"detail": f"요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도해주세요. ({e.reason})"},
+                            headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    except DeadlineExceeded as e:
+        logging.warning(f"마감 초과: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected:
+        logging.info("클라이언트 연결이 끊겨 에이전트 실행을 취소했습니다.")
+        return Response(status_code=499)
     except Exception as e:
         logging.error(f"Agent 실행 중 심각한 오류 발생: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"AI 에이전트 처리 중 내부 서버 오류가 발생했습니다: {str(e)}")
 
+# 스트리밍 응답에서 진행 상황 이벤트로 내보낼 그래프 노드들
+STREAM_PROGRESS_NODES = {
+    "router", "meeting_matcher", "hobby_recommender", "general_searcher",
+    "prepare_query", "retrieve", "generate", "check_helpfulness", "rewrite_query",
+    "generate_queries", "retrieve_fused", "generate_with_verdict",
+    "analyze_survey", "analyze_photo_and_recommend",
+}
+EXPERT_NODES = {"meeting_matcher", "hobby_recommender", "general_searcher"}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _summarize_node_output(output) -> dict:
+    """노드가 반환한 상태 업데이트를 이벤트로 보내기 좋게 줄입니다. (문서 목록은 개수만, 긴 문자열은 앞부분만)"""
+    if not isinstance(output, dict):
+        return {}
+    summary = {}
+    for key, value in output.items():
+        if key in ("final_answer", "final_recommendation", "user_input", "survey_data"):
+            continue
+        if isinstance(value, list):
+            summary[f"{key}_count"] = len(value)
+        elif isinstance(value, str):
+            summary[key] = value[:200]
+        elif isinstance(value, (int, float, bool)) or value is None:
+            summary[key] = value
+    return summary
+
+@app.post("/agent/stream")
+async def stream_agent(request: UserRequest):
+    """/agent/invoke 의 SSE 스트리밍 버전. progress(노드 진행) -> token(답변 조각) -> final 순서로 이벤트를 보냅니다."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def token_sink(text: str):
+        # Gemini 스트리밍은 스레드 풀에서 돌기 때문에 이벤트 루프에 안전하게 넘겨줍니다.
+        loop.call_soon_threadsafe(queue.put_nowait, ("token", {"text": text}))
+
+    async def run_graph():
+        final_answer = None
+        try:
+            config = {"recursion_limit": 5, "callbacks": [telemetry_handler], "configurable": {"token_sink": token_sink}}
+            async for event in master_agent.astream_events({"user_input": request.user_input}, config, version="v1"):
+                kind, name, tags = event["event"], event["name"], event.get("tags") or []
+                if kind == "on_chat_model_stream" and STREAM_TOKENS_TAG in tags:
+                    text = event["data"]["chunk"].content
+                    if text:
+                        queue.put_nowait(("token", {"text": text}))
+                elif kind == "on_chain_end" and name in STREAM_PROGRESS_NODES and any(tag.startswith("graph:step") for tag in tags):
+                    output = event["data"].get("output")
+                    queue.put_nowait(("progress", {"node": name, **_summarize_node_output(output)}))
+                    if name in EXPERT_NODES and isinstance(output, dict):
+                        final_answer = output.get("final_answer", final_answer)
+            queue.put_nowait(("final", {"final_answer": final_answer or "오류: 최종 답변을 생성하지 못했습니다."}))
+        except (AdmissionRejected, DeadlineExceeded) as e:
+            logging.warning(f"스트리밍 요청 중단: {e}")
+            queue.put_nowait(("error", {"detail": str(e)}))
+        except Exception as e:
+            logging.error(f"스트리밍 Agent 실행 중 오류 발생: {e}", exc_info=True)
+            queue.put_nowait(("error", {"detail": f"AI 에이전트 처리 중 내부 서버 오류가 발생했습니다: {str(e)}"}))
+        finally:
+            queue.put_nowait(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run_graph())
+        try:
+            # 첫 바이트를 바로 보내 PHP 쪽 연결이 생성 완료까지 멈춰 있지 않게 합니다.
+            yield _sse("start", {"status": "accepted"})
+            while (item := await queue.get()) is not None:
+                yield _sse(*item)
+        finally:
+            # 클라이언트가 연결을 끊으면 그래프 실행도 함께 중단합니다.
+            task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 class NewMeeting(BaseModel):
     meeting_id: str
     title: str
     description: str
     time: str
     location: str
+    # 검색 필터용 메타데이터 (예전 PHP 요청처럼 빠져 있어도 됩니다)
+    category: str = ""
+    max_members: Optional[int] = None
+    current_members: Optional[int] = None
 
 @app.post("/meetings/add")
 async def add_meeting_to_pinecone(meeting: NewMeeting):
+    if index_outbox is not None:
+        # PHP 쪽은 200 여부만 확인하므로, 대기열에 넣은 즉시 성공으로 응답합니다.
+        await registry.run_blocking(index_outbox.enqueue_upsert, meeting.model_dump())
+        return {"status": "queued", "message": f"모임(ID: {meeting.meeting_id}) 추가가 대기열에 등록되었습니다."}
     try:
         logging.info(f"--- Pinecone에 새로운 모임 추가 시작 (ID: {meeting.meeting_id}) ---")
-        meeting_index_name = os.getenv("PINECONE_INDEX_NAME_MEETING")
-        if not meeting_index_name: raise ValueError("'.env' 파일에 PINECONE_INDEX_NAME_MEETING이(가) 설정되지 않았습니다.")
+        vector_store = registry.get_vector_store(get_meeting_index_name())
         
-        embedding_function = OpenAIEmbeddings(model='text-embedding-3-large')
-        vector_store = PineconeVectorStore.from_existing_index(index_name=meeting_index_name, embedding=embedding_function)
+        meeting_id, full_text, metadata = meeting_to_record(meeting.model_dump())
         
-        full_text = f"제목: {meeting.title}\n설명: {meeting.description}\n시간: {meeting.time}\n장소: {meeting.location}"
-        metadata = {
-            "title": meeting.title, 
-            "description": meeting.description, 
-            "time": meeting.time, 
-            "location": meeting.location,
-            "meeting_id": meeting.meeting_id 
-        }
-        
-        vector_store.add_texts(texts=[full_text], metadatas=[metadata], ids=[meeting.meeting_id])
+        with span("vector_store", "add_texts"):
+            await vector_store.aadd_texts(texts=[full_text], metadatas=[metadata], ids=[meeting_id])
+        if LEXICAL_SEARCH_ENABLED:
+            meeting_lexical_index.upsert_meetings([meeting.model_dump()])
         
         logging.info(f"--- Pinecone에 모임 추가 성공 (ID: {meeting.meeting_id}) ---")
         return {"status": "success", "message": f"모임(ID: {meeting.meeting_id})이 성공적으로 추가되었습니다."}
@@ -714,20 +1264,299 @@ async def add_meeting_to_pinecone(meeting: NewMeeting):
         logging.error(f"Pinecone 업데이트 중 오류 발생: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Pinecone에 모임을 추가하는 중 오류가 발생했습니다: {str(e)}")
 
+class BulkMeetings(BaseModel):
+    meetings: List[NewMeeting]
+    chunk_size: int = 100
+
+@app.post("/meetings/bulk_add")
+async def bulk_add_meetings_to_pinecone(request: BulkMeetings):
+    """여러 모임을 청크 단위로 배치 임베딩 + 배치 업서트합니다."""
+    if index_outbox is not None:
+        # 대기열을 거치지 않고 바로 쓰면, 먼저 들어와 있던 같은 모임의 추가/삭제가 나중에 반영되며 덮어씁니다.
+        # 대기열이 배치 임베딩 + 배치 업서트로 묶어서 반영하므로 여기서는 한 번에 넣기만 합니다.
+        meetings = [meeting.model_dump() for meeting in request.meetings]
+        await registry.run_blocking(index_outbox.enqueue_upserts, meetings)
+        index_outbox.wake()
+        return {"status": "queued", "queued": len(meetings)}
+    try:
+        logging.info(f"--- 모임 일괄 추가 시작 ({len(request.meetings)}건, 청크 {request.chunk_size}) ---")
+        vector_store = registry.get_vector_store(get_meeting_index_name())
+        meetings = [meeting.model_dump() for meeting in request.meetings]
+        chunk_size = max(request.chunk_size, 1)
+        added, elapsed = 0, 0.0
+        for i in range(0, len(meetings), chunk_size):
+            with span("vector_store", "bulk_upsert"):
+                result = await aingest_meetings(vector_store, meetings[i:i + chunk_size])
+            if LEXICAL_SEARCH_ENABLED:
+                meeting_lexical_index.upsert_meetings(meetings[i:i + chunk_size])
+            added += result["count"]
+            elapsed += result["seconds"]
+        return {
+            "status": "success",
+            "added": added,
+            "seconds": round(elapsed, 3),
+            "meetings_per_second": round(added / elapsed, 2) if elapsed else None,
+        }
+    except Exception as e:
+        logging.error(f"모임 일괄 추가 중 오류 발생: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"모임을 일괄 추가하는 중 오류가 발생했습니다: {str(e)}")
+
 @app.delete("/meetings/delete/{meeting_id}")
 async def delete_meeting_from_pinecone(meeting_id: str):
+    if index_outbox is not None:
+        await registry.run_blocking(index_outbox.enqueue_delete, meeting_id)
+        return {"status": "queued", "message": f"모임(ID: {meeting_id}) 삭제가 대기열에 등록되었습니다."}
     try:
         logging.info(f"--- Pinecone에서 모임 삭제 시작 (ID: {meeting_id}) ---")
-        meeting_index_name = os.getenv("PINECONE_INDEX_NAME_MEETING")
-        if not meeting_index_name: raise ValueError("'.env' 파일에 PINECONE_INDEX_NAME_MEETING이(가) 설정되지 않았습니다.")
+        vector_store = registry.get_vector_store(get_meeting_index_name())
         
-        embedding_function = OpenAIEmbeddings(model='text-embedding-3-large')
-        vector_store = PineconeVectorStore.from_existing_index(index_name=meeting_index_name, embedding=embedding_function)
-        
-        vector_store.delete(ids=[meeting_id])
+        with span("vector_store", "delete"):
+            await vector_store.adelete(ids=[meeting_id])
+        if LEXICAL_SEARCH_ENABLED:
+            meeting_lexical_index.delete([meeting_id])
         
         logging.info(f"--- Pinecone에서 모임 삭제 성공 (ID: {meeting_id}) ---")
         return {"status": "success", "message": f"모임(ID: {meeting_id})이 성공적으로 삭제되었습니다."}
     except Exception as e:
         logging.error(f"Pinecone 삭제 중 오류 발생: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Pinecone에서 모임을 삭제하는 중 오류가 발생했습니다.: {str(e)}")
+
+def reconcile_meeting_index(dry_run: bool) -> dict:
+    connection = get_db_connection()
+    try:
+        rows = load_meeting_payloads(connection)
+    finally:
+        connection.close()
+    return reconcile(registry.get_vector_store(get_meeting_index_name()), index_outbox, rows, dry_run=dry_run)
+
+@app.post("/meetings/reconcile")
+async def reconcile_meetings(dry_run: bool = False):
+    """meetings 테이블과 벡터 인덱스를 비교해 누락/고아/내용 불일치 모임을 대기열에 넣습니다."""
+    if index_outbox is None:
+        raise HTTPException(status_code=503, detail="인덱스 변경 대기열이 꺼져 있습니다. (MOIT_INDEX_WRITE_BEHIND=1 필요)")
+    try:
+        return await registry.run_blocking(reconcile_meeting_index, dry_run)
+    except Exception as e:
+        logging.error(f"인덱스 대조 중 오류 발생: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"인덱스를 대조하는 중 오류가 발생했습니다: {str(e)}")
+
+def load_meeting_statuses(meeting_ids: list) -> list:
+    try:
+        connection = get_db_connection()
+        try:
+            return load_meeting_payloads_by_ids(connection, meeting_ids)
+        finally:
+            connection.close()
+    except Exception as e:
+        # DB 에 닿지 않아도 시간 기준 만료는 계속 처리합니다.
+        logging.warning(f"모임 상태 조회 실패 (시간 기준 만료만 처리합니다): {e}")
+        return []
+
+def sweep_meeting_index() -> dict:
+    global last_sweep
+    last_sweep = sweep_expired(
+        registry.get_vector_store(get_meeting_index_name()),
+        index_outbox,
+        load_meeting_statuses if INDEX_SWEEP_CHECK_DB else None,
+    )
+    last_sweep["finished_at"] = time.time()
+    return last_sweep
+
+async def run_index_sweeper():
+    while True:
+        await asyncio.sleep(INDEX_SWEEP_INTERVAL)
+        try:
+            await registry.run_blocking(sweep_meeting_index)
+        except Exception as e:
+            logging.error(f"만료 모임 정리 중 오류 발생: {e}", exc_info=True)
+
+@app.post("/meetings/sweep")
+async def sweep_meetings():
+    """시작 시각이 지난 모임을 인덱스에서 빼고, 상태가 바뀐 모임을 다시 쓰도록 대기열에 넣습니다."""
+    if index_outbox is None:
+        raise HTTPException(status_code=503, detail="인덱스 변경 대기열이 꺼져 있습니다. (MOIT_INDEX_WRITE_BEHIND=1 필요)")
+    try:
+        return await registry.run_blocking(sweep_meeting_index)
+    except Exception as e:
+        logging.error(f"만료 모임 정리 중 오류 발생: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"만료 모임을 정리하는 중 오류가 발생했습니다: {str(e)}")
+
+@app.get("/agent/router_stats")
+async def router_stats():
+    """라우팅 단계별 적중률과 절약된 지연 시간 추정치를 반환합니다."""
+    return tiered_router.stats.snapshot()
+
+@app.get("/agent/batch_stats")
+async def batch_stats():
+    """분류 호출 마이크로 배처의 배치 크기와 항목당 공급자 호출 수를 반환합니다."""
+    return {"router": router_batcher.stats.snapshot(), "helpfulness": helpfulness_batcher.stats.snapshot()}
+
+@app.get("/agent/provider_stats")
+async def provider_stats():
+    """공급자별 지연 분포(p50, 헤지 기준), 재시도/헤지/대체 횟수와 회로 차단기 상태를 반환합니다."""
+    return provider_guards.snapshot()
+
+@app.get("/agent/admission_stats")
+async def admission_stats():
+    """경로별 동시 실행/대기 수, 입장/거절/만료 횟수와 마감 때문에 건너뛴 선택 작업 횟수를 반환합니다."""
+    return admission.snapshot()
+
+@app.get("/agent/prompt_stats")
+async def prompt_budget_stats():
+    """체인별 프롬프트 가변 부분의 토큰 수와 토큰 예산으로 줄인 양을 반환합니다."""
+    return prompt_stats.snapshot()
+
+@app.get("/agent/cache_stats")
+async def cache_stats():
+    """결과 캐시의 적중률과 중복 제거(single-flight)된 요청 수를 반환합니다."""
+    return {"hobby_recommendation": hobby_result_cache.snapshot(), "web_search": web_search_cache.snapshot()}
+
+# --- 취미 추천 비동기 작업 API ---
+# get_ai_recommendation.php 가 curl 연결을 최대 120초 동안 붙잡지 않도록, 제출 즉시 job_id 를 돌려주고
+# 결과는 GET /jobs/{job_id} 폴링 또는 webhook_url 로 전달합니다.
+async def run_hobby_recommendation_job(payload: dict, job: dict) -> dict:
+    # 이전 시도에서 이미 만든 추천/저장한 행이 있으면 다시 만들거나 다시 저장하지 않습니다. (재시도, 서버 재시작)
+    checkpoint = job.get("checkpoint") or {}
+    recommendation = checkpoint.get("recommendation")
+    if recommendation is None:
+        user_input = payload["user_input"]
+        input_data = {"survey_data": user_input.get("survey", {}), "image_paths": user_input.get("image_paths", [])}
+        # 작업은 클라이언트가 기다리지 않으므로 마감 없이, 취미 추천 자리(가장 낮은 우선순위)가 날 때까지 기다립니다.
+        # 대화형 요청의 대기열이 가득 차도 거절(= 작업 실패)되지 않고 차례를 기다립니다.
+        async with admission.slot("hobby_recommendation", apply_deadline=False, queue_limit=False):
+            final_state = await hobby_supervisor_agent.ainvoke(input_data, config={"recursion_limit": 10, "callbacks": [telemetry_handler]})
+        recommendation = final_state.get("final_recommendation")
+        if not is_cacheable_recommendation(recommendation):
+            raise RuntimeError(recommendation or "오류: 최종 추천을 생성하는 데 실패했습니다.")
+        await registry.run_blocking(job_runner.checkpoint, job["id"], recommendation=recommendation)
+    result = {"recommendation": recommendation}
+    if checkpoint.get("recommendation_id") is not None:
+        result["recommendation_id"] = checkpoint["recommendation_id"]
+    elif job["user_id"] and payload.get("save_to_db", True):
+        # PHP 대신 여기서 바로 ai_hobby_recommendations 에 저장합니다.
+        # 저장에 실패해도 생성된 추천은 잃지 않도록 작업은 성공으로 두고 오류만 함께 기록합니다.
+        try:
+            result["recommendation_id"] = await registry.run_blocking(save_hobby_recommendation, job["user_id"], recommendation)
+        except Exception as e:
+            logging.error(f"취미 추천 결과 DB 저장 실패 (job {job['id']}): {e}", exc_info=True)
+            result["db_error"] = str(e)
+        else:
+            await registry.run_blocking(job_runner.checkpoint, job["id"], recommendation_id=result["recommendation_id"])
+    return result
+
+class HobbyJobRequest(BaseModel):
+    user_input: dict
+    user_id: Optional[str] = None
+    webhook_url: Optional[str] = None
+    save_to_db: bool = True
+
+def get_job_runner() -> JobRunner:
+    if job_runner is None:
+        raise HTTPException(status_code=503, detail="작업 큐가 아직 준비되지 않았습니다.")
+    return job_runner
+
+@app.post("/jobs/hobby_recommendation", status_code=202)
+async def submit_hobby_recommendation_job(request: HobbyJobRequest):
+    """취미 추천 작업을 큐에 넣고 바로 job_id 를 반환합니다."""
+    payload = {"user_input": request.user_input, "save_to_db": request.save_to_db}
+    job_id = get_job_runner().submit("hobby_recommendation", payload, user_id=request.user_id, webhook_url=request.webhook_url)
+    logging.info(f"--- 취미 추천 작업 접수 (job {job_id}, user {request.user_id}) ---")
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """작업 상태와 (끝났다면) 결과를 반환합니다."""
+    status = get_job_runner().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="해당 작업을 찾을 수 없습니다.")
+    return status
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 수집용 지표 (구간별 지연 히스토그램, 토큰/비용/재시도 카운터)"""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+# --- 워밍업 / 준비 상태 ---
+WARMUP_ENABLED = os.getenv("MOIT_WARMUP", "1") == "1"
+WARMUP_RETRY_SECONDS = float(os.getenv("MOIT_WARMUP_RETRY_SECONDS", "10"))
+PROBE_ROUTES = {"/healthz", "/readyz", "/health", "/metrics"}
+readiness = {"ready": False, "steps": {}, "error": None, "warmup_seconds": None, "first_success_seconds": None}
+warmup_task: Optional[asyncio.Task] = None
+
+async def build_lexical_index():
+    """벡터 인덱스에 들어 있는 모임으로 키워드 인덱스를 다시 만듭니다. 끝나기 전까지 검색은 벡터 검색만 씁니다."""
+    if not LEXICAL_SEARCH_ENABLED or meeting_lexical_index.ready:
+        return
+    vector_store = registry.get_vector_store(get_meeting_index_name())
+    records = await registry.run_blocking(list_index_records, vector_store)
+    await registry.run_blocking(meeting_lexical_index.rebuild, records)
+
+async def warm_up():
+    """공급자 클라이언트 생성, 커넥션 사전 연결, 라우터 임베딩, 범용 검색 에이전트 조립을 첫 요청 전에 끝내 둡니다.
+
+    필수 단계(LLM/임베딩)가 실패하면 준비되지 않은 상태로 두고 WARMUP_RETRY_SECONDS 뒤에 다시 시도합니다.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            steps = await registry.warm_up()
+            for name, fn in (
+                ("gemini", lambda: registry.run_blocking(get_genai)),
+                ("router_centroids", tiered_router.warm_up),
+                ("general_search_agent", lambda: registry.run_blocking(get_general_search_agent)),
+                ("lexical_index", build_lexical_index),
+                ("prompt_tokenizer", lambda: registry.run_blocking(count_tokens, "워밍업")),
+            ):
+                step_start = time.perf_counter()
+                try:
+                    await fn()
+                except Exception as e:
+                    logging.warning(f"워밍업 단계 실패: {name} (첫 요청에서 재시도합니다): {e}")
+                steps[name] = time.perf_counter() - step_start
+        except Exception as e:
+            readiness["error"] = str(e)
+            logging.error(f"워밍업 실패, {WARMUP_RETRY_SECONDS:.0f}초 뒤 다시 시도합니다: {e}", exc_info=True)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+            continue
+        readiness.update(
+            ready=True, error=None, warmup_seconds=time.perf_counter() - start,
+            steps={name: round(seconds, 3) for name, seconds in steps.items()},
+        )
+        STARTUP_SECONDS.labels("warmup").set(readiness["warmup_seconds"])
+        logging.info(f"--- 워밍업 완료 ({readiness['warmup_seconds']:.2f}s): {readiness['steps']} ---")
+        return
+
+@app.get("/healthz")
+async def liveness():
+    """프로세스가 요청을 받을 수 있는지만 확인합니다. (워밍업과 무관하게 200)"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness_check():
+    """워밍업이 끝나 트래픽을 받아도 되는지 반환합니다. 준비 전이거나 종료 중이면 503 입니다."""
+    body = {
+        "status": "ready" if readiness["ready"] else "warming_up",
+        "import_seconds": round(IMPORT_SECONDS, 3),
+        **{key: value for key, value in readiness.items() if key != "ready"},
+    }
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/health")
+async def health_check():
+    """공유 리소스 레지스트리의 상태를 반환합니다."""
+    return {
+        "status": "ok",
+        "resources": registry.health(),
+        "image_preprocessing": image_preprocessor.totals,
+        "jobs": job_runner.stats() if job_runner is not None else None,
+        "index_outbox": index_outbox.snapshot() if index_outbox is not None else None,
+        "index_sweep": last_sweep,
+        "lexical_index": meeting_lexical_index.snapshot(),
+        "general_search": _general_agent_executor.stats.snapshot() if _general_agent_executor is not None else None,
+        "providers": {name: provider["breaker"]["state"] for name, provider in provider_guards.snapshot()["providers"].items()},
+        "admission": {route: {key: stats[key] for key in ("active", "waiting")} for route, stats in admission.snapshot()["routes"].items()},
+    }
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+STARTUP_SECONDS.labels("import").set(IMPORT_SECONDS)
@@ -0,0 +1,158 @@
+# meeting_index.py
+# 모임 정보를 벡터 인덱스 레코드로 변환하고, 여러 건을 묶어서 적재하는 헬퍼
+#   - 본문 외에 검색 필터용 구조화 메타데이터(date, starts_at, region, category, status)를 함께 기록합니다.
+#   - 필터는 Pinecone 메타데이터 필터 문법($eq, $gte, $in ...)을 그대로 쓰고, 로컬/가짜 스토어는 matches_filter 로 같은 의미를 따릅니다.
+
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+# 모임 상태: 모집 중 / 정원 마감 / 이미 지난 모임. (meetings 테이블에는 상태 컬럼이 없어 PHP 와 같은 규칙으로 계산합니다)
+STATUS_OPEN, STATUS_FULL, STATUS_ENDED = "open", "full", "ended"
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+# "서울특별시 마포구", "경기 성남시" 처럼 제각각인 시/도 표기를 짧은 이름 하나로 맞춥니다.
+REGION_ALIASES = {
+    "서울특별시": "서울", "서울시": "서울", "부산광역시": "부산", "부산시": "부산", "대구광역시": "대구", "대구시": "대구",
+    "인천광역시": "인천", "인천시": "인천", "광주광역시": "광주", "대전광역시": "대전", "대전시": "대전",
+    "울산광역시": "울산", "울산시": "울산", "세종특별자치시": "세종", "세종시": "세종", "경기도": "경기",
+    "강원도": "강원", "강원특별자치도": "강원", "충청북도": "충북", "충청남도": "충남", "전라북도": "전북",
+    "전북특별자치도": "전북", "전라남도": "전남", "경상북도": "경북", "경상남도": "경남", "제주특별자치도": "제주", "제주도": "제주",
+}
+
+
+def parse_meeting_time(text: str) -> Optional[datetime]:
+    """"YYYY-MM-DD HH:MM[:SS]" (create_meeting.php 형식) 을 datetime 으로 바꿉니다. 형식이 다르면 None."""
+    text = (text or "").strip()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_region(location: str) -> str:
+    """장소 문자열의 첫 단어(시/도)를 정규화한 지역 이름. 비어 있으면 빈 문자열."""
+    tokens = re.split(r"[\s,()/]+", (location or "").strip())
+    first = tokens[0] if tokens and tokens[0] else ""
+    return REGION_ALIASES.get(first, first)
+
+
+def meeting_status(meeting: dict, now: Optional[float] = None) -> str:
+    """시작 시각이 지났으면 ended, 정원(max_members)이 찼으면 full, 그 외에는 open. (현재 인원은 주최자 포함)"""
+    starts_at = parse_meeting_time(meeting.get("time", ""))
+    if starts_at is not None and starts_at.timestamp() < (now if now is not None else time.time()):
+        return STATUS_ENDED
+    max_members = meeting.get("max_members")
+    if max_members and int(meeting.get("current_members") or 1) >= int(max_members):
+        return STATUS_FULL
+    return STATUS_OPEN
+
+
+def record_text(meeting: dict) -> str:
+    """인덱스에 저장하는 본문. 메타데이터(title/description/time/location)만으로도 다시 만들 수 있습니다."""
+    return f"제목: {meeting['title']}\n설명: {meeting['description']}\n시간: {meeting['time']}\n장소: {meeting['location']}"
+
+
+def meeting_to_record(meeting: dict, now: Optional[float] = None):
+    """모임 딕셔너리를 (id, 본문, 메타데이터) 로 변환합니다. /meetings/add 와 같은 형식을 사용합니다."""
+    meeting_id = str(meeting["meeting_id"])
+    full_text = record_text(meeting)
+    metadata = {
+        "title": meeting["title"],
+        "description": meeting["description"],
+        "time": meeting["time"],
+        "location": meeting["location"],
+        "meeting_id": meeting_id,
+        "region": normalize_region(meeting["location"]),
+        "category": meeting.get("category") or "",
+        "status": meeting_status(meeting, now),
+    }
+    starts_at = parse_meeting_time(meeting["time"])
+    if starts_at is not None:
+        # Pinecone 범위 필터는 숫자만 비교하므로 epoch 초를 함께 저장합니다.
+        metadata["date"] = starts_at.date().isoformat()
+        metadata["starts_at"] = starts_at.timestamp()
+    return meeting_id, full_text, metadata
+
+
+def upcoming_filter(region: str = None, now: Optional[float] = None) -> dict:
+    """아직 시작하지 않은 모집 중 모임만 남기는 메타데이터 필터. region 을 주면 같은 지역으로 좁힙니다."""
+    query = {
+        "status": {"$eq": STATUS_OPEN},
+        "starts_at": {"$gte": now if now is not None else time.time()},
+    }
+    if region:
+        query["region"] = {"$eq": region}
+    return query
+
+
+def matches_filter(metadata: dict, query: Optional[dict]) -> bool:
+    """Pinecone 메타데이터 필터의 부분 집합($eq/$ne/$gt/$gte/$lt/$lte/$in/$nin, $and/$or)을 평가합니다.
+    Pinecone 과 같이 필드가 없는 레코드는 $ne/$nin 외의 조건에 맞지 않습니다."""
+    if not query:
+        return True
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        present = field in metadata
+        value = metadata.get(field)
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = present and value == operand
+            elif op == "$ne":
+                ok = not present or value != operand
+            elif op == "$in":
+                ok = present and value in operand
+            elif op == "$nin":
+                ok = not present or value not in operand
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if not present or not isinstance(value, (int, float)):
+                    return False
+                ok = {"$gt": value > operand, "$gte": value >= operand,
+                      "$lt": value < operand, "$lte": value <= operand}[op]
+            else:
+                raise ValueError(f"지원하지 않는 필터 연산자: {op}")
+            if not ok:
+                return False
+    return True
+
+
+def _upsert_kwargs(count: int) -> dict:
+    # 청크 전체를 한 번의 임베딩 요청으로 보내고, 업서트는 Pinecone 요청 크기 제한(2MB)에 맞춰 나눠 병렬 전송합니다.
+    return {"embedding_chunk_size": max(count, 1), "batch_size": int(os.getenv("MOIT_UPSERT_BATCH_SIZE", "32"))}
+
+
+def ingest_meetings(vector_store, meetings: List[dict]) -> dict:
+    """모임 청크 하나를 배치 임베딩 + 배치 업서트로 적재합니다."""
+    if not meetings:
+        return {"count": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    ids, texts, metadatas = zip(*(meeting_to_record(meeting) for meeting in meetings))
+    vector_store.add_texts(texts=list(texts), metadatas=list(metadatas), ids=list(ids), **_upsert_kwargs(len(ids)))
+    return {"count": len(ids), "seconds": time.perf_counter() - start}
+
+
+async def aingest_meetings(vector_store, meetings: List[dict]) -> dict:
+    """ingest_meetings 의 비동기 버전"""
+    if not meetings:
+        return {"count": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    ids, texts, metadatas = zip(*(meeting_to_record(meeting) for meeting in meetings))
+    await vector_store.aadd_texts(texts=list(texts), metadatas=list(metadatas), ids=list(ids), **_upsert_kwargs(len(ids)))
+    elapsed = time.perf_counter() - start
+    logging.info(f"모임 {len(ids)}건 적재 완료 ({elapsed:.2f}s, {len(ids) / elapsed if elapsed else 0:.1f}건/s)")
+    return {"count": len(ids), "seconds": elapsed}
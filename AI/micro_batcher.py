@@ -0,0 +1,138 @@
+# micro_batcher.py
+# 동시에 들어온 작은 분류 LLM 호출(라우터, 답변 유용성 평가)을 짧게 모았다가 한 번의 호출로 처리하는 동적 배처
+#   - 첫 항목이 들어오면 최대 max_wait 초 동안 기다리며 모으고, max_batch 개가 차면 바로 보냅니다.
+#   - 진행 중인 호출도 대기 중인 항목도 없으면(한가할 때) 기다리지 않고 바로 단건 호출합니다.
+#   - 모인 항목이 하나뿐이면 단건 호출, 여럿이면 batch_call(items) 한 번으로 처리해 결과를 순서대로 나눠줍니다.
+#   - 배치 호출이 실패하거나 일부 결과가 비어 있으면 해당 항목만 단건 호출로 다시 처리합니다.
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class MicroBatcherStats:
+    """배처 통계 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"submitted": 0, "provider_calls": 0, "batches": 0, "batched_items": 0,
+                       "single_calls": 0, "idle_bypass": 0, "fallback_singles": 0, "batch_errors": 0}
+        self.max_batch_seen = 0
+        self.wait_seconds = 0.0
+
+    def add(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                if key == "wait_seconds":
+                    self.wait_seconds += value
+                elif key == "batch_size":
+                    self.max_batch_seen = max(self.max_batch_seen, value)
+                else:
+                    self.counts[key] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            return {
+                **counts,
+                "avg_batch_size": round(counts["batched_items"] / counts["batches"], 2) if counts["batches"] else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "calls_per_item": round(counts["provider_calls"] / counts["submitted"], 3) if counts["submitted"] else 0.0,
+                "avg_wait_ms": round(self.wait_seconds / counts["submitted"] * 1000, 2) if counts["submitted"] else 0.0,
+            }
+
+
+class MicroBatcher:
+    """submit(item) 을 모아 single_call(item) 또는 batch_call(items) 로 처리합니다.
+
+    batch_call 은 items 와 같은 길이의 결과 목록을 반환해야 하며, 값이 None 인 항목은 단건 호출로 다시 처리합니다.
+    """
+
+    def __init__(self, name: str, single_call: Callable[[Any], Awaitable[Any]],
+                 batch_call: Callable[[List[Any]], Awaitable[List[Any]]], max_wait: float = None,
+                 max_batch: int = None, enabled: bool = None):
+        self.name = name
+        self.single_call = single_call
+        self.batch_call = batch_call
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("MOIT_BATCH_MAX_WAIT_MS", "10")) / 1000
+        self.max_batch = max_batch or int(os.getenv("MOIT_BATCH_MAX_SIZE", "8"))
+        self.enabled = enabled if enabled is not None else os.getenv("MOIT_MICRO_BATCH", "1") == "1"
+        self.stats = MicroBatcherStats()
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = 0
+
+    async def submit(self, item: Any) -> Any:
+        self.stats.add(submitted=1)
+        if not self.enabled or self.max_batch <= 1 or (self._inflight == 0 and not self._pending):
+            # 한가할 때는 모으느라 기다리지 않고 바로 보냅니다.
+            self.stats.add(idle_bypass=1 if self.enabled else 0)
+            return await self._single(item)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    async def _single(self, item: Any) -> Any:
+        self._inflight += 1
+        try:
+            self.stats.add(provider_calls=1, single_calls=1)
+            return await self.single_call(item)
+        finally:
+            self._inflight -= 1
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            now = time.perf_counter()
+            self.stats.add(wait_seconds=sum(now - queued_at for _, _, queued_at in batch))
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[tuple]):
+        items = [item for item, _, _ in batch]
+        futures = [future for _, future, _ in batch]
+        if len(items) == 1:
+            await self._settle(futures[0], self._single(items[0]))
+            return
+        self._inflight += 1
+        try:
+            self.stats.add(provider_calls=1, batches=1, batched_items=len(items), batch_size=len(items))
+            results = await self.batch_call(items)
+            if len(results) != len(items):
+                raise ValueError(f"배치 결과 {len(results)}개, 요청 {len(items)}개")
+        except Exception as e:
+            self.stats.add(batch_errors=1)
+            logging.warning(f"[{self.name}] 배치 호출 실패, 단건 호출로 다시 처리합니다 ({len(items)}건): {e}")
+            results = [None] * len(items)
+        finally:
+            self._inflight -= 1
+        retries = []
+        for item, future, result in zip(items, futures, results):
+            if result is None:
+                self.stats.add(fallback_singles=1)
+                retries.append(self._settle(future, self._single(item)))
+            elif not future.done():
+                future.set_result(result)
+        if retries:
+            await asyncio.gather(*retries)
+
+    @staticmethod
+    async def _settle(future: asyncio.Future, call: Awaitable):
+        try:
+            result = await call
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
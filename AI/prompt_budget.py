@@ -0,0 +1,183 @@
+# prompt_budget.py
+# 체인별 토큰 예산 안에서 프롬프트의 가변 부분(검색 컨텍스트, 라우터 입력, 취미 프로필)을 조립합니다.
+#   - 토큰 수는 tiktoken(o200k_base)으로 셉니다. 인코딩 파일을 받을 수 없는 환경이면 UTF-8 바이트 수로 추정합니다.
+#   - 예산을 넘는 문서는 앞부분만 남기고("…") 자르며, 그래도 넘치면 순위가 낮은 문서부터 뺍니다.
+#   - 라우터에는 경로 판단에 필요한 키 이름과 짧은 미리보기만 넘깁니다. (설문 응답 47개 같은 값은 개수만)
+#   - 취미 프로필은 설명 부분만 예산에 맞추고, 사용자의 금지 규칙(Hard Constraints)은 자르지 않고 그대로 붙입니다.
+#   - 체인별로 "예산을 적용하지 않았을 때의 토큰 수 - 실제 토큰 수" 를 절약량으로 집계합니다.
+#   - 고정 지시문은 프롬프트 앞쪽에 두고 가변 부분은 뒤에 붙여, 공급자 쪽 프롬프트 접두사 캐시가 맞도록 합니다.
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Tuple
+
+from telemetry import PROMPT_TOKENS_SAVED
+
+# 체인별 가변 부분의 토큰 예산. MOIT_PROMPT_BUDGETS 에 같은 형식의 JSON을 넣어 덮어쓸 수 있습니다.
+PROMPT_BUDGETS = {
+    "meeting_context": 600,      # 모임 추천 생성/판정에 넣는 검색 결과 전체
+    "meeting_document": 200,     # 그중 문서 하나
+    "router_input": 200,         # LLM 라우터에 넘기는 사용자 입력
+    "router_field": 40,          # 라우터 입력의 문자열 필드 하나
+    "hobby_profile": 800,        # Gemini 취미 추천 프롬프트의 사용자 프로필 설명 부분 (금지 규칙 제외)
+}
+PROMPT_BUDGETS.update({name: int(value) for name, value in json.loads(os.getenv("MOIT_PROMPT_BUDGETS", "{}")).items()})
+
+ELLIPSIS = "…"
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(os.getenv("MOIT_TOKEN_ENCODING", "o200k_base"))
+                except Exception as e:
+                    _encoding_failed = True
+                    logging.warning(f"tiktoken 인코딩을 불러오지 못해 바이트 수로 토큰을 추정합니다: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 한글은 대략 한 글자(3바이트)가 1토큰 안팎입니다.
+    return (len(text.encode("utf-8")) + 2) // 3
+
+
+def truncate_tokens(text: str, budget: int) -> Tuple[str, bool]:
+    """text 를 budget 토큰 이내로 자릅니다. (잘린 문자열, 잘렸는지 여부)"""
+    if budget <= 0:
+        return "", bool(text)
+    if count_tokens(text) <= budget:
+        return text, False
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max(budget - 1, 0)]).rstrip() + ELLIPSIS, True
+    # 추정 모드: 글자 수를 줄여가며 맞춥니다.
+    cut = len(text)
+    while cut > 0 and count_tokens(text[:cut]) > budget - 1:
+        cut = int(cut * 0.9)
+    return text[:cut].rstrip() + ELLIPSIS, True
+
+
+class PromptBudgetStats:
+    """체인별 프롬프트 토큰 / 절약량 집계 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chains: Dict[str, dict] = {}
+
+    def record(self, chain: str, tokens: int, unbudgeted_tokens: int, truncated: int = 0, dropped: int = 0,
+               static_prefix_tokens: int = 0):
+        """tokens: 가변 부분의 실제 토큰 수, unbudgeted_tokens: 예산 없이 만들었을 때의 토큰 수,
+        static_prefix_tokens: 앞쪽 고정 지시문의 토큰 수 (공급자 접두사 캐시 대상)"""
+        saved = max(unbudgeted_tokens - tokens, 0)
+        with self._lock:
+            entry = self.chains.setdefault(chain, {"calls": 0, "tokens": 0, "tokens_saved": 0, "truncated": 0,
+                                                   "dropped": 0, "static_prefix_tokens": 0})
+            entry["calls"] += 1
+            entry["static_prefix_tokens"] += static_prefix_tokens
+            entry["tokens"] += tokens
+            entry["tokens_saved"] += saved
+            entry["truncated"] += truncated
+            entry["dropped"] += dropped
+        if saved:
+            PROMPT_TOKENS_SAVED.labels(chain).inc(saved)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                chain: {
+                    **entry,
+                    "avg_tokens": round(entry["tokens"] / entry["calls"], 1) if entry["calls"] else 0.0,
+                    "saved_ratio": round(entry["tokens_saved"] / (entry["tokens"] + entry["tokens_saved"]), 4)
+                    if entry["tokens"] + entry["tokens_saved"] else 0.0,
+                }
+                for chain, entry in self.chains.items()
+            }
+
+
+prompt_stats = PromptBudgetStats()
+
+
+# --- 모임 검색 컨텍스트 ---
+def _document_body(doc) -> str:
+    """본문에서 title 과 겹치는 "제목:" 줄을 빼고 나머지(설명/시간/장소)만 남깁니다."""
+    lines = [line for line in doc.page_content.splitlines() if not line.startswith("제목:")]
+    return " / ".join(line.strip() for line in lines if line.strip())
+
+
+def format_meeting_context(docs: list, chain: str = "meeting_context", budget: int = None,
+                           document_budget: int = None) -> str:
+    """검색된 모임 문서들을 토큰 예산 안의 컨텍스트 문자열로 만듭니다. 순위가 높은 문서부터 채웁니다."""
+    if not docs:
+        return "유사한 모임을 찾지 못했습니다."
+    budget = budget or PROMPT_BUDGETS["meeting_context"]
+    document_budget = document_budget or PROMPT_BUDGETS["meeting_document"]
+    blocks, used, truncated, dropped, unbudgeted = [], 0, 0, 0, 0
+    for i, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        header = f"모임 {i + 1}:\n  - meeting_id: {metadata.get('meeting_id', 'N/A')}\n  - title: {metadata.get('title', 'N/A')}\n"
+        unbudgeted += count_tokens(header + f"  - content: {doc.page_content}\n\n")
+        body, was_cut = truncate_tokens(_document_body(doc), document_budget)
+        block = header + f"  - content: {body}\n\n"
+        tokens = count_tokens(block)
+        if blocks and used + tokens > budget:
+            dropped += 1
+            continue
+        blocks.append(block)
+        used += tokens
+        truncated += was_cut
+    prompt_stats.record(chain, used, unbudgeted, truncated, dropped)
+    return "".join(blocks)
+
+
+# --- 라우터 입력 ---
+def _preview(value, field_budget: int):
+    if isinstance(value, str):
+        return truncate_tokens(value, field_budget)[0]
+    if isinstance(value, (dict, list, tuple)):
+        return f"<{len(value)}개 항목>"
+    return value
+
+
+def router_view(user_input, budget: int = None, field_budget: int = None) -> str:
+    """LLM 라우터에 넘길 입력 문자열. 경로 판단에 쓰이는 키 이름은 남기고 값은 짧게 줄입니다."""
+    budget = budget or PROMPT_BUDGETS["router_input"]
+    field_budget = field_budget or PROMPT_BUDGETS["router_field"]
+    unbudgeted = count_tokens(str(user_input))
+    payload = user_input
+    if isinstance(user_input, dict) and "messages" in user_input:
+        try:
+            payload = user_input["messages"][0][1]
+        except (KeyError, IndexError, TypeError):
+            payload = user_input
+    if isinstance(payload, dict):
+        view = str({key: _preview(value, field_budget) for key, value in payload.items()})
+    else:
+        view = str(payload)
+    view, truncated = truncate_tokens(view, budget)
+    prompt_stats.record("router", count_tokens(view), unbudgeted, int(truncated))
+    return view
+
+
+# --- Gemini 취미 추천 프로필 ---
+def fit_profile(static_prefix: str, profile_text: str, constraints: str = "") -> str:
+    """취미 추천 프롬프트 = 고정 지시문 + 예산 안으로 맞춘 프로필 + 금지 규칙(자르지 않음)"""
+    text, truncated = truncate_tokens(profile_text, PROMPT_BUDGETS["hobby_profile"])
+    constraint_tokens = count_tokens(constraints)
+    prompt_stats.record("hobby_profile", count_tokens(text) + constraint_tokens, count_tokens(profile_text) + constraint_tokens,
+                        int(truncated), static_prefix_tokens=count_tokens(static_prefix))
+    return static_prefix + text + constraints
@@ -0,0 +1,494 @@
+# provider_guard.py
+# LLM / Gemini / 웹 검색 같은 외부 공급자 호출을 감싸는 공통 호출 계층
+#   - 헤지 요청: 호출이 그 공급자의 최근 p95 지연을 넘기면 같은 요청을 하나 더 보내고, 먼저 성공한 응답을 씁니다.
+#       헤지는 최근 호출의 MOIT_HEDGE_MAX_RATIO(기본 10%) 이내로만 보내 공급자 부하가 불어나지 않게 합니다.
+#   - 재시도: 일시적 오류(타임아웃, 연결 오류, 408/429/5xx)만 지터를 섞은 지수 백오프로 다시 시도합니다. (고정 대기 없음)
+#   - 회로 차단기: 연속 실패가 쌓인 공급자는 쿨다운 동안 바로 실패시키고(열림), 쿨다운 뒤 한 번만 시험 호출합니다(반열림).
+#   - 대체 경로: 기본 공급자가 차단되었거나 재시도까지 실패하면 설정된 다음 공급자로 넘깁니다. (예: Gemini -> OpenAI 비전 모델)
+#   - 스트리밍 호출은 조각이 두 번 나가지 않도록 헤지/재시도 없이 차단기와 대체 경로만 적용합니다.
+#       astream_events 로 토큰이 바로 나가는 invoke 도 헤지하지 않고, 첫 토큰 뒤의 실패는 StreamInterruptedError 로 끝냅니다.
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Awaitable, Callable, Optional, Sequence, Tuple
+
+from telemetry import CIRCUIT_STATE, PROVIDER_EVENTS, RETRIES
+
+CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+# 다시 보내도 결과가 같은 오류(입력/파싱/미지원)는 재시도하지 않고, 공급자 장애로도 세지 않습니다.
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, NotImplementedError)
+TRANSIENT_ERRORS = (TimeoutError, asyncio.TimeoutError, ConnectionError)
+# SDK마다 예외 계층이 달라, 위에 해당하지 않으면 예외 이름으로 일시적 오류를 가립니다. (httpx.ReadTimeout, openai.APIConnectionError 등)
+TRANSIENT_NAME_HINTS = ("Timeout", "Connect", "Unavailable", "RateLimit", "ServerError", "Transport", "DeadlineExceeded")
+
+
+class CircuitOpenError(RuntimeError):
+    """회로 차단기가 열려 있어 공급자를 호출하지 않았습니다."""
+
+    retryable = False
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} 회로 차단기가 열려 있습니다. ({retry_after:.1f}초 뒤 다시 시도)")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class StreamInterruptedError(RuntimeError):
+    """이미 조각을 내보낸 스트리밍 호출이 중간에 실패했습니다. (다시 보내면 조각이 중복되므로 재시도/대체하지 않습니다)"""
+
+    retryable = False
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """예외에 붙은 HTTP 상태 코드 (openai: status_code, httpx: response.status_code, google: code)"""
+    for status in (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None),
+                   getattr(error, "code", None)):
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    flag = getattr(error, "retryable", None)
+    if flag is not None:
+        return bool(flag)
+    status = error_status(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, PERMANENT_ERRORS):
+        return False
+    return any(hint in type(error).__name__ for hint in TRANSIENT_NAME_HINTS)
+
+
+class RollingLatency:
+    """최근 size 개 성공 호출의 지연 시간(초)"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """연속 실패 failure_threshold 번이면 cooldown 초 동안 열림. 쿨다운 뒤 시험 호출 하나가 성공하면 닫힙니다. (스레드 안전)"""
+
+    def __init__(self, name: str, failure_threshold: int = None, cooldown: float = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv("MOIT_BREAKER_FAILURES", "5"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("MOIT_BREAKER_COOLDOWN", "30"))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.opens = 0
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(CIRCUIT_STATE_VALUES[state])
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.cooldown - self.clock(), 0.0)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def allow(self) -> bool:
+        """지금 호출해도 되는지. 반열림 상태에서는 시험 호출 하나만 허용합니다."""
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+                self._set_state("half_open")
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    return False
+                self._probing = True
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != "closed":
+                self._set_state("closed")
+                logging.info(f"[{self.name}] 회로 차단기 닫힘 (시험 호출 성공)")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self._set_state("open")
+                self.opened_at = self.clock()
+                self.opens += 1
+                logging.warning(f"[{self.name}] 회로 차단기 열림: 연속 실패 {self.failures}회, {self.cooldown:.0f}초 동안 바로 실패시킵니다.")
+
+    def release(self):
+        """성공/실패를 기록하지 못하고 끝난 시험 호출(취소 등)의 자리를 돌려줍니다."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens,
+                    "retry_after": round(self.retry_after(), 2) if self.state == "open" else 0.0}
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def hedge_executor() -> ThreadPoolExecutor:
+    """블로킹 호출(Gemini SDK 등)의 헤지에 쓰는 스레드 풀. 진 쪽 스레드는 멈출 수 없어 끝날 때까지 돌고 결과만 버립니다."""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("MOIT_HEDGE_THREADS", "8")), thread_name_prefix="moit-hedge",
+            )
+        return _hedge_executor
+
+
+class ProviderGuard:
+    """공급자 하나의 지연 분포, 회로 차단기, 재시도/헤지 정책"""
+
+    def __init__(self, name: str, max_attempts: int = None, backoff_base: float = None, backoff_cap: float = None,
+                 hedge: bool = None, hedge_quantile: float = None, hedge_min_samples: int = None,
+                 hedge_min_delay: float = None, hedge_max_ratio: float = None, breaker: CircuitBreaker = None,
+                 rng: random.Random = None):
+        self.name = name
+        self.max_attempts = max_attempts or int(os.getenv("MOIT_PROVIDER_MAX_ATTEMPTS", "3"))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv("MOIT_RETRY_BASE_MS", "200")) / 1000
+        self.backoff_cap = backoff_cap if backoff_cap is not None else float(os.getenv("MOIT_RETRY_CAP_MS", "4000")) / 1000
+        self.hedge = hedge if hedge is not None else os.getenv("MOIT_HEDGE", "1") == "1"
+        self.hedge_quantile = hedge_quantile or float(os.getenv("MOIT_HEDGE_QUANTILE", "0.95"))
+        # 표본이 이만큼 쌓이기 전에는 p95 를 믿을 수 없어 헤지하지 않습니다.
+        self.hedge_min_samples = hedge_min_samples or int(os.getenv("MOIT_HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else float(os.getenv("MOIT_HEDGE_MIN_DELAY_MS", "50")) / 1000
+        self.hedge_max_ratio = hedge_max_ratio if hedge_max_ratio is not None else float(os.getenv("MOIT_HEDGE_MAX_RATIO", "0.1"))
+        self.breaker = breaker or CircuitBreaker(name)
+        self.rng = rng or random.Random()
+        self.latency = RollingLatency()
+        self._lock = threading.Lock()
+        self._hedge_window = deque(maxlen=200)  # 최근 호출마다 헤지했는지(1/0)
+        self.counts = {"calls": 0, "successes": 0, "failures": 0, "permanent_errors": 0, "retries": 0,
+                       "hedges": 0, "hedge_wins": 0, "short_circuits": 0, "fallbacks": 0}
+
+    # --- 기록 ---
+    def event(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+        PROVIDER_EVENTS.labels(self.name, name).inc()
+
+    def record_success(self, seconds: Optional[float] = None):
+        if seconds is not None:
+            with self._lock:
+                self.latency.add(seconds)
+        self.breaker.record_success()
+        self.event("successes")
+
+    def record_error(self, error: BaseException):
+        if is_retryable(error):
+            self.breaker.record_failure()
+            self.event("failures")
+        else:
+            # 공급자는 응답했습니다. (잘못된 요청 등) 장애로 세지 않습니다.
+            self.breaker.record_success()
+            self.event("permanent_errors")
+
+    # --- 정책 ---
+    def backoff_delay(self, attempt: int) -> float:
+        """지터를 섞은 지수 백오프 (full jitter): 0 ~ min(cap, base * 2^attempt) 사이 균등 분포"""
+        return self.rng.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            if not self.hedge or len(self.latency) < self.hedge_min_samples:
+                return None
+            return max(self.latency.quantile(self.hedge_quantile), self.hedge_min_delay)
+
+    def _take_hedge_slot(self) -> bool:
+        with self._lock:
+            if sum(self._hedge_window) >= self.hedge_max_ratio * max(len(self._hedge_window), 1):
+                self._hedge_window.append(0)
+                return False
+            self._hedge_window.append(1)
+        self.event("hedges")
+        return True
+
+    def _no_hedge(self):
+        with self._lock:
+            self._hedge_window.append(0)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.event("short_circuits")
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+        self.event("calls")
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        self.record_error(error)
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts or self.breaker.is_open:
+            return False
+        self.event("retries")
+        RETRIES.labels("provider", self.name).inc()
+        return True
+
+    # --- 비동기 호출 ---
+    async def acall(self, fn: Callable[[], Awaitable[Any]], hedge: bool = True) -> Any:
+        self._admit()
+        try:
+            for attempt in range(self.max_attempts):
+                start = time.perf_counter()
+                try:
+                    result = await self._attempt(fn, hedge)
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    logging.warning(f"[{self.name}] 일시적 오류, {delay * 1000:.0f}ms 뒤 재시도 ({attempt + 1}/{self.max_attempts}): {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                self.record_success(time.perf_counter() - start)
+                return result
+        finally:
+            self.breaker.release()
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await fn()
+        tasks = [asyncio.ensure_future(fn())]
+        created = list(tasks)
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._take_hedge_slot():
+                if done:
+                    self._no_hedge()
+            else:
+                tasks.append(asyncio.ensure_future(fn()))
+                created.append(tasks[-1])
+            error = None
+            while tasks:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        if task is not created[0]:
+                            self.event("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                tasks = list(pending)
+            raise error
+        finally:
+            for task in created:
+                if not task.done():
+                    task.cancel()
+
+    # --- 블로킹 호출 ---
+    def call(self, fn: Callable[[], Any], hedge: bool = True) -> Any:
+        self._admit()
+        try:
+            for attempt in range(self.max_attempts):
+                start = time.perf_counter()
+                try:
+                    result = self._attempt_blocking(fn, hedge)
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    logging.warning(f"[{self.name}] 일시적 오류, {delay * 1000:.0f}ms 뒤 재시도 ({attempt + 1}/{self.max_attempts}): {e}")
+                    time.sleep(delay)
+                    continue
+                self.record_success(time.perf_counter() - start)
+                return result
+        finally:
+            self.breaker.release()
+
+    def _attempt_blocking(self, fn: Callable[[], Any], hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return fn()
+        # 요청 추적 같은 contextvar 가 헤지 스레드에서도 보이도록 호출마다 컨텍스트를 복사합니다.
+        executor = hedge_executor()
+        primary = executor.submit(contextvars.copy_context().run, fn)
+        futures = [primary]
+        done, _ = wait_futures(futures, timeout=delay)
+        if not done and self._take_hedge_slot():
+            futures.append(executor.submit(contextvars.copy_context().run, fn))
+        elif done:
+            self._no_hedge()
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is not primary:
+                        self.event("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            samples = len(self.latency)
+            p50, p95 = self.latency.quantile(0.5), self.latency.quantile(self.hedge_quantile)
+        return {
+            **counts,
+            "latency_samples": samples,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "hedge_after_ms": round(max(p95, self.hedge_min_delay) * 1000, 1)
+            if p95 is not None and self.hedge and samples >= self.hedge_min_samples else None,
+            "breaker": self.breaker.snapshot(),
+        }
+
+
+Fallbacks = Sequence[Tuple[str, Callable[[], Any]]]
+
+
+class ProviderGuards:
+    """공급자 이름별 ProviderGuard 레지스트리와 대체 경로 실행. MOIT_PROVIDER_GUARD=0 이면 그대로 호출합니다."""
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = enabled if enabled is not None else os.getenv("MOIT_PROVIDER_GUARD", "1") == "1"
+        self._lock = threading.Lock()
+        self._guards = {}
+
+    def get(self, name: str) -> ProviderGuard:
+        with self._lock:
+            if name not in self._guards:
+                self._guards[name] = ProviderGuard(name)
+            return self._guards[name]
+
+    def reset(self):
+        """지연 분포, 차단기 상태, 통계를 모두 버립니다. (벤치마크/설정 변경용)"""
+        with self._lock:
+            self._guards.clear()
+
+    def _fallback_or_raise(self, chain: Fallbacks, index: int, error: Exception):
+        if isinstance(error, CircuitOpenError) or (is_retryable(error) and index + 1 < len(chain)):
+            if index + 1 < len(chain):
+                logging.warning(f"{chain[index][0]} 호출 실패, {chain[index + 1][0]} 로 대체합니다: {error}")
+            return
+        raise error
+
+    async def acall(self, name: str, fn: Callable[[], Awaitable[Any]], fallbacks: Fallbacks = (), hedge: bool = True) -> Any:
+        """fn 을 name 공급자로 호출하고, 차단/실패하면 fallbacks [(공급자 이름, 호출 함수)] 를 차례로 시도합니다."""
+        if not self.enabled:
+            return await fn()
+        chain = [(name, fn)] + list(fallbacks)
+        error = None
+        for index, (provider, call) in enumerate(chain):
+            try:
+                result = await self.get(provider).acall(call, hedge=hedge)
+            except Exception as e:
+                self._fallback_or_raise(chain, index, e)
+                error = e
+                continue
+            if index:
+                self.get(name).event("fallbacks")
+            return result
+        raise error
+
+    def call(self, name: str, fn: Callable[[], Any], fallbacks: Fallbacks = (), hedge: bool = True) -> Any:
+        """acall 의 블로킹 버전 (작업 스레드에서 도는 SDK 호출용)"""
+        if not self.enabled:
+            return fn()
+        chain = [(name, fn)] + list(fallbacks)
+        error = None
+        for index, (provider, call) in enumerate(chain):
+            try:
+                result = self.get(provider).call(call, hedge=hedge)
+            except Exception as e:
+                self._fallback_or_raise(chain, index, e)
+                error = e
+                continue
+            if index:
+                self.get(name).event("fallbacks")
+            return result
+        raise error
+
+    def _pick(self, chain: Fallbacks) -> Tuple[int, ProviderGuard, Callable[[], Any]]:
+        """차단기가 호출을 허용하는 첫 공급자를 고릅니다. (스트리밍용)"""
+        for index, (provider, make) in enumerate(chain):
+            guard = self.get(provider)
+            if guard.breaker.allow():
+                guard.event("calls")
+                return index, guard, make
+            guard.event("short_circuits")
+        raise CircuitOpenError(chain[0][0], self.get(chain[0][0]).breaker.retry_after())
+
+    async def astream(self, chain: Fallbacks):
+        """chain [(공급자 이름, 비동기 이터레이터를 만드는 함수)] 중 차단되지 않은 첫 공급자로 스트리밍합니다."""
+        if not self.enabled:
+            async for chunk in chain[0][1]():
+                yield chunk
+            return
+        index, guard, make = self._pick(chain)
+        if index:
+            self.get(chain[0][0]).event("fallbacks")
+        try:
+            async for chunk in make():
+                yield chunk
+        except Exception as e:
+            guard.record_error(e)
+            raise
+        else:
+            guard.record_success()
+        finally:
+            guard.breaker.release()
+
+    def stream(self, chain: Fallbacks):
+        """astream 의 블로킹 버전"""
+        if not self.enabled:
+            yield from chain[0][1]()
+            return
+        index, guard, make = self._pick(chain)
+        if index:
+            self.get(chain[0][0]).event("fallbacks")
+        try:
+            yield from make()
+        except Exception as e:
+            guard.record_error(e)
+            raise
+        else:
+            guard.record_success()
+        finally:
+            guard.breaker.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            guards = dict(self._guards)
+        return {"enabled": self.enabled, "providers": {name: guard.snapshot() for name, guard in sorted(guards.items())}}
+
+
+provider_guards = ProviderGuards()
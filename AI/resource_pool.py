@@ -0,0 +1,462 @@
+# resource_pool.py
+# 임베딩, 벡터 스토어, LLM 클라이언트를 프로세스 전체에서 한 번만 만들어 공유하는 레지스트리
+
+import os
+import json
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config
+from langchain_core.tracers.log_stream import LogStreamCallbackHandler
+
+from provider_guard import provider_guards, StreamInterruptedError
+
+DEFAULT_LLM_MODEL = "gpt-4o-mini"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+# 모델별 대체 모델 목록. 예: MOIT_LLM_FALLBACKS='{"gpt-4o-mini": ["gpt-4o"]}'
+LLM_FALLBACKS = json.loads(os.getenv("MOIT_LLM_FALLBACKS", "{}"))
+# 이 태그가 붙은 LLM 호출의 토큰만 /agent/stream 으로 내보냅니다. (라우터, 평가 등 중간 호출 제외)
+STREAM_TOKENS_TAG = "stream_tokens"
+
+
+def get_meeting_index_name() -> str:
+    """모임 벡터 인덱스 이름을 환경 변수에서 읽어옵니다."""
+    meeting_index_name = os.getenv("PINECONE_INDEX_NAME_MEETING")
+    if not meeting_index_name:
+        raise ValueError("'.env' 파일에 PINECONE_INDEX_NAME_MEETING 변수를 설정해야 합니다.")
+    return meeting_index_name
+
+
+class ResourceRegistry:
+    """LLM, 임베딩, 벡터 스토어 클라이언트를 캐싱하는 프로세스 전역 레지스트리.
+
+    - 모든 OpenAI 클라이언트는 keep-alive 커넥션 풀을 가진 하나의 httpx 세션을 공유합니다.
+    - 벡터 스토어는 인덱스 이름별로 한 번만 연결(describe)합니다.
+    - 테스트에서는 configure()로 팩토리를 바꿔 끼우거나 MOIT_*_BACKEND=fake로 로컬 가짜 구현을 사용합니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._http_client = None
+        self._http_async_client = None
+        self._llms = {}
+        self._embeddings = {}
+        self._vector_stores = {}
+        self._blocking_executor = None
+        self.llm_factory = None
+        self.embeddings_factory = None
+        self.vector_store_factory = None
+        self.started = False
+
+    # --- 설정 ---
+    def configure(self, llm_factory=None, embeddings_factory=None, vector_store_factory=None):
+        """클라이언트 생성 방식을 교체합니다. 이미 만들어진 인스턴스는 모두 폐기됩니다."""
+        with self._lock:
+            if llm_factory is not None: self.llm_factory = llm_factory
+            if embeddings_factory is not None: self.embeddings_factory = embeddings_factory
+            if vector_store_factory is not None: self.vector_store_factory = vector_store_factory
+            self._llms.clear()
+            self._close_embeddings()
+            self._close_vector_stores()
+
+    def _close_embeddings(self):
+        for embeddings in self._embeddings.values():
+            if hasattr(embeddings, "close"):
+                embeddings.close()
+        self._embeddings.clear()
+
+    def _close_vector_stores(self):
+        # 로컬 인덱스는 스냅샷을 모아서 기록하므로 버리기 전에 남은 변경을 기록합니다.
+        for store in self._vector_stores.values():
+            if hasattr(store, "close"):
+                store.close()
+        self._vector_stores.clear()
+
+    def _http_limits(self):
+        return httpx.Limits(
+            max_connections=int(os.getenv("MOIT_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("MOIT_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("MOIT_HTTP_KEEPALIVE_EXPIRY", "60")),
+        )
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(limits=self._http_limits(), timeout=httpx.Timeout(60.0, connect=5.0))
+            return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(limits=self._http_limits(), timeout=httpx.Timeout(60.0, connect=5.0))
+            return self._http_async_client
+
+    @property
+    def blocking_executor(self) -> ThreadPoolExecutor:
+        """Gemini SDK, PIL 디코딩처럼 이벤트 루프를 막는 작업을 돌리는 크기 제한 스레드 풀"""
+        with self._lock:
+            if self._blocking_executor is None:
+                self._blocking_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("MOIT_BLOCKING_WORKERS", "8")),
+                    thread_name_prefix="moit-blocking",
+                )
+            return self._blocking_executor
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """블로킹 함수를 전용 스레드 풀에서 실행하고 결과를 기다립니다."""
+        return await asyncio.wrap_future(self.submit_blocking(fn, *args, **kwargs))
+
+    def submit_blocking(self, fn, *args, **kwargs) -> Future:
+        """블로킹 함수를 전용 스레드 풀에 넣고 concurrent.futures.Future 를 돌려줍니다. (기다리는 쪽이 취소돼도 끝까지 추적할 때)"""
+        # 요청 추적/LangChain 설정 같은 contextvar가 작업 스레드에서도 보이도록 현재 컨텍스트를 복사해 실행합니다.
+        context = contextvars.copy_context()
+        return self.blocking_executor.submit(context.run, fn, *args, **kwargs)
+
+    # --- 클라이언트 조회 ---
+    def get_llm(self, model: str = DEFAULT_LLM_MODEL):
+        with self._lock:
+            if model not in self._llms:
+                if self.llm_factory is not None:
+                    self._llms[model] = self.llm_factory(model)
+                else:
+                    from langchain_openai import ChatOpenAI
+                    self._llms[model] = ChatOpenAI(
+                        model=model,
+                        http_client=self.http_client,
+                        http_async_client=self.http_async_client,
+                        # 재시도는 공급자 호출 계층(provider_guard)이 백오프/차단기와 함께 맡습니다.
+                        max_retries=0 if provider_guards.enabled else 2,
+                    )
+                logging.info(f"LLM 클라이언트 생성: {model}")
+            return self._llms[model]
+
+    def lazy_llm(self, model: str = DEFAULT_LLM_MODEL) -> "LazyLLM":
+        """모듈 로드 시점에는 공급자 SDK를 import 하지 않고, 처음 호출될 때 get_llm(model) 로 연결되는 LLM을 반환합니다."""
+        return LazyLLM(self, model)
+
+    def get_embeddings(self, model: str = DEFAULT_EMBEDDING_MODEL):
+        with self._lock:
+            if model not in self._embeddings:
+                if self.embeddings_factory is not None:
+                    embeddings = self.embeddings_factory(model)
+                elif os.getenv("MOIT_EMBEDDING_BACKEND", "openai") == "fake":
+                    from fake_providers import FakeEmbeddings
+                    embeddings = FakeEmbeddings()
+                else:
+                    from langchain_openai import OpenAIEmbeddings
+                    embeddings = OpenAIEmbeddings(
+                        model=model,
+                        http_client=self.http_client,
+                        http_async_client=self.http_async_client,
+                    )
+                from telemetry import InstrumentedEmbeddings
+                embeddings = InstrumentedEmbeddings(embeddings, model=model)
+                if os.getenv("MOIT_EMBED_CACHE", "1") == "1":
+                    from embedding_cache import CachedEmbeddings
+                    embeddings = CachedEmbeddings(embeddings, model=model, run_blocking=self.run_blocking)
+                self._embeddings[model] = embeddings
+                logging.info(f"임베딩 클라이언트 생성: {model}")
+            return self._embeddings[model]
+
+    def get_vector_store(self, index_name: str = None):
+        index_name = index_name or get_meeting_index_name()
+        with self._lock:
+            if index_name not in self._vector_stores:
+                embedding_function = self.get_embeddings()
+                backend = os.getenv("MOIT_VECTOR_BACKEND", "pinecone")
+                if self.vector_store_factory is not None:
+                    store = self.vector_store_factory(index_name, embedding_function)
+                elif backend == "fake":
+                    from fake_providers import FakeVectorStore
+                    store = FakeVectorStore(embedding=embedding_function)
+                elif backend == "local":
+                    from local_vector_store import LocalVectorStore
+                    snapshot_dir = os.path.join(os.getenv("MOIT_LOCAL_INDEX_DIR", "local_index"), index_name)
+                    store = LocalVectorStore.load(snapshot_dir, embedding=embedding_function)
+                else:
+                    from langchain_pinecone import PineconeVectorStore
+                    store = PineconeVectorStore.from_existing_index(index_name=index_name, embedding=embedding_function)
+                self._vector_stores[index_name] = store
+                logging.info(f"벡터 스토어 연결: {index_name} ({type(store).__name__})")
+            return self._vector_stores[index_name]
+
+    # --- 수명 주기 훅 ---
+    async def warm_up(self) -> dict:
+        """LLM/임베딩/벡터 스토어 클라이언트를 미리 만들고 API 서버와의 커넥션을 열어 둡니다. 단계별 소요 시간(초)을 반환합니다.
+
+        LLM/임베딩 생성 실패는 예외로 올리고, 벡터 스토어/사전 연결 실패는 경고만 남깁니다. (첫 요청에서 재시도)
+        """
+        logging.info("--- 리소스 레지스트리 워밍업 ---")
+        timings = {}
+        for name, fn, required in (
+            ("llm", self.get_llm, True),
+            ("embeddings", self.get_embeddings, True),
+            ("vector_store", self.get_vector_store, False),
+        ):
+            start = time.perf_counter()
+            try:
+                # 공급자 SDK import 와 Pinecone describe 는 블로킹이므로 작업 스레드에서 돌립니다.
+                await self.run_blocking(fn)
+            except Exception as e:
+                if required:
+                    raise
+                logging.warning(f"{name} 사전 연결 실패 (첫 요청에서 재시도합니다): {e}")
+            timings[name] = time.perf_counter() - start
+        start = time.perf_counter()
+        await self.preconnect()
+        timings["preconnect"] = time.perf_counter() - start
+        self.started = True
+        return timings
+
+    async def preconnect(self):
+        """공유 HTTP 세션으로 API 서버에 가벼운 요청을 보내 TLS 커넥션을 풀에 미리 채워 둡니다."""
+        default = "https://api.openai.com/v1/models" if self.llm_factory is None else ""
+        urls = [url.strip() for url in os.getenv("MOIT_WARMUP_PRECONNECT", default).split(",") if url.strip()]
+        for url in urls:
+            try:
+                # 응답 코드(401 등)와 상관없이 커넥션만 열리면 됩니다.
+                await self.http_async_client.head(url, timeout=5.0)
+            except Exception as e:
+                logging.warning(f"사전 연결 실패 ({url}): {e}")
+
+    def health(self) -> dict:
+        """레지스트리 상태 요약을 반환합니다."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "llms": sorted(self._llms),
+                "embeddings": sorted(self._embeddings),
+                "embedding_cache": {
+                    model: embeddings.cache_stats()
+                    for model, embeddings in self._embeddings.items() if hasattr(embeddings, "cache_stats")
+                },
+                "vector_stores": {name: type(store).__name__ for name, store in self._vector_stores.items()},
+                "http_client_open": self._http_client is not None and not self._http_client.is_closed,
+            }
+
+    async def ashutdown(self):
+        """서버 종료 시 HTTP 세션을 닫고 캐시된 클라이언트를 정리합니다."""
+        logging.info("--- 리소스 레지스트리 정리 ---")
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            http_async_client, self._http_async_client = self._http_async_client, None
+            blocking_executor, self._blocking_executor = self._blocking_executor, None
+            self._llms.clear()
+            self._close_embeddings()
+            self._close_vector_stores()
+            self.started = False
+        if http_client is not None:
+            http_client.close()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if blocking_executor is not None:
+            blocking_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_streamed(config) -> bool:
+    """invoke 라도 토큰이 클라이언트로 바로 나가는 호출인지.
+
+    STREAM_TOKENS_TAG 가 붙었거나 astream_events/astream_log 의 LogStreamCallbackHandler 가 붙어 있으면
+    채팅 모델이 내부적으로 스트리밍하므로, 헤지하거나 첫 토큰 뒤에 재시도하면 조각이 중복됩니다.
+    """
+    # 체인 안에서 config 없이 부른 호출도 astream_events 의 콜백을 컨텍스트로 물려받습니다.
+    config = ensure_config(config)
+    if STREAM_TOKENS_TAG in (config.get("tags") or []):
+        return True
+    callbacks = config.get("callbacks")
+    handlers = list(getattr(callbacks, "handlers", None) or []) if not isinstance(callbacks, list) else callbacks
+    return any(isinstance(handler, LogStreamCallbackHandler) for handler in handlers)
+
+
+class TokenWatch(BaseCallbackHandler):
+    """호출이 첫 토큰을 내보냈는지 기록하고, 그 뒤의 실패는 StreamInterruptedError 로 바꿔 재시도/대체를 막습니다."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.started = True
+
+    def attach(self, config) -> dict:
+        config = ensure_config(config)
+        callbacks = config.get("callbacks")
+        if callbacks is None or isinstance(callbacks, list):
+            config["callbacks"] = list(callbacks or []) + [self]
+        else:
+            callbacks = callbacks.copy()
+            callbacks.add_handler(self, inherit=True)
+            config["callbacks"] = callbacks
+        return config
+
+    def _interrupted(self, error: Exception) -> Exception:
+        if self.started and not isinstance(error, StreamInterruptedError):
+            return StreamInterruptedError(f"LLM 스트리밍 중단: {error}")
+        return error
+
+    def guard(self, call):
+        def guarded():
+            try:
+                return call()
+            except Exception as e:
+                error = self._interrupted(e)
+                if error is e:
+                    raise
+                raise error from e
+        return guarded
+
+    def aguard(self, call):
+        async def guarded():
+            try:
+                return await call()
+            except Exception as e:
+                error = self._interrupted(e)
+                if error is e:
+                    raise
+                raise error from e
+        return guarded
+
+
+class LazyRunnable(Runnable):
+    """resolve() 가 돌려주는 실제 Runnable 에 호출 시점마다 위임하는 대리 객체.
+
+    provider 가 주어지면 호출을 공급자 호출 계층(헤지, 백오프 재시도, 회로 차단기)에 태우고,
+    실패하면 fallbacks [(공급자 이름, resolve)] 의 Runnable 로 같은 입력을 다시 보냅니다.
+    """
+
+    def __init__(self, resolve, label: str, provider: str = None, fallbacks: list = None):
+        self._resolve = resolve
+        self._label = label
+        self._provider = provider
+        self._fallbacks = fallbacks or []
+
+    @property
+    def bound(self):
+        return self._resolve()
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def _chain(self, method: str, *args, **kwargs) -> list:
+        """[(공급자 이름, 인자 없는 호출 함수)] - 기본 공급자 다음에 대체 공급자들"""
+        targets = [(self._provider, self._resolve)] + self._fallbacks
+        return [(name, functools.partial(lambda resolve: getattr(resolve(), method)(*args, **kwargs), resolve))
+                for name, resolve in targets]
+
+    def invoke(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.invoke(input, config, **kwargs)
+        if not is_streamed(config):
+            (name, call), *fallbacks = self._chain("invoke", input, config, **kwargs)
+            return provider_guards.call(name, call, fallbacks)
+        # 토큰이 바로 나가는 호출은 헤지하지 않고, 첫 토큰 전의 실패만 재시도/대체합니다.
+        watch = TokenWatch()
+        (name, call), *fallbacks = [(provider, watch.guard(call))
+                                    for provider, call in self._chain("invoke", input, watch.attach(config), **kwargs)]
+        return provider_guards.call(name, call, fallbacks, hedge=False)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return await self.bound.ainvoke(input, config, **kwargs)
+        if not is_streamed(config):
+            (name, call), *fallbacks = self._chain("ainvoke", input, config, **kwargs)
+            return await provider_guards.acall(name, call, fallbacks)
+        watch = TokenWatch()
+        (name, call), *fallbacks = [(provider, watch.aguard(call))
+                                    for provider, call in self._chain("ainvoke", input, watch.attach(config), **kwargs)]
+        return await provider_guards.acall(name, call, fallbacks, hedge=False)
+
+    def batch(self, inputs, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.batch(inputs, config, **kwargs)
+        # 항목마다 invoke 를 거쳐 재시도/대체가 항목 단위로 적용되게 합니다.
+        return super().batch(inputs, config, **kwargs)
+
+    async def abatch(self, inputs, config=None, **kwargs):
+        if self._provider is None:
+            return await self.bound.abatch(inputs, config, **kwargs)
+        return await super().abatch(inputs, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.stream(input, config, **kwargs)
+        return provider_guards.stream(self._chain("stream", input, config, **kwargs))
+
+    def astream(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.astream(input, config, **kwargs)
+        return provider_guards.astream(self._chain("astream", input, config, **kwargs))
+
+    def transform(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.transform(input, config, **kwargs)
+        return provider_guards.stream(self._chain("transform", input, config, **kwargs))
+
+    def atransform(self, input, config=None, **kwargs):
+        if self._provider is None:
+            return self.bound.atransform(input, config, **kwargs)
+        return provider_guards.astream(self._chain("atransform", input, config, **kwargs))
+
+    def __getattr__(self, name):
+        # model_name 등 나머지 속성은 실제 객체에서 찾습니다.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.bound, name)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._label})"
+
+
+class LazyLLM(LazyRunnable):
+    """registry.get_llm(model) 을 호출 시점에 찾아 위임하는 LLM 대리 객체.
+
+    체인/그래프는 모듈 로드 시 조립해 두되, langchain_openai 같은 공급자 모듈 import 와 클라이언트 생성은
+    워밍업 또는 첫 호출까지 미룹니다. 매번 레지스트리에서 찾으므로 configure() 로 교체한 팩토리도 그대로 반영됩니다.
+    모든 호출은 "llm:<모델>" 공급자로 공급자 호출 계층을 거치고, LLM_FALLBACKS 에 적힌 모델로 대체됩니다.
+    """
+
+    def __init__(self, registry: "ResourceRegistry", model: str):
+        fallbacks = [(f"llm:{name}", functools.partial(registry.get_llm, name)) for name in LLM_FALLBACKS.get(model, [])]
+        super().__init__(lambda: registry.get_llm(model), model, provider=f"llm:{model}", fallbacks=fallbacks)
+
+    def _derived(self, method: str, *args, **kwargs) -> LazyRunnable:
+        # with_structured_output / bind_tools 결과도 실제 클라이언트가 바뀔 때만 다시 만듭니다. (대체 모델도 같은 방식)
+        def derive(resolve_client):
+            cache = {}
+
+            def resolve():
+                client = resolve_client()
+                if cache.get("client") is not client:
+                    cache.update(client=client, runnable=getattr(client, method)(*args, **kwargs))
+                return cache["runnable"]
+            return resolve
+
+        return LazyRunnable(
+            derive(self._resolve), f"{self._label}.{method}", provider=self._provider,
+            fallbacks=[(name, derive(resolve)) for name, resolve in self._fallbacks],
+        )
+
+    def with_structured_output(self, *args, **kwargs) -> LazyRunnable:
+        return self._derived("with_structured_output", *args, **kwargs)
+
+    def bind_tools(self, *args, **kwargs) -> LazyRunnable:
+        return self._derived("bind_tools", *args, **kwargs)
+
+
+registry = ResourceRegistry()
@@ -0,0 +1,179 @@
+# router_tiers.py
+# LLM 호출 없이 처리 가능한 요청을 먼저 걸러내는 단계형 라우터
+#   1단계(rule): 입력 스키마만 보고 결정 (survey -> 취미 추천, title/description -> 모임 매칭)
+#   2단계(centroid): 라벨링된 예시 문장의 임베딩 중심점과 비교해 결정
+#       자유 텍스트는 모임 매칭/취미 추천 노드가 기대하는 입력 형식이 아니므로, 이 단계에서는 general_search 만 확정합니다.
+#   3단계(llm): 위 두 단계에서 애매한 자유 텍스트만 LLM 라우터로 보냄
+
+import os
+import math
+import time
+import logging
+import threading
+
+ROUTES = ("meeting_matching", "hobby_recommendation", "general_search")
+# 중심점 분류기가 자유 텍스트 입력에 대해 바로 확정할 수 있는 경로
+CENTROID_ROUTES = ("general_search",)
+
+# 중심점 분류기에 사용할 라벨링된 예시 문장
+# (모임 매칭/취미 추천 예시는 그쪽에 가까운 문장을 general_search 로 잘못 확정하지 않도록 비교 대상으로만 씁니다)
+ROUTE_EXAMPLES = {
+    "meeting_matching": [
+        "주말에 같이 축구할 사람 모으는 모임을 만들고 싶어요",
+        "독서 모임을 새로 개설하려고 하는데 비슷한 모임이 있나요?",
+        "매주 토요일 한강에서 러닝 모임 만들기",
+        "보드게임 같이 할 멤버 모집합니다",
+        "같이 등산하실 분 모집 글을 올리려고 해요",
+    ],
+    "hobby_recommendation": [
+        "나한테 맞는 취미를 추천해줘",
+        "요즘 무기력한데 새로 시작할 만한 취미가 있을까?",
+        "혼자 할 수 있는 취미 좀 알려줘",
+        "내 성향에 맞는 여가 활동을 찾고 싶어",
+        "스트레스 풀 수 있는 새로운 취미 추천해줄래?",
+    ],
+    "general_search": [
+        "오늘 서울 날씨 어때?",
+        "비 오는 주말에 뭐하지?",
+        "강남역 근처 맛집 알려줘",
+        "이번 주 주요 뉴스 요약해줘",
+        "내일 미세먼지 농도는 어때?",
+    ],
+}
+
+
+def extract_payload(user_input: dict):
+    """create_meeting.php 처럼 messages로 감싸 보낸 경우까지 고려해 실제 페이로드를 꺼냅니다."""
+    if isinstance(user_input, dict) and 'messages' in user_input:
+        try:
+            return user_input['messages'][0][1]
+        except (KeyError, IndexError, TypeError):
+            return user_input
+    return user_input
+
+
+def rule_route(user_input: dict):
+    """입력 구조만으로 결정 가능한 경우 경로를 반환하고, 아니면 None을 반환합니다."""
+    payload = extract_payload(user_input)
+    if isinstance(user_input, dict) and 'survey' in user_input:
+        return "hobby_recommendation"
+    if isinstance(payload, dict):
+        if 'survey' in payload:
+            return "hobby_recommendation"
+        if 'title' in payload and 'description' in payload:
+            return "meeting_matching"
+    return None
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class CentroidClassifier:
+    """라벨별 예시 임베딩의 평균(중심점)과 코사인 유사도로 경로를 고릅니다."""
+
+    def __init__(self, examples: dict = None, min_similarity: float = None, min_margin: float = None):
+        self.examples = examples or ROUTE_EXAMPLES
+        self.min_similarity = min_similarity if min_similarity is not None else float(os.getenv("MOIT_ROUTER_MIN_SIMILARITY", "0.45"))
+        self.min_margin = min_margin if min_margin is not None else float(os.getenv("MOIT_ROUTER_MIN_MARGIN", "0.08"))
+        self.centroids = None
+
+    async def fit(self, embeddings):
+        labels, texts = [], []
+        for label, sentences in self.examples.items():
+            labels.extend([label] * len(sentences))
+            texts.extend(sentences)
+        vectors = await embeddings.aembed_documents(texts)
+        sums = {}
+        for label, vector in zip(labels, vectors):
+            acc = sums.setdefault(label, [0.0] * len(vector))
+            for i, v in enumerate(_normalize(vector)):
+                acc[i] += v
+        self.centroids = {label: _normalize(acc) for label, acc in sums.items()}
+
+    async def classify(self, text: str, embeddings):
+        """(경로, 점수) 를 반환합니다. 확신이 없으면 경로는 None입니다."""
+        if self.centroids is None:
+            await self.fit(embeddings)
+        query = _normalize(await embeddings.aembed_query(text))
+        scored = sorted(
+            ((sum(a * b for a, b in zip(query, centroid)), label) for label, centroid in self.centroids.items()),
+            reverse=True,
+        )
+        best_score, best_label = scored[0]
+        margin = best_score - (scored[1][0] if len(scored) > 1 else -1.0)
+        if best_score >= self.min_similarity and margin >= self.min_margin:
+            return best_label, best_score
+        return None, best_score
+
+
+class RouterStats:
+    """라우팅 단계별 결정 횟수와 소요 시간을 모읍니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"rule": 0, "centroid": 0, "llm": 0}
+        self.total_seconds = {"rule": 0.0, "centroid": 0.0, "llm": 0.0}
+
+    def record(self, tier: str, seconds: float):
+        with self._lock:
+            self.counts[tier] += 1
+            self.total_seconds[tier] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            avg = {tier: (self.total_seconds[tier] / self.counts[tier] if self.counts[tier] else 0.0) for tier in self.counts}
+            fast_hits = self.counts["rule"] + self.counts["centroid"]
+            # LLM 단계 평균 시간을 기준으로, 빠른 단계에서 처리한 요청이 아낀 시간을 추정합니다.
+            saved = sum((avg["llm"] - avg[tier]) * self.counts[tier] for tier in ("rule", "centroid")) if self.counts["llm"] else None
+            return {
+                "total": total,
+                "counts": dict(self.counts),
+                "avg_latency_ms": {tier: round(value * 1000, 2) for tier, value in avg.items()},
+                "fast_path_hit_rate": round(fast_hits / total, 4) if total else 0.0,
+                "estimated_latency_saved_ms": round(saved * 1000, 2) if saved is not None else None,
+            }
+
+
+class TieredRouter:
+    """rule -> centroid -> llm 순서로 경로를 결정합니다."""
+
+    def __init__(self, llm_chain, embeddings_getter, classifier: CentroidClassifier = None):
+        self.llm_chain = llm_chain
+        self.embeddings_getter = embeddings_getter
+        self.classifier = classifier or CentroidClassifier()
+        self.stats = RouterStats()
+        self.use_centroid = os.getenv("MOIT_ROUTER_CENTROID", "1") == "1"
+
+    async def warm_up(self):
+        """중심점 분류기의 예시 문장 임베딩을 미리 계산해 둡니다. (첫 요청이 이 비용을 치르지 않도록)"""
+        if self.use_centroid and self.classifier.centroids is None:
+            await self.classifier.fit(self.embeddings_getter())
+
+    async def route(self, user_input: dict):
+        """(경로, 결정 단계) 를 반환합니다."""
+        start = time.perf_counter()
+        route = rule_route(user_input)
+        if route is not None:
+            self.stats.record("rule", time.perf_counter() - start)
+            return route, "rule"
+
+        payload = extract_payload(user_input)
+        if self.use_centroid and isinstance(payload, str) and payload.strip():
+            try:
+                route, score = await self.classifier.classify(payload, self.embeddings_getter())
+                if route in CENTROID_ROUTES:
+                    logging.info(f"중심점 분류기 결정: {route} (유사도 {score:.3f})")
+                    self.stats.record("centroid", time.perf_counter() - start)
+                    return route, "centroid"
+                if route is not None:
+                    logging.info(f"중심점 분류기가 {route} 로 판단했지만 자유 텍스트 입력이므로 LLM 라우터로 넘깁니다.")
+            except Exception as e:
+                logging.warning(f"중심점 분류기 실패, LLM 라우터로 넘깁니다: {e}")
+
+        route_decision = await self.llm_chain.ainvoke({"user_input": user_input})
+        route = route_decision.strip().lower().replace("'", "").replace('"', '')
+        self.stats.record("llm", time.perf_counter() - start)
+        return route, "llm"
@@ -0,0 +1,172 @@
+# survey_engine.py
+# 설문 응답을 FSC / PSSR / MP / DLS / IP 프로필로 바꾸는 스키마 기반 배치 엔진
+#   - 응답은 (문항 × 응답자) NumPy 행렬 하나로 다루며, 빈 응답은 NaN 입니다.
+#   - 모든 정규화 점수와 역채점 합성 점수(q14, q41)를 열 단위로 한 번에 계산합니다.
+#   - 한 명의 설문만 분석할 때도 같은 엔진을 크기 1 배치로 사용합니다.
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+N_QUESTIONS = 47
+
+
+@dataclass(frozen=True)
+class Feature:
+    """프로필 항목 하나의 계산 규칙
+
+    kind
+      - scale:     normalize(q, lo, hi)
+      - flag:      q 가 values 중 하나이면 True
+      - choice:    mapping[q], 없으면 fallback
+      - composite: 문항 평균(빈 응답은 default, reverse 문항은 lo+hi-q)을 normalize
+    """
+    path: Tuple[str, ...]
+    kind: str
+    questions: Tuple[int, ...]
+    lo: int = 1
+    hi: int = 5
+    values: Tuple[int, ...] = ()
+    mapping: Optional[Dict[int, str]] = None
+    fallback: Optional[str] = None
+    reverse: Tuple[int, ...] = ()
+    default: int = 3
+
+
+def _scale(group, name, q, lo=1, hi=5):
+    return Feature(path=(group,) + tuple(name.split('.')), kind="scale", questions=(q,), lo=lo, hi=hi)
+
+
+MOTIVATION_MAP = {1: '성취', 2: '회복', 3: '연결', 4: '활력'}
+SOCIALITY_MAP = {1: '단독형', 2: '병렬형', 3: '저강도 상호작용형', 4: '고강도 상호작용형'}
+GROUP_SIZE_MAP = {1: '1:1', 2: '소규모 그룹', 3: '대규모 그룹'}
+
+# 출력 딕셔너리의 키 순서는 이 목록의 순서를 그대로 따릅니다.
+SURVEY_SCHEMA: List[Feature] = [
+    # --- FSC ---
+    _scale('FSC', 'time_availability', 1, 1, 4),
+    _scale('FSC', 'financial_budget', 2, 1, 4),
+    _scale('FSC', 'energy_level', 3),
+    _scale('FSC', 'mobility', 4),
+    Feature(('FSC', 'has_physical_constraints'), "flag", (5,), values=(1, 2, 3)),
+    Feature(('FSC', 'has_housing_constraints'), "flag", (12,), values=(2, 3, 4)),
+    Feature(('FSC', 'preferred_space'), "choice", (6,), mapping={1: 'indoor'}, fallback='outdoor'),
+    # --- PSSR ---
+    Feature(('PSSR', 'self_criticism_score'), "composite", (13, 14, 16), reverse=(14,)),
+    Feature(('PSSR', 'social_anxiety_score'), "composite", (15, 18, 20)),
+    _scale('PSSR', 'isolation_level', 21),
+    _scale('PSSR', 'structure_preference_score', 27),
+    _scale('PSSR', 'avoidant_coping_score', 29),
+    # --- MP ---
+    Feature(('MP', 'core_motivation'), "choice", (31,), mapping=MOTIVATION_MAP),
+    _scale('MP', 'value_profile.knowledge', 33),
+    _scale('MP', 'value_profile.stability', 34),
+    _scale('MP', 'value_profile.relationship', 35),
+    _scale('MP', 'value_profile.health', 36),
+    _scale('MP', 'value_profile.creativity', 37),
+    _scale('MP', 'value_profile.control', 38),
+    Feature(('MP', 'process_orientation_score'), "composite", (41,), reverse=(41,)),
+    # --- DLS ---
+    Feature(('DLS', 'preferred_sociality_type'), "choice", (39,), mapping=SOCIALITY_MAP),
+    Feature(('DLS', 'preferred_group_size'), "choice", (40,), mapping=GROUP_SIZE_MAP),
+    _scale('DLS', 'autonomy_preference_score', 42),
+    # --- IP ---
+    _scale('IP', 'nature_interest', 43),
+    _scale('IP', 'craft_interest', 44),
+    _scale('IP', 'intellect_interest', 45),
+    _scale('IP', 'art_interest', 46),
+    _scale('IP', 'activity_interest', 47),
+]
+
+PROFILE_GROUPS = ('FSC', 'PSSR', 'MP', 'DLS', 'IP')
+
+
+def _to_number(value):
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def responses_to_matrix(responses: List[dict]) -> np.ndarray:
+    """설문 응답 딕셔너리 목록({"1": 3, ...})을 (문항 × 응답자) 행렬로 바꿉니다."""
+    matrix = np.full((N_QUESTIONS, len(responses)), np.nan)
+    keys = [str(q) for q in range(1, N_QUESTIONS + 1)]
+    for col, response in enumerate(responses):
+        for row, key in enumerate(keys):
+            value = response.get(key)
+            if value is not None:
+                matrix[row, col] = _to_number(value)
+    return matrix
+
+
+def _normalize(values: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    return np.round((values - lo) / (hi - lo), 4)
+
+
+def compute_feature_columns(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """스키마의 모든 항목을 열 단위로 계산합니다. 키는 'FSC.time_availability' 같은 점 경로입니다.
+
+    scale / composite 는 float 배열(빈 응답은 NaN), flag 는 bool 배열, choice 는 object 배열입니다.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n = matrix.shape[1]
+    columns = {}
+    for feature in SURVEY_SCHEMA:
+        rows = [matrix[q - 1] for q in feature.questions]
+        if feature.kind == "scale":
+            column = _normalize(rows[0], feature.lo, feature.hi)
+        elif feature.kind == "flag":
+            column = np.logical_or.reduce([rows[0] == value for value in feature.values])
+        elif feature.kind == "choice":
+            column = np.full(n, feature.fallback, dtype=object)
+            for code, label in feature.mapping.items():
+                column[rows[0] == code] = label
+        elif feature.kind == "composite":
+            items = np.stack(rows)
+            # 기존 `(값 or 3)` 규칙과 같게, 빈 응답과 0은 기본값으로 채웁니다.
+            items = np.where(np.isnan(items) | (items == 0), feature.default, items)
+            for i, q in enumerate(feature.questions):
+                if q in feature.reverse:
+                    items[i] = feature.lo + feature.hi - items[i]
+            column = _normalize(items.mean(axis=0), feature.lo, feature.hi)
+        else:
+            raise ValueError(f"알 수 없는 항목 유형: {feature.kind}")
+        columns['.'.join(feature.path)] = column
+    return columns
+
+
+def columns_to_profiles(columns: Dict[str, np.ndarray]) -> List[dict]:
+    """열 단위 계산 결과를 응답자별 중첩 딕셔너리 프로필 목록으로 되돌립니다."""
+    lists = []
+    for feature in SURVEY_SCHEMA:
+        column = columns['.'.join(feature.path)]
+        values = column.tolist()
+        if column.dtype.kind == 'f':
+            values = [None if v != v else v for v in values]  # NaN -> None
+        lists.append((feature.path, values))
+    n = len(lists[0][1]) if lists else 0
+
+    profiles = []
+    for i in range(n):
+        profile = {group: {} for group in PROFILE_GROUPS}
+        for path, values in lists:
+            node = profile
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node[path[-1]] = values[i]
+        profiles.append(profile)
+    return profiles
+
+
+def analyze_surveys(responses: List[dict]) -> List[dict]:
+    """설문 응답 목록을 프로필 목록으로 변환합니다."""
+    return columns_to_profiles(compute_feature_columns(responses_to_matrix(responses)))
+
+
+def analyze_survey(responses: dict) -> dict:
+    """설문 하나를 프로필로 변환합니다."""
+    return analyze_surveys([responses])[0]
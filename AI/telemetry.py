@@ -0,0 +1,294 @@
+# telemetry.py
+# 그래프 노드 / LLM / 임베딩 / 벡터 검색 / 도구 호출 구간(span)의 지연 시간, 토큰, 비용을 수집합니다.
+#   - 모든 구간은 Prometheus 히스토그램/카운터로 기록되어 /metrics 에서 내보냅니다.
+#   - 요청 단위 추적(RequestTrace)이 켜져 있으면 구간 목록을 모아 요청별 시간 분해를 만듭니다.
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# --- Prometheus 지표 ---
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+SPAN_DURATION = Histogram(
+    "moit_span_duration_seconds", "구간별 소요 시간", ["kind", "name"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "moit_request_duration_seconds", "HTTP 요청 처리 시간", ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("moit_llm_tokens_total", "LLM 토큰 사용량", ["model", "type"])
+LLM_COST = Counter("moit_llm_cost_usd_total", "LLM 사용 추정 비용(USD)", ["model"])
+RETRIES = Counter("moit_retries_total", "재시도 횟수", ["kind", "name"])
+SPAN_ERRORS = Counter("moit_span_errors_total", "오류로 끝난 구간 수", ["kind", "name"])
+PROMPT_TOKENS_SAVED = Counter("moit_prompt_tokens_saved_total", "토큰 예산으로 줄인 프롬프트 토큰 수", ["chain"])
+# 공급자 호출 계층 이벤트 (hedge / hedge_win / retry / failure / short_circuit / fallback) 와 차단기 상태 (0: 닫힘, 1: 반열림, 2: 열림)
+PROVIDER_EVENTS = Counter("moit_provider_events_total", "공급자 호출 계층 이벤트 수", ["provider", "event"])
+CIRCUIT_STATE = Gauge("moit_circuit_state", "공급자별 회로 차단기 상태", ["provider"])
+# 경로별 입장 제어 결과 (admitted / queued / rejected / expired / cancelled) 와 대기열에서 기다린 시간
+ADMISSION_EVENTS = Counter("moit_admission_total", "경로별 입장 제어 결과", ["route", "outcome"])
+ADMISSION_WAIT = Histogram("moit_admission_wait_seconds", "입장 대기열에서 기다린 시간", ["route"], buckets=LATENCY_BUCKETS)
+# 콜드 스타트 단계별 소요 시간 (import / warmup / first_request: main import 시작부터 첫 성공 응답까지)
+STARTUP_SECONDS = Gauge("moit_startup_seconds", "서버 시작 단계별 소요 시간", ["phase"])
+
+# 모델별 100만 토큰당 가격(USD, 입력/출력). MOIT_MODEL_PRICES 에 같은 형식의 JSON을 넣어 덮어쓸 수 있습니다.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("MOIT_MODEL_PRICES", "{}")).items()})
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    # "gpt-4o-mini-2024-07-18" 처럼 날짜가 붙은 모델명도 가장 긴 접두어로 찾습니다.
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+# --- 요청 단위 추적 ---
+class RequestTrace:
+    """한 요청 동안 기록된 구간 목록"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[dict] = []
+
+    def add(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, dict]:
+        """kind:name 별로 호출 횟수, 합계 시간, 토큰을 모읍니다."""
+        summary = {}
+        with self._lock:
+            for span in self.spans:
+                item = summary.setdefault(f"{span['kind']}:{span['name']}", {"count": 0, "ms": 0.0, "tokens": 0, "retries": 0})
+                item["count"] += 1
+                item["ms"] += span["ms"]
+                item["tokens"] += span.get("prompt_tokens", 0) + span.get("completion_tokens", 0)
+                item["retries"] += span.get("retries", 0)
+        return summary
+
+    def server_timing(self) -> str:
+        """Server-Timing 헤더 값 (브라우저 개발자 도구에서 바로 보입니다)"""
+        parts = []
+        for key, item in sorted(self.breakdown().items(), key=lambda kv: -kv[1]["ms"]):
+            metric = key.replace(":", "_").replace("/", "_").replace(" ", "_")
+            parts.append(f'{metric};dur={item["ms"]:.1f};desc="x{item["count"]}"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("moit_request_trace", default=None)
+
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_span(kind: str, name: str, seconds: float, model: str = None, prompt_tokens: int = 0,
+                completion_tokens: int = 0, retries: int = 0, error: bool = False):
+    """구간 하나를 지표와 (켜져 있으면) 요청 추적에 기록합니다."""
+    SPAN_DURATION.labels(kind, name).observe(seconds)
+    if error:
+        SPAN_ERRORS.labels(kind, name).inc()
+    if prompt_tokens or completion_tokens:
+        label = model or name
+        LLM_TOKENS.labels(label, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(label, "completion").inc(completion_tokens)
+        cost = estimate_cost(label, prompt_tokens, completion_tokens)
+        if cost:
+            LLM_COST.labels(label).inc(cost)
+    trace = _current_trace.get()
+    if trace is not None:
+        span = {"kind": kind, "name": name, "ms": round(seconds * 1000, 2)}
+        if prompt_tokens or completion_tokens:
+            span.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if retries:
+            span["retries"] = retries
+        if error:
+            span["error"] = True
+        trace.add(span)
+
+
+@contextmanager
+def span(kind: str, name: str, model: str = None):
+    """LangChain 콜백이 닿지 않는 호출(Gemini SDK, 벡터 스토어 쓰기 등)을 감쌀 때 사용합니다.
+
+    with span("llm", "gemini") as s:
+        ...
+        s["prompt_tokens"] = 123
+    """
+    fields = {"prompt_tokens": 0, "completion_tokens": 0, "retries": 0}
+    start = time.perf_counter()
+    error = False
+    try:
+        yield fields
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record_span(kind, name, time.perf_counter() - start, model=model, error=error, **fields)
+
+
+# --- LangChain 콜백 ---
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """StateGraph 노드, LLM, 리트리버, 도구 실행을 구간으로 기록합니다."""
+
+    # 이벤트 루프 스레드에서 바로 실행해야 요청 추적 contextvar가 보입니다.
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chain_names: Dict[UUID, str] = {}
+        self._open: Dict[UUID, dict] = {}
+
+    def _begin(self, run_id: UUID, kind: str, name: str, model: str = None):
+        with self._lock:
+            self._open[run_id] = {"kind": kind, "name": name, "model": model, "start": time.perf_counter(), "retries": 0}
+
+    def _finish(self, run_id: UUID, error: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0, model: str = None):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return
+        record_span(
+            opened["kind"], opened["name"], time.perf_counter() - opened["start"],
+            model=model or opened["model"], prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            retries=opened["retries"], error=error,
+        )
+
+    # 그래프 노드
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       tags: Optional[List[str]] = None, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        tags = tags or []
+        with self._lock:
+            self._chain_names[run_id] = name
+            graph = self._chain_names.get(parent_run_id, "graph")
+        if "langsmith:hidden" not in tags and any(tag.startswith("graph:step:") for tag in tags):
+            self._begin(run_id, "node", f"{graph}/{name}")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._chain_names.pop(run_id, None)
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._chain_names.pop(run_id, None)
+        self._finish(run_id, error=True)
+
+    # LLM
+    @staticmethod
+    def _model_name(serialized: Dict[str, Any], kwargs: dict) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return params.get("model_name") or params.get("model") or (serialized or {}).get("kwargs", {}).get("model_name") or "llm"
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+        model = self._model_name(serialized, kwargs)
+        self._begin(run_id, "llm", model, model=model)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any):
+        model = self._model_name(serialized, kwargs)
+        self._begin(run_id, "llm", model, model=model)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._finish(
+            run_id,
+            prompt_tokens=usage.get("prompt_tokens", 0) or 0,
+            completion_tokens=usage.get("completion_tokens", 0) or 0,
+            model=(response.llm_output or {}).get("model_name"),
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, error=True)
+
+    # 벡터 검색 (리트리버)
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any):
+        self._begin(run_id, "vector_store", kwargs.get("name") or (serialized or {}).get("name") or "retriever")
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, error=True)
+
+    # 도구 (Tavily 등)
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        self._begin(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name") or "tool")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, error=True)
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            opened = self._open.get(run_id)
+            if opened is not None:
+                opened["retries"] += 1
+        if opened is not None:
+            RETRIES.labels(opened["kind"], opened["name"]).inc()
+
+
+telemetry_handler = TelemetryCallbackHandler()
+
+
+# --- 임베딩 ---
+class InstrumentedEmbeddings(Embeddings):
+    """실제 임베딩 공급자 호출만 구간으로 기록합니다. (캐시 적중은 기록되지 않도록 캐시 안쪽에 둡니다)"""
+
+    def __init__(self, underlying: Embeddings, model: str):
+        self.underlying = underlying
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding", self.model):
+            return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embedding", self.model):
+            return self.underlying.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding", self.model):
+            return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with span("embedding", self.model):
+            return await self.underlying.aembed_query(text)
+
+
+def metrics_payload():
+    """(본문, Content-Type) 을 반환합니다."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def log_trace(path: str, trace: RequestTrace):
+    breakdown = trace.breakdown()
+    top = sorted(breakdown.items(), key=lambda kv: -kv[1]["ms"])[:8]
+    logging.info(f"요청 시간 분해 {path}: " + ", ".join(f"{key}={item['ms']:.1f}ms(x{item['count']})" for key, item in top))
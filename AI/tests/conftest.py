@@ -0,0 +1,46 @@
+# 테스트 공통 설정
+# 외부 API 없이 가짜 공급자(fake_providers)와 프로세스 안의 스텁 검색 서버로 main 앱 전체를 돌립니다.
+# 가짜 공급자는 main 을 import 하기 전에 설치해야 하므로 이 파일을 읽을 때 한 번 설치합니다.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MOIT_WARMUP", "0")
+
+import benchmarks  # noqa: E402
+
+benchmarks.install_fake_providers(benchmarks.LatencyProfile())
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    import main
+    return main
+
+
+@pytest.fixture
+def use_llm():
+    """registry 의 LLM 을 주어진 설정의 가짜 모델로 바꿉니다. 테스트가 끝나면 기본 가짜 모델로 되돌립니다."""
+    from fake_providers import FakeChatModel
+    from resource_pool import registry
+
+    def configure(**kwargs):
+        kwargs.setdefault("responder", benchmarks.fake_responder)
+        registry.configure(llm_factory=lambda model: FakeChatModel(**kwargs))
+
+    yield configure
+    configure()
+
+
+@pytest.fixture
+def invoke(app_main):
+    """/agent/invoke 를 ASGI 로 직접 호출하는 코루틴 함수"""
+    import httpx
+
+    async def post(user_input: dict, headers: dict = None):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://test", timeout=60) as client:
+            return await client.post("/agent/invoke", json={"user_input": user_input}, headers=headers or {})
+    return post
@@ -0,0 +1,76 @@
+# /agent/invoke 동시 실행 테스트
+#   - 한 번 컴파일한 그래프를 동시 요청이 함께 써도 요청별 상태가 섞이지 않고, 요청마다 그래프를 다시 만들지 않는지
+#   - N개의 동시 요청이 가장 느린 단일 요청과 비슷한 시간 안에 끝나는지 (이벤트 루프를 막는 호출이 없는지)
+
+import re
+import json
+import time
+import asyncio
+
+import benchmarks
+
+TITLE_PATTERN = re.compile(r"- 제목: (.+)")
+QUERY_PATTERN = re.compile(r"\[사용자 입력 정보\]:\s*(.+?)\s*\[검색된 유사 모임 정보\]", re.S)
+
+
+def echo_responder(prompt: str) -> str:
+    """검색어는 제목 그대로, 추천 요약에는 검색어를 그대로 넣어 요청별 상태를 응답에서 확인할 수 있게 합니다."""
+    if match := TITLE_PATTERN.search(prompt):
+        return match.group(1).strip()
+    if match := QUERY_PATTERN.search(prompt):
+        query = match.group(1)
+        return json.dumps({"summary": f"{query} 모임은 어떠세요?",
+                           "recommendations": [{"meeting_id": query, "title": query}]}, ensure_ascii=False)
+    return benchmarks.fake_responder(prompt)
+
+
+def test_concurrent_requests_share_compiled_graph_without_mixing_state(app_main, use_llm, invoke, monkeypatch):
+    use_llm(responder=echo_responder, latency=0.05, jitter=0.03)
+    monkeypatch.setattr(app_main, "MEETING_MODE", "loop")
+    compiled = app_main.meeting_agent
+
+    def rebuild(*args, **kwargs):
+        raise AssertionError("요청 처리 중에 그래프를 다시 만들면 안 됩니다.")
+    monkeypatch.setattr(app_main, "build_meeting_matching_agent", rebuild)
+    monkeypatch.setattr(app_main, "build_fusion_meeting_matching_agent", rebuild)
+
+    titles = [f"보드게임 모임 {i}호" for i in range(12)]
+
+    async def run():
+        return await asyncio.gather(*(
+            invoke({"title": title, "description": "주말 오후 보드게임", "time": "토 14:00", "location": "서울"})
+            for title in titles
+        ))
+
+    responses = asyncio.run(run())
+    assert app_main.meeting_agent is compiled
+    for title, response in zip(titles, responses):
+        assert response.status_code == 200
+        answer = json.loads(response.json()["final_answer"])
+        assert answer["recommendations"] == [{"meeting_id": title, "title": title}]
+        assert all(other not in answer["summary"] for other in titles if other != title)
+
+
+def test_parallel_requests_finish_near_slowest_single_request(app_main, use_llm, invoke, monkeypatch):
+    from fake_providers import FakeGenerativeModel
+
+    use_llm(latency=0.2)
+    monkeypatch.setattr(FakeGenerativeModel, "latency", 0.6)
+    monkeypatch.setattr(app_main, "HOBBY_CACHE_ENABLED", False)
+    payloads = [benchmarks.SAMPLE_PAYLOADS[route] for route in ("meeting_matching", "hobby_recommendation")]
+
+    async def timed(payload):
+        start = time.perf_counter()
+        response = await invoke(payload)
+        assert response.status_code == 200
+        return time.perf_counter() - start
+
+    async def run():
+        slowest = max([await timed(payload) for payload in payloads])
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(payloads[i % 2]) for i in range(8)))
+        return slowest, time.perf_counter() - start
+
+    slowest, elapsed = asyncio.run(run())
+    # 직렬로 처리되면 약 4 * (모임 + 취미) 초가 걸립니다.
+    assert elapsed <= slowest * 1.5, f"동시 요청 8개 {elapsed:.2f}s, 가장 느린 단일 요청 {slowest:.2f}s"
@@ -0,0 +1,80 @@
+# 임베딩 2단 캐시 테스트
+#   - 비동기 경로에서 SQLite 읽기/쓰기가 이벤트 루프가 아닌 run_blocking 으로 넘어가는지
+#   - 디스크 계층이 행 수 상한을 넘으면 먼저 저장된 행부터 지우는지
+
+import os
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import BASE_DIR, CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_async_path_runs_sqlite_off_the_event_loop(tmp_path):
+    disk_threads = []
+
+    async def run_blocking(fn, *args):
+        def run():
+            disk_threads.append(threading.get_ident())
+            return fn(*args)
+        return await asyncio.to_thread(run)
+
+    underlying = CountingEmbeddings()
+    cache = CachedEmbeddings(underlying, model="m", db_path=str(tmp_path / "cache.sqlite3"), run_blocking=run_blocking)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        first = await cache.aembed_query("볼링")
+        # 메모리 계층 적중은 스레드 풀을 거치지 않습니다.
+        calls = len(disk_threads)
+        assert await cache.aembed_query("볼링") == first
+        assert len(disk_threads) == calls
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert disk_threads and loop_thread not in disk_threads
+    assert underlying.calls == ["볼링"]
+    cache.close()
+
+
+def test_disk_tier_evicts_oldest_rows_over_the_cap(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = CachedEmbeddings(CountingEmbeddings(), model="m", db_path=path, max_disk_entries=3)
+    cache.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+    assert cache.cache_stats()["disk_entries"] == 3
+    assert cache.cache_stats()["disk_evictions"] == 2
+    cache.close()
+
+    underlying = CountingEmbeddings()
+    reopened = CachedEmbeddings(underlying, model="m", db_path=path, max_disk_entries=3)
+    reopened.embed_documents(["a", "ccc", "eeeee"])
+    assert underlying.calls == ["a"]
+    reopened.close()
+
+
+def test_relative_path_is_resolved_against_the_module_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    name = "test_relative_embedding_cache.sqlite3"
+    cache = CachedEmbeddings(CountingEmbeddings(), model="m", db_path=name)
+    try:
+        assert cache.db_path == os.path.join(BASE_DIR, name)
+        assert os.path.exists(os.path.join(BASE_DIR, name))
+        assert not os.path.exists(tmp_path / name)
+    finally:
+        cache.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(os.path.join(BASE_DIR, name + suffix)):
+                os.remove(os.path.join(BASE_DIR, name + suffix))
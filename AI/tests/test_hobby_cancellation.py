@@ -0,0 +1,96 @@
+# 마감/연결 끊김으로 취소된 취미 추천 요청 테스트
+#   - 같은 키를 기다리던 요청이 모두 떠나면 공유 계산도 취소되는지
+#   - 스레드 풀에서 이미 돌고 있는 Gemini 호출이 끝날 때까지 취미 추천 자리를 반납하지 않는지
+#   - 백그라운드 취미 추천 작업은 대기열이 가득 차도 거절되지 않고 자리를 기다리는지
+
+import time
+import asyncio
+
+import benchmarks
+from ttl_cache import AsyncTTLCache
+
+
+def test_shared_compute_survives_one_waiter_and_is_cancelled_with_the_last():
+    cache = AsyncTTLCache("test", ttl=60, max_entries=8)
+    started, cancelled = [], []
+
+    async def compute():
+        started.append(1)
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "추천"
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute("a", compute))
+        second = asyncio.ensure_future(cache.get_or_compute("a", compute))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        assert await second == ("추천", "coalesced")
+
+        third = asyncio.ensure_future(cache.get_or_compute("b", compute))
+        fourth = asyncio.ensure_future(cache.get_or_compute("b", compute))
+        await asyncio.sleep(0.05)
+        third.cancel()
+        fourth.cancel()
+        await asyncio.sleep(0.01)
+        assert len(cancelled) == 1
+        assert cache.snapshot()["inflight"] == 0
+
+    asyncio.run(run())
+    assert len(started) == 2
+    assert cache.get("b") is None
+
+
+def test_timed_out_hobby_requests_hold_slot_until_gemini_finishes(app_main, invoke, monkeypatch):
+    from fake_providers import FakeGenerativeModel
+
+    monkeypatch.setattr(FakeGenerativeModel, "latency", 1.5)
+    monkeypatch.setattr(FakeGenerativeModel, "jitter", 0.0)
+    payload = benchmarks.SAMPLE_PAYLOADS["hobby_recommendation"]
+    hobby_slots = lambda: app_main.admission.snapshot()["routes"]["hobby_recommendation"]["active"]
+
+    async def run():
+        # 같은 설문이 두 번 들어와 Gemini 호출 하나를 함께 기다리다가 둘 다 마감으로 끝납니다.
+        responses = await asyncio.gather(*(invoke(payload, headers={"X-MOIT-Deadline-Ms": "1000"}) for _ in range(2)))
+        assert all(response.status_code != 200 for response in responses)
+        assert app_main.hobby_result_cache.snapshot()["inflight"] == 0
+        # 마감은 지났지만 Gemini 호출은 아직 스레드 풀에서 돌고 있으므로 자리 하나를 계속 차지합니다.
+        assert hobby_slots() == 1
+        deadline = time.monotonic() + 5
+        while hobby_slots() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        assert hobby_slots() == 0
+
+    asyncio.run(run())
+
+
+def test_background_jobs_wait_instead_of_being_rejected_when_queue_is_full():
+    from admission import AdmissionController, AdmissionRejected
+
+    controller = AdmissionController(policies={"hobby_recommendation": (2, 1, 120.0)}, capacity=4, max_queue=1)
+
+    async def run():
+        await controller.acquire("hobby_recommendation")
+        interactive = asyncio.ensure_future(controller.acquire("hobby_recommendation"))
+        await asyncio.sleep(0)
+        # 대화형 요청은 대기열 상한에 걸립니다.
+        try:
+            await controller.acquire("hobby_recommendation")
+        except AdmissionRejected as e:
+            assert e.reason == "queue_full"
+        else:
+            raise AssertionError("대기열이 가득 찼으면 거절해야 합니다.")
+        # 백그라운드 작업은 거절되지 않고 차례를 기다립니다.
+        job = asyncio.ensure_future(controller.acquire("hobby_recommendation", queue_limit=False))
+        await asyncio.sleep(0)
+        assert not job.done()
+        controller.release("hobby_recommendation")
+        await interactive
+        controller.release("hobby_recommendation")
+        await asyncio.wait_for(job, timeout=1)
+        controller.release("hobby_recommendation")
+
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+# 사진 전처리 테스트: 출력 형식별 MIME 타입, EXIF 회전 보정
+
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from image_pipeline import EXIF_ORIENTATION, ImagePreprocessor
+
+
+def write_jpeg(path, size, orientation=None, quality=30):
+    # 잡음 이미지는 높은 품질로 재인코딩하면 원본보다 커져, "작은 JPEG 는 원본 그대로" 경로를 탑니다.
+    rng = random.Random(7)
+    image = Image.frombytes("RGB", size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * 3)))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    image.save(path, format="JPEG", quality=quality, exif=exif.tobytes())
+    return str(path)
+
+
+@pytest.mark.parametrize("output_format, mime_type, pil_format", [
+    ("JPEG", "image/jpeg", "JPEG"), ("webp", "image/webp", "WEBP"), ("PNG", "image/png", "PNG"),
+])
+def test_mime_type_matches_output_format(tmp_path, output_format, mime_type, pil_format):
+    preprocessor = ImagePreprocessor(output_format=output_format, workers=1)
+    item = preprocessor.preprocess(write_jpeg(tmp_path / "photo.jpg", (64, 32)))
+    assert item.mime_type == mime_type
+    with Image.open(io.BytesIO(item.data)) as decoded:
+        assert decoded.format == pil_format
+
+
+def test_unsupported_output_format_is_rejected():
+    with pytest.raises(ValueError):
+        ImagePreprocessor(output_format="GIF", workers=1)
+
+
+def test_small_jpeg_is_rotated_when_oriented(tmp_path):
+    preprocessor = ImagePreprocessor(output_format="JPEG", quality=95, workers=1)
+    upright_path = write_jpeg(tmp_path / "upright.jpg", (64, 32))
+    with open(upright_path, "rb") as f:
+        assert preprocessor.preprocess(upright_path).data == f.read()
+
+    # 90도 회전(6) 태그가 붙은 작은 JPEG 는 원본 바이트 대신 회전 보정한 결과를 보냅니다.
+    item = preprocessor.preprocess(write_jpeg(tmp_path / "rotated.jpg", (64, 32), orientation=6))
+    with Image.open(io.BytesIO(item.data)) as decoded:
+        assert decoded.size == (32, 64)
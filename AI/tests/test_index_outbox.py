@@ -0,0 +1,43 @@
+# 인덱스 변경 대기열(write-behind) 테스트
+#   - /meetings/bulk_add 가 대기열을 거쳐, 먼저 쌓여 있던 같은 모임의 오래된 변경이 새 내용을 덮어쓰지 않는지
+#   - discard() 가 대기 중인 변경을 버리는지 (백필처럼 인덱스에 바로 쓰기 전에)
+
+import asyncio
+
+import httpx
+
+from index_outbox import IndexOutbox, list_index_records
+
+
+def meeting(meeting_id: str, title: str) -> dict:
+    return {"meeting_id": meeting_id, "title": title, "description": "주말 오후 보드게임", "time": "토 14:00",
+            "location": "서울", "category": "", "max_members": None, "current_members": None}
+
+
+def test_bulk_add_goes_through_outbox_and_wins_over_older_pending_upsert(app_main, tmp_path, monkeypatch):
+    vector_store = app_main.registry.get_vector_store(app_main.get_meeting_index_name())
+    outbox = IndexOutbox(lambda: vector_store, path=str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(app_main, "index_outbox", outbox)
+    outbox.enqueue_upsert(meeting("bulk-1", "예전 제목"))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://test") as client:
+            response = await client.post("/meetings/bulk_add", json={"meetings": [meeting("bulk-1", "새 제목"), meeting("bulk-2", "등산")]})
+        assert response.json() == {"status": "queued", "queued": 2}
+        await outbox.flush()
+
+    asyncio.run(run())
+    records = list_index_records(vector_store)
+    assert records["bulk-1"]["title"] == "새 제목"
+    assert "bulk-2" in records
+    assert outbox.pending_count() == 0
+    outbox.close()
+
+
+def test_discard_drops_pending_mutations(tmp_path):
+    outbox = IndexOutbox(lambda: None, path=str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue_delete("a")
+    outbox.enqueue_upserts([meeting("b", "볼링"), meeting("c", "독서")])
+    assert outbox.discard(["a", "b"]) == 2
+    assert outbox.pending_count() == 1
+    outbox.close()
@@ -0,0 +1,70 @@
+# 비동기 작업 큐 테스트
+#   - 일시적 오류로 실패한 작업은 max_attempts 까지 다시 큐에 넣고, 영구 오류는 바로 실패 처리하는지
+#   - 취미 추천 작업이 다시 실행되어도 ai_hobby_recommendations 에 같은 추천을 두 번 저장하지 않는지
+
+import time
+import asyncio
+
+import benchmarks
+from job_queue import JobRunner, JobStore
+
+
+def run_jobs(store: JobStore, handler, job_count: int = 1, timeout: float = 5.0):
+    async def run():
+        runner = JobRunner(store, {"test": handler}, concurrency=1, max_attempts=3)
+        runner.retry_base = 0.01
+        runner.start()
+        job_ids = [runner.submit("test", {"n": i}) for i in range(job_count)]
+        deadline = time.monotonic() + timeout
+        while any(store.get(job_id)["status"] in ("queued", "running") for job_id in job_ids) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        return [store.get(job_id) for job_id in job_ids]
+    return asyncio.run(run())
+
+
+def test_transient_error_is_retried_until_success(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    calls = []
+
+    async def handler(payload, job):
+        calls.append(job["attempts"])
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return {"ok": True}
+
+    [job] = run_jobs(store, handler)
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+    assert job["result"] == {"ok": True}
+
+
+def test_permanent_error_and_exhausted_retries_fail(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+
+    async def handler(payload, job):
+        if payload["n"] == 0:
+            raise ValueError("잘못된 설문")
+        raise TimeoutError("upstream timeout")
+
+    permanent, transient = run_jobs(store, handler, job_count=2)
+    assert (permanent["status"], permanent["attempts"]) == ("failed", 1)
+    assert (transient["status"], transient["attempts"]) == ("failed", 3)
+    assert transient["error"] == "upstream timeout"
+
+
+def test_rerun_hobby_job_does_not_insert_duplicate_recommendation(app_main, tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(app_main, "job_runner", JobRunner(store, {}))
+    inserted = []
+    monkeypatch.setattr(app_main, "save_hobby_recommendation",
+                        lambda user_id, text: inserted.append((user_id, text)) or len(inserted))
+    payload = {"user_input": benchmarks.SAMPLE_PAYLOADS["hobby_recommendation"], "save_to_db": True}
+    job_id = store.create("hobby_recommendation", payload, user_id="u1")
+
+    first = asyncio.run(app_main.run_hobby_recommendation_job(payload, store.get(job_id)))
+    # mark_succeeded 전에 서버가 죽어 같은 작업이 다시 실행된 경우
+    second = asyncio.run(app_main.run_hobby_recommendation_job(payload, store.get(job_id)))
+
+    assert len(inserted) == 1
+    assert first == second == {"recommendation": inserted[0][1], "recommendation_id": 1}
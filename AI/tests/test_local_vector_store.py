@@ -0,0 +1,36 @@
+# 로컬 벡터 인덱스 스냅샷 테스트
+#   - 변경마다 전체 스냅샷을 다시 쓰지 않고 flush_interval 동안 모아서 한 번 기록하는지
+#   - close() 가 남은 변경을 기록해 다시 읽었을 때 그대로 있는지
+
+import time
+
+from fake_providers import FakeEmbeddings
+from local_vector_store import LocalVectorStore
+
+
+def test_snapshot_is_debounced_and_flushed_on_close(tmp_path, monkeypatch):
+    store = LocalVectorStore(FakeEmbeddings(), path=str(tmp_path), flush_interval=60)
+    saves = []
+    original_save = store.save
+    monkeypatch.setattr(store, "save", lambda: (saves.append(1), original_save()))
+
+    for i in range(20):
+        store.add_texts([f"보드게임 모임 {i}"], ids=[str(i)])
+    store.delete(["3"])
+    assert saves == []
+    assert not (tmp_path / "vectors.npy").exists()
+
+    store.close()
+    assert saves == [1]
+    reloaded = LocalVectorStore.load(str(tmp_path), FakeEmbeddings())
+    assert len(reloaded) == 19
+    assert "3" not in reloaded.all_ids()
+
+
+def test_scheduled_flush_writes_in_background(tmp_path):
+    store = LocalVectorStore(FakeEmbeddings(), path=str(tmp_path), flush_interval=0.05)
+    store.add_texts(["등산 모임"], ids=["a"])
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "records.json").exists() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert LocalVectorStore.load(str(tmp_path), FakeEmbeddings()).all_ids() == ["a"]
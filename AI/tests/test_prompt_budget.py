@@ -0,0 +1,29 @@
+# 취미 추천 프롬프트 토큰 예산 테스트
+#   - 프로필 설명이 예산을 넘어 잘려도 사용자의 금지 규칙(Hard Constraints)은 그대로 남는지
+
+import prompt_budget
+
+
+def test_hard_constraints_survive_when_profile_is_truncated(app_main, monkeypatch):
+    monkeypatch.setitem(prompt_budget.PROMPT_BUDGETS, "hobby_profile", 30)
+    profile = {
+        "FSC": {"time_availability": 0.2, "financial_budget": 0.3, "energy_level": 0.4, "mobility": 0.5,
+                "preferred_space": "실내 " * 100},
+        "MP": {"core_motivation": "스트레스 해소"},
+        "IP": {"nature_interest": 0.1, "craft_interest": 0.9, "intellect_interest": 0.9, "art_interest": 0.9,
+               "activity_interest": 0.1},
+    }
+
+    prompt = app_main.generate_prompt(profile)
+
+    assert prompt.startswith(app_main.HOBBY_PROMPT_PREFIX)
+    assert prompt_budget.ELLIPSIS in prompt
+    assert "금지 규칙 (Hard Constraints)" in prompt
+    assert "'자연' 관련 활동" in prompt
+    assert "'신체 활동' 관련 활동" in prompt
+    assert "'예술' 관련 활동" not in prompt
+
+
+def test_untruncated_profile_keeps_constraints_after_profile():
+    prompt = prompt_budget.fit_profile("고정 지시문\n", "프로필\n", "\n# 금지 규칙\n- 등산 금지\n")
+    assert prompt == "고정 지시문\n프로필\n\n# 금지 규칙\n- 등산 금지\n"
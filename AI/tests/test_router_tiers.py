@@ -0,0 +1,44 @@
+# 단계형 라우터 테스트: 중심점 분류기는 자유 텍스트를 general_search 로만 확정하고, 나머지는 LLM 라우터로 넘깁니다.
+
+import asyncio
+
+import pytest
+
+from router_tiers import CentroidClassifier, TieredRouter
+
+
+class FixedClassifier(CentroidClassifier):
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+
+    async def classify(self, text, embeddings):
+        return self.label, 0.9
+
+
+class RecordingChain:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        return "general_search"
+
+
+@pytest.mark.parametrize("label, expected_tier", [
+    ("general_search", "centroid"),
+    ("meeting_matching", "llm"),
+    ("hobby_recommendation", "llm"),
+])
+def test_centroid_only_decides_general_search_for_free_text(label, expected_tier):
+    chain = RecordingChain()
+    router = TieredRouter(chain, lambda: None, FixedClassifier(label))
+    route, tier = asyncio.run(router.route({"messages": [["user", "보드게임 같이 할 멤버 모집합니다"]]}))
+    assert (route, tier) == ("general_search", expected_tier)
+    assert chain.calls == (1 if expected_tier == "llm" else 0)
+
+
+def test_structured_payloads_use_rule_tier():
+    router = TieredRouter(RecordingChain(), lambda: None, FixedClassifier("general_search"))
+    assert asyncio.run(router.route({"title": "축구", "description": "주말 풋살"})) == ("meeting_matching", "rule")
+    assert asyncio.run(router.route({"survey": {"1": 3}})) == ("hobby_recommendation", "rule")
@@ -0,0 +1,103 @@
+# 토큰이 /agent/stream 으로 바로 나가는 LLM 호출이 헤지/재시도로 조각을 중복해 내보내지 않는지 확인합니다.
+
+import asyncio
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from provider_guard import provider_guards, StreamInterruptedError
+from resource_pool import LazyRunnable, STREAM_TOKENS_TAG
+
+
+class FlakyStreamingModel(BaseChatModel):
+    """delay 초 뒤 토큰을 내보내다가 fail_after 개째에서 일시적 오류로 끊기는 호출을 failures 번 반복하는 채팅 모델"""
+
+    tokens: list = ["안녕", "하세요"]
+    fail_after: int = 1
+    failures: int = 1
+    calls: int = 0
+    delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky-streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("connection reset")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        for index, token in enumerate(self.tokens):
+            if index == self.fail_after and self.calls <= self.failures:
+                raise ConnectionError("stream reset")
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def stream_tokens(model: FlakyStreamingModel, provider: str):
+    """에이전트처럼 체인 안에서 ainvoke 한 LLM 을 astream_events 로 돌려 클라이언트로 나갔을 토큰과 예외를 돌려줍니다."""
+    llm = LazyRunnable(lambda: model, "llm", provider=provider).with_config(tags=[STREAM_TOKENS_TAG])
+
+    async def agent(question):
+        return await llm.ainvoke(question)
+
+    sent = []
+
+    async def run():
+        async for event in RunnableLambda(agent).astream_events("질문", version="v1"):
+            if event["event"] == "on_chat_model_stream":
+                sent.append(event["data"]["chunk"].content)
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        return sent, e
+    return sent, None
+
+
+def test_failure_after_first_token_is_not_retried():
+    model = FlakyStreamingModel(fail_after=1, failures=1)
+    sent, error = stream_tokens(model, "streamed-llm-after-token")
+
+    assert isinstance(error, StreamInterruptedError)
+    assert sent == ["안녕"]
+    assert model.calls == 1
+
+
+def test_failure_before_first_token_is_retried():
+    model = FlakyStreamingModel(fail_after=0, failures=1)
+    sent, error = stream_tokens(model, "streamed-llm-before-token")
+
+    assert error is None
+    assert sent == ["안녕", "하세요"]
+    assert model.calls == 2
+
+
+def test_streamed_call_is_not_hedged():
+    guard = provider_guards.get("streamed-llm-hedge")
+    for _ in range(guard.hedge_min_samples):
+        guard.record_success(0.001)
+    model = FlakyStreamingModel(failures=0, delay=0.2)
+    sent, error = stream_tokens(model, "streamed-llm-hedge")
+
+    assert error is None
+    assert model.calls == 1
+    assert guard.counts["hedges"] == 0
+
+
+@pytest.mark.parametrize("tags", [[], [STREAM_TOKENS_TAG]])
+def test_invoke_without_tokens_sent_is_retried(tags):
+    model = FlakyStreamingModel(failures=1)
+    llm = LazyRunnable(lambda: model, "llm", provider=f"plain-llm-{len(tags)}").with_config(tags=tags)
+
+    assert asyncio.run(llm.ainvoke("질문")).content == "안녕하세요"
+    assert model.calls == 2
@@ -0,0 +1,58 @@
+# 범용 검색 경로를 스텁 검색 서버(fake_providers.create_stub_search_app)에 붙여 /agent/invoke 끝까지 돌리는 테스트
+#   - 가짜 LLM 이 web_search 도구를 호출하면 실제 TavilyClient 코드가 스텁 서버로 요청을 보냅니다.
+#   - 같은 질문을 다시 보내면 웹 검색 캐시에서 답하고 스텁 서버에는 요청이 가지 않아야 합니다.
+#   - web_search 도구를 동기 invoke 해도 같은 캐시 키와 같은 스텁 서버로 검색합니다.
+
+import re
+import asyncio
+
+import benchmarks
+import web_search
+
+RESULT_PATTERN = re.compile(r"'[^']*' 에 대한 검색 결과 1")
+
+
+def answer_from_tool_results(prompt: str) -> str:
+    """도구 결과가 프롬프트에 있으면 그 첫 결과를 그대로 답합니다."""
+    if match := RESULT_PATTERN.search(prompt):
+        return f"검색해 보니 {match.group(0)} 입니다."
+    return benchmarks.fake_responder(prompt)
+
+
+async def stub_stats() -> dict:
+    response = await web_search.search_client._client().get(f"{web_search.search_client.api_url}/stats")
+    return response.json()
+
+
+def test_general_search_answers_from_stub_search_server_and_caches(app_main, use_llm, invoke):
+    use_llm(responder=answer_from_tool_results, call_tools=True, tool_calls_per_turn=1)
+    question = "오늘 서울 날씨 어때? (stub-test)"
+
+    async def run():
+        before = (await stub_stats())["queries"].get(question, 0)
+        first = await invoke({"messages": [["user", question]]})
+        after_first = (await stub_stats())["queries"].get(question, 0)
+        second = await invoke({"messages": [["user", question]]})
+        after_second = (await stub_stats())["queries"].get(question, 0)
+        return first, second, after_first - before, after_second - after_first
+
+    first, second, first_requests, second_requests = asyncio.run(run())
+    assert first.status_code == 200
+    assert first.json()["final_answer"] == f"검색해 보니 '{question}' 에 대한 검색 결과 1 입니다."
+    assert second.json()["final_answer"] == first.json()["final_answer"]
+    assert (first_requests, second_requests) == (1, 0)
+
+
+def test_sync_invoke_uses_same_client_settings_and_cache_key():
+    tool = web_search.build_web_search_tool()
+    question = "부산 맛집 추천 (sync-stub-test)"
+    stats = lambda: web_search.search_client._sync_client().get(f"{web_search.search_client.api_url}/stats").json()
+
+    before = stats()["queries"].get(question, 0)
+    first = tool.invoke({"query": question})
+    after_first = stats()["queries"].get(question, 0)
+    assert first[0]["content"] == f"'{question}' 에 대한 검색 결과 1"
+    assert tool.invoke({"query": question}) == first
+    # 비동기 경로도 같은 캐시 키로 찾으므로 스텁 서버에 다시 묻지 않습니다.
+    assert asyncio.run(tool.ainvoke({"query": question})) == first
+    assert (after_first - before, stats()["queries"][question] - after_first) == (1, 0)
@@ -0,0 +1,147 @@
+# tool_engine.py
+# 도구 호출(tool calling) 에이전트를 한 번의 루프로 실행하는 엔진 (AgentExecutor 대체)
+#   - 한 턴에 모델이 여러 도구를 호출하면 서로 독립이므로 동시에 실행합니다. (예: 날씨 웹 검색 + 내부 모임 검색)
+#   - 도구별 제한 시간, 요청당 도구 호출 총량, 반복 횟수, 전체 시간 예산을 강제합니다. (요청 마감이 더 가까우면 그쪽을 따릅니다)
+#   - 도구가 제한 시간을 넘기거나 예산이 바닥나면, 그때까지 모은 정보로 부분 답변을 만들어 반환합니다.
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List
+
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+FINALIZE_NOTE = "도구 사용 한도에 도달했습니다. 더 이상 도구를 호출하지 말고, 지금까지 얻은 정보만으로 답변하세요. 확인하지 못한 정보가 있다면 그 사실을 짧게 알려주세요."
+
+
+class ToolEngineStats:
+    """엔진 실행 통계 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"runs": 0, "tool_calls": 0, "parallel_steps": 0, "timeouts": 0, "errors": 0,
+                       "budget_exhausted": 0, "iteration_capped": 0, "partial_answers": 0}
+        self.tool_seconds_saved = 0.0
+
+    def add(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                if key == "tool_seconds_saved":
+                    self.tool_seconds_saved += value
+                else:
+                    self.counts[key] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.counts, "tool_seconds_saved": round(self.tool_seconds_saved, 3)}
+
+
+class ParallelToolAgent:
+    """prompt -> (모델 -> 도구 동시 실행) 반복 -> 최종 답변
+
+    prompt 는 {input}, {chat_history}, {agent_scratchpad} 자리를 가진 ChatPromptTemplate 입니다.
+    반환값은 AgentExecutor 와 같은 "output" 키에 더해 intermediate_steps(도구, 인자, 상태)와 partial(부분 답변 여부)을 담습니다.
+    """
+
+    def __init__(self, llm, tools: list, prompt, tool_timeouts: Dict[str, float] = None, default_timeout: float = None,
+                 max_tool_calls: int = None, max_iterations: int = None, deadline: float = None, parallel: bool = True):
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+        self.llm_with_tools = llm.bind(tools=[convert_to_openai_tool(tool) for tool in tools])
+        self.prompt = prompt
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_timeout = default_timeout or float(os.getenv("MOIT_TOOL_TIMEOUT", "8"))
+        self.max_tool_calls = max_tool_calls or int(os.getenv("MOIT_TOOL_BUDGET", "6"))
+        self.max_iterations = max_iterations or int(os.getenv("MOIT_AGENT_MAX_ITERATIONS", "4"))
+        self.deadline = deadline or float(os.getenv("MOIT_AGENT_DEADLINE", "30"))
+        self.parallel = parallel
+        self.stats = ToolEngineStats()
+
+    def timeout_for(self, name: str) -> float:
+        return self.tool_timeouts.get(name, self.default_timeout)
+
+    async def ainvoke(self, inputs: dict, deadline: float = None) -> dict:
+        """deadline(초)을 주면 이번 실행의 시간 예산을 그만큼으로 줄입니다. (요청 마감에서 답변 정리 시간을 뺀 값)"""
+        start = time.perf_counter()
+        budget = self.deadline if deadline is None else max(min(self.deadline, deadline), 0.0)
+        messages = self.prompt.format_messages(agent_scratchpad=[], **{"chat_history": [], **inputs})
+        steps, calls_used, partial = [], 0, False
+        self.stats.add(runs=1)
+
+        for _ in range(self.max_iterations):
+            remaining = budget - (time.perf_counter() - start)
+            if calls_used >= self.max_tool_calls or remaining <= 0:
+                self.stats.add(budget_exhausted=1)
+                break
+            response = await self.llm_with_tools.ainvoke(messages)
+            tool_calls = extract_tool_calls(response)
+            if not tool_calls:
+                return self._result(response.content, steps, partial)
+
+            messages.append(response)
+            allowed = tool_calls[:self.max_tool_calls - calls_used]
+            calls_used += len(allowed)
+            outcomes = await self._run_tools(allowed, budget - (time.perf_counter() - start))
+            # 한도를 넘어 실행하지 않은 호출에도 응답 메시지를 붙여야 다음 모델 호출이 유효합니다.
+            for call in tool_calls[len(allowed):]:
+                outcomes.append((call, "오류: 도구 호출 한도를 넘어 실행하지 않았습니다.", "skipped", 0.0))
+            for call, content, status, _ in outcomes:
+                partial = partial or status != "ok"
+                messages.append(ToolMessage(content=content, tool_call_id=call["id"]))
+                steps.append({"tool": call["name"], "args": call["args"], "status": status})
+        else:
+            self.stats.add(iteration_capped=1)
+
+        # 반복/예산 한도에 걸린 경우: 도구 없이 지금까지의 정보로 답변을 마무리합니다.
+        partial = True
+        response = await self.llm.ainvoke(messages + [SystemMessage(content=FINALIZE_NOTE)])
+        return self._result(response.content, steps, partial)
+
+    def _result(self, output: str, steps: list, partial: bool) -> dict:
+        if partial:
+            self.stats.add(partial_answers=1)
+        return {"output": output, "intermediate_steps": steps, "partial": partial}
+
+    async def _run_tools(self, calls: List[dict], remaining: float) -> list:
+        """도구 호출들을 (동시에) 실행하고 (호출, 결과 문자열, 상태, 소요 시간) 목록을 호출 순서대로 반환합니다."""
+        if self.parallel and len(calls) > 1:
+            start = time.perf_counter()
+            outcomes = list(await asyncio.gather(*(self._run_tool(call, remaining) for call in calls)))
+            wall = time.perf_counter() - start
+            self.stats.add(parallel_steps=1, tool_seconds_saved=max(sum(o[3] for o in outcomes) - wall, 0.0))
+            logging.info(f"--- 도구 {len(calls)}개 동시 실행: {[call['name'] for call in calls]} ({wall:.2f}s) ---")
+            return outcomes
+        return [await self._run_tool(call, remaining) for call in calls]
+
+    async def _run_tool(self, call: dict, remaining: float):
+        name = call["name"]
+        start = time.perf_counter()
+        self.stats.add(tool_calls=1)
+        tool = self.tools.get(name)
+        if tool is None:
+            return call, f"오류: '{name}' 이라는 도구는 없습니다.", "error", 0.0
+        timeout = max(min(self.timeout_for(name), remaining), 0.0)
+        try:
+            result = await asyncio.wait_for(tool.ainvoke(call["args"]), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats.add(timeouts=1)
+            logging.warning(f"도구 제한 시간 초과: {name} ({timeout:.1f}s)")
+            return call, f"오류: '{name}' 도구가 {timeout:.1f}초 안에 응답하지 않았습니다. 이 정보 없이 답변하세요.", "timeout", time.perf_counter() - start
+        except Exception as e:
+            self.stats.add(errors=1)
+            logging.error(f"도구 실행 실패: {name}: {e}")
+            return call, f"오류: '{name}' 도구 실행에 실패했습니다. {e}", "error", time.perf_counter() - start
+        content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+        return call, content, "ok", time.perf_counter() - start
+
+
+def extract_tool_calls(message) -> List[dict]:
+    """AIMessage 에서 [{"id", "name", "args"}] 를 꺼냅니다."""
+    if not isinstance(message, AIMessage):
+        return []
+    return [{"id": call.get("id") or f"call_{i}", "name": call["name"], "args": call.get("args") or {}}
+            for i, call in enumerate(message.tool_calls or [])]
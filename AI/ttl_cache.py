@@ -0,0 +1,164 @@
+# ttl_cache.py
+# 비동기 결과 캐시 (TTL + 크기 제한 LRU + single-flight + stale-while-revalidate)
+#   - 같은 키의 요청이 동시에 들어오면 계산은 한 번만 하고 결과를 나눠 받습니다.
+#   - 계산은 별도 태스크로 돌리므로, 먼저 요청한 쪽이 취소되어도 나머지 요청은 결과를 받습니다.
+#       기다리는 요청이 모두 떠나면 계산 태스크도 취소합니다. (백그라운드 갱신은 기다리는 요청이 없으므로 제외)
+#   - stale_ttl 을 주면 TTL 이 지난 뒤에도 그 시간 동안은 이전 값을 바로 돌려주고, 백그라운드에서 새 값으로 갱신합니다.
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+
+class AsyncTTLCache:
+    """키별 결과를 ttl초 동안 보관하고, 최대 max_entries개를 넘으면 오래 안 쓴 항목부터 버립니다."""
+
+    def __init__(self, name: str, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (신선 만료 시각, 최종 만료 시각, 값)
+        self._inflight = {}  # key -> asyncio.Task
+        self._waiters = {}  # asyncio.Task -> 그 계산을 기다리는 요청 수
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0, "uncached": 0,
+                      "stale_served": 0, "revalidation_errors": 0}
+
+    def _lookup(self, key: str):
+        """('fresh' | 'stale' | None, 값) 을 반환합니다. 최종 만료된 항목은 지웁니다."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            fresh_until, stale_until, value = entry
+            now = self.clock()
+            if stale_until <= now:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None, None
+            self._entries.move_to_end(key)
+            return ("fresh" if fresh_until > now else "stale"), value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        state, value = self._lookup(key)
+        return value if state == "fresh" else default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: float = 0.0):
+        with self._lock:
+            fresh_until = self.clock() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (fresh_until, fresh_until + stale_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             should_cache: Optional[Callable[[Any], bool]] = None,
+                             ttl: Optional[float] = None, stale_ttl: float = 0.0):
+        """(값, 상태) 를 반환합니다. 상태는 'hit' / 'stale' / 'coalesced' / 'miss' 중 하나입니다.
+
+        ttl / stale_ttl 로 항목별 보관 시간을 정할 수 있습니다. 'stale' 이면 이전 값을 바로 돌려주고 갱신은 백그라운드에서 합니다.
+        """
+        state, value = self._lookup(key)
+        if state == "fresh":
+            with self._lock:
+                self.stats["hits"] += 1
+            return value, "hit"
+        if state == "stale":
+            with self._lock:
+                self.stats["stale_served"] += 1
+            if key not in self._inflight:
+                task = self._start(key, compute, should_cache, ttl, stale_ttl)
+                task.add_done_callback(self._log_revalidation_error)
+            return value, "stale"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            with self._lock:
+                self.stats["coalesced"] += 1
+            return await self._wait(task), "coalesced"
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return await self._wait(self._start(key, compute, should_cache, ttl, stale_ttl)), "miss"
+
+    def get_or_compute_blocking(self, key: str, compute: Callable[[], Any],
+                                should_cache: Optional[Callable[[Any], bool]] = None,
+                                ttl: Optional[float] = None, stale_ttl: float = 0.0):
+        """get_or_compute 의 동기 버전. 이벤트 루프가 없으므로 single-flight 와 백그라운드 갱신 없이 stale 값은 그대로 돌려줍니다."""
+        state, value = self._lookup(key)
+        if state is not None:
+            with self._lock:
+                self.stats["hits" if state == "fresh" else "stale_served"] += 1
+            return value, ("hit" if state == "fresh" else "stale")
+        with self._lock:
+            self.stats["misses"] += 1
+        result = compute()
+        if should_cache is None or should_cache(result):
+            self.set(key, result, ttl=ttl, stale_ttl=stale_ttl)
+        else:
+            with self._lock:
+                self.stats["uncached"] += 1
+        return result, "miss"
+
+    async def _wait(self, task: asyncio.Future) -> Any:
+        """공유 계산을 기다립니다. 이 요청이 취소되어도 계산은 계속되지만, 마지막 요청까지 떠나면 계산을 취소합니다."""
+        with self._lock:
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            with self._lock:
+                self._waiters[task] -= 1
+                abandoned = self._waiters[task] == 0
+                if abandoned:
+                    del self._waiters[task]
+            if abandoned and not task.done():
+                logging.info(f"기다리는 요청이 모두 떠나 계산을 취소합니다 ({self.name})")
+                task.cancel()
+
+    def _start(self, key: str, compute, should_cache, ttl, stale_ttl) -> asyncio.Future:
+        async def run():
+            try:
+                result = await compute()
+                if should_cache is None or should_cache(result):
+                    self.set(key, result, ttl=ttl, stale_ttl=stale_ttl)
+                else:
+                    with self._lock:
+                        self.stats["uncached"] += 1
+                return result
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    def _log_revalidation_error(self, task: asyncio.Future):
+        # 백그라운드 갱신이 실패해도 이전 값은 stale_ttl 동안 계속 쓰입니다.
+        if task.cancelled() or task.exception() is None:
+            return
+        with self._lock:
+            self.stats["revalidation_errors"] += 1
+        logging.warning(f"캐시 백그라운드 갱신 실패 ({self.name}): {task.exception()}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            requests = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"] + self.stats["stale_served"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "ttl_seconds": self.ttl,
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.stats["hits"] / requests, 4) if requests else 0.0,
+                "dedup_rate": round((requests - self.stats["misses"]) / requests, 4) if requests else 0.0,
+            }
@@ -0,0 +1,189 @@
+# web_search.py
+# 범용 검색 에이전트의 웹 검색 도구(Tavily)와 결과 캐시
+#   - Tavily /search API 를 공유 HTTP 세션(keep-alive)으로 호출합니다. 주소는 MOIT_TAVILY_API_URL 로 바꿀 수 있습니다. (로컬 스텁 서버 등)
+#   - 결과는 "정규화한 질의 + 날짜 구간" 키로 캐시합니다. 날씨/뉴스처럼 자주 바뀌는 주제는 짧은 TTL, 그 외는 긴 TTL을 씁니다.
+#   - TTL 이 지난 결과는 stale 구간 동안 바로 돌려주고, 백그라운드에서 다시 검색해 갱신합니다.
+#   - Tavily 호출은 공급자 호출 계층(헤지, 지터 백오프 재시도, 회로 차단기)을 거칩니다. ("tavily" 공급자)
+#   - 동기 invoke 도 같은 캐시 키와 같은 호출 계층을 쓰고, HTTP 는 공유 동기 세션으로 보냅니다. (stale 갱신은 비동기 경로만)
+# 사용법 (로컬 스텁 검색 서버): python web_search.py stub-server --port 8765 --latency 0.5
+#         서버 쪽에는 MOIT_TAVILY_API_URL=http://127.0.0.1:8765 로 연결합니다.
+
+import os
+import re
+import json
+import logging
+import argparse
+import unicodedata
+from datetime import date, datetime
+from typing import Any, List, Optional, Type
+
+from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.tools import BaseTool
+
+from provider_guard import provider_guards
+from ttl_cache import AsyncTTLCache
+
+DEFAULT_TAVILY_API_URL = "https://api.tavily.com"
+
+# 주제별 (TTL, stale 허용 시간) 초. MOIT_WEB_CACHE_TTLS 에 같은 형식의 JSON을 넣어 덮어쓸 수 있습니다.
+TOPIC_TTLS = {
+    "weather": (1800.0, 1800.0),
+    "news": (600.0, 600.0),
+    "static": (86400.0, 86400.0),
+}
+TOPIC_TTLS.update({topic: tuple(ttls) for topic, ttls in json.loads(os.getenv("MOIT_WEB_CACHE_TTLS", "{}")).items()})
+
+TOPIC_PATTERNS = (
+    ("weather", re.compile(r"날씨|기온|강수|비\s?(오|와|옴)|눈\s?(오|와|옴)|미세먼지|황사|태풍|우산|weather|forecast")),
+    ("news", re.compile(r"뉴스|속보|실시간|최신|현재|주가|환율|경기\s?결과|순위|news|latest")),
+)
+# 상대적인 시간 표현이 있으면 주제와 상관없이 날짜 구간을 키에 넣습니다. (내일의 "내일"은 다른 날입니다)
+RELATIVE_TIME_PATTERN = re.compile(r"오늘|내일|모레|어제|이번\s?주|주말|다음\s?주|지금|요즘|today|tomorrow|tonight|weekend")
+
+
+def today() -> date:
+    """오늘 날짜. get_current_date 도구와 캐시 날짜 구간이 같은 기준을 쓰도록 한 곳에서 정합니다."""
+    return datetime.now().date()
+
+
+def normalize_query(query: str) -> str:
+    """전각/반각, 대소문자, 문장부호, 공백 차이를 없앤 질의 문자열"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def classify_topic(normalized_query: str) -> str:
+    for topic, pattern in TOPIC_PATTERNS:
+        if pattern.search(normalized_query):
+            return topic
+    return "static"
+
+
+def cache_key(query: str, max_results: int, day: Optional[date] = None):
+    """(캐시 키, 주제) 를 반환합니다. 자주 바뀌는 주제와 상대 시간 질의만 날짜 구간으로 나눕니다."""
+    normalized = normalize_query(query)
+    topic = classify_topic(normalized)
+    dated = topic != "static" or RELATIVE_TIME_PATTERN.search(normalized)
+    bucket = (day or today()).isoformat() if dated else "-"
+    return f"{topic}|{bucket}|{max_results}|{normalized}", topic
+
+
+class TavilyClient:
+    """Tavily /search 호출. 기본적으로 공유 레지스트리의 keep-alive HTTP 세션을 씁니다."""
+
+    def __init__(self, api_url: str = None, http_client_getter=None, search_depth: str = "advanced",
+                 sync_http_client_getter=None):
+        self.api_url = (api_url or os.getenv("MOIT_TAVILY_API_URL", DEFAULT_TAVILY_API_URL)).rstrip("/")
+        self.http_client_getter = http_client_getter
+        self.sync_http_client_getter = sync_http_client_getter
+        self.search_depth = search_depth
+        self.requests = 0
+
+    def _client(self):
+        if self.http_client_getter is not None:
+            return self.http_client_getter()
+        from resource_pool import registry
+        return registry.http_async_client
+
+    def _sync_client(self):
+        if self.sync_http_client_getter is not None:
+            return self.sync_http_client_getter()
+        from resource_pool import registry
+        return registry.http_client
+
+    def _body(self, query: str, max_results: int) -> dict:
+        self.requests += 1
+        return {
+            "api_key": os.getenv("TAVILY_API_KEY", ""),
+            "query": query,
+            "max_results": max_results,
+            "search_depth": self.search_depth,
+        }
+
+    @staticmethod
+    def _results(response) -> List[dict]:
+        response.raise_for_status()
+        # TavilySearchResults 와 같은 형식(url, content)으로 줄여서 돌려줍니다.
+        return [{"url": result["url"], "content": result["content"]} for result in response.json().get("results", [])]
+
+    async def search(self, query: str, max_results: int) -> List[dict]:
+        return await provider_guards.acall("tavily", lambda: self._search(query, max_results))
+
+    def search_sync(self, query: str, max_results: int) -> List[dict]:
+        return provider_guards.call("tavily", lambda: self._search_sync(query, max_results))
+
+    async def _search(self, query: str, max_results: int) -> List[dict]:
+        return self._results(await self._client().post(f"{self.api_url}/search", json=self._body(query, max_results)))
+
+    def _search_sync(self, query: str, max_results: int) -> List[dict]:
+        return self._results(self._sync_client().post(f"{self.api_url}/search", json=self._body(query, max_results)))
+
+
+class WebSearchInput(BaseModel):
+    query: str = Field(description="search query to look up")
+
+
+class WebSearchTool(BaseTool):
+    """캐시를 거쳐 Tavily 를 호출하는 웹 검색 도구 (TavilySearchResults 대체)"""
+
+    name: str = "web_search"
+    description: str = "날씨, 뉴스, 맛집, 특정 주제에 대한 최신 정보 등 외부 세계에 대한 질문에 답할 때 사용합니다."
+    args_schema: Type[BaseModel] = WebSearchInput
+    max_results: int = 3
+    client: Any = None
+    cache: Any = None
+
+    def _run(self, query: str, run_manager: Any = None) -> List[dict]:
+        if self.cache is None:
+            return self.client.search_sync(query, self.max_results)
+        key, topic = cache_key(query, self.max_results)
+        ttl, stale_ttl = TOPIC_TTLS[topic]
+        result, status = self.cache.get_or_compute_blocking(
+            key, lambda: self.client.search_sync(query, self.max_results), ttl=ttl, stale_ttl=stale_ttl,
+        )
+        logging.info(f"웹 검색 ({topic}, 캐시 {status}): {query}")
+        return result
+
+    async def _arun(self, query: str, run_manager: Any = None) -> List[dict]:
+        if self.cache is None:
+            return await self.client.search(query, self.max_results)
+        key, topic = cache_key(query, self.max_results)
+        ttl, stale_ttl = TOPIC_TTLS[topic]
+        result, status = await self.cache.get_or_compute(
+            key, lambda: self.client.search(query, self.max_results), ttl=ttl, stale_ttl=stale_ttl,
+        )
+        logging.info(f"웹 검색 ({topic}, 캐시 {status}): {query}")
+        return result
+
+
+search_client = TavilyClient()
+web_search_cache = AsyncTTLCache(
+    "web_search",
+    ttl=TOPIC_TTLS["static"][0],
+    max_entries=int(os.getenv("MOIT_WEB_CACHE_SIZE", "1024")),
+)
+
+
+def build_web_search_tool(max_results: int = 3) -> WebSearchTool:
+    cache = web_search_cache if os.getenv("MOIT_WEB_CACHE", "1") == "1" else None
+    return WebSearchTool(max_results=max_results, client=search_client, cache=cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="웹 검색 도구 유틸리티")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stub = sub.add_parser("stub-server", help="Tavily /search 를 흉내 내는 로컬 스텁 검색 서버 실행")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=8765)
+    stub.add_argument("--latency", type=float, default=0.0)
+    stub.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    from fake_providers import create_stub_search_app
+    uvicorn.run(create_stub_search_app(latency=args.latency, jitter=args.jitter), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,7 @@ $ch = curl_init('http://127.0.0.1:8000/agent/invoke');
 curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
 curl_setopt($ch, CURLOPT_POST, true);
 curl_setopt($ch, CURLOPT_POSTFIELDS, json_encode($agent_input));
-curl_setopt($ch, CURLOPT_HTTPHEADER, ['Content-Type: application/json']);
+curl_setopt($ch, CURLOPT_HTTPHEADER, ['Content-Type: application/json', 'X-MOIT-Deadline-Ms: 60000']); // 아래 제한 시간을 AI 서버에도 알려 그 안에 답하도록 합니다
 curl_setopt($ch, CURLOPT_CONNECTTIMEOUT, 5);
 curl_setopt($ch, CURLOPT_TIMEOUT, 60); // AI가 생각할 시간을 넉넉하게 60초로 설정
 
@@ -57,7 +57,9 @@ try {
             'title' => $title,
             'description' => $description,
             'time' => $meeting_date . ' ' . $meeting_time,
-            'location' => $location
+            'location' => $location,
+            'category' => $category,
+            'max_members' => $max_members
         ];
         
         $ch = curl_init('http://127.0.0.1:8000/meetings/add');
@@ -56,7 +56,7 @@ if ($_SERVER['REQUEST_METHOD'] == 'POST') {
     curl_setopt($ch_agent, CURLOPT_RETURNTRANSFER, true);
     curl_setopt($ch_agent, CURLOPT_POST, true);
     curl_setopt($ch_agent, CURLOPT_POSTFIELDS, json_encode($agent_input));
-    curl_setopt($ch_agent, CURLOPT_HTTPHEADER, ['Content-Type: application/json']);
+    curl_setopt($ch_agent, CURLOPT_HTTPHEADER, ['Content-Type: application/json', 'X-MOIT-Deadline-Ms: 30000']); // 아래 제한 시간을 AI 서버에도 알려 그 안에 답하도록 합니다
     curl_setopt($ch_agent, CURLOPT_CONNECTTIMEOUT, 5); 
     curl_setopt($ch_agent, CURLOPT_TIMEOUT, 30); // 에이전트가 생각할 시간을 넉넉하게 30초
 
@@ -141,7 +141,9 @@ if ($_SERVER['REQUEST_METHOD'] == 'POST') {
                 'title' => $title,
                 'description' => $description,
                 'time' => $meeting_date . ' ' . $meeting_time,
-                'location' => $location
+                'location' => $location,
+                'category' => $category,
+                'max_members' => $max_members
             ];
             
             $ch = curl_init('http://127.0.0.1:8000/meetings/add');
@@ -94,43 +94,39 @@ try {
     }
 
     // 3. AI 에이전트에 보낼 데이터 구조 생성
+    // [수정] 추천 생성은 수십 초가 걸릴 수 있으므로 AI 서버의 작업 큐에 맡기고 job_id만 받아옵니다.
+    //        결과는 AI 서버가 ai_hobby_recommendations 에 직접 저장하고, 화면은 get_ai_recommendation_status.php 로 폴링합니다.
     $request_payload = [
         'user_input' => [
             'survey' => $survey_data,
             'image_paths' => $image_paths
-        ]
+        ],
+        'user_id' => (string)$_SESSION['user_id']
     ];
 
-    // 4. cURL을 사용해 AI 에이전트 API 호출
-    $ch = curl_init('http://127.0.0.1:8000/agent/invoke');
+    // 4. cURL을 사용해 작업 제출 (즉시 응답)
+    $ch = curl_init('http://127.0.0.1:8000/jobs/hobby_recommendation');
     curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
     curl_setopt($ch, CURLOPT_CUSTOMREQUEST, 'POST');
     curl_setopt($ch, CURLOPT_POSTFIELDS, json_encode($request_payload));
     curl_setopt($ch, CURLOPT_HTTPHEADER, ['Content-Type: application/json']);
     curl_setopt($ch, CURLOPT_CONNECTTIMEOUT, 10);
-    curl_setopt($ch, CURLOPT_TIMEOUT, 120); // AI 처리 시간을 고려해 넉넉하게 2분으로 설정
+    curl_setopt($ch, CURLOPT_TIMEOUT, 15);
 
     $response_body = curl_exec($ch);
     $http_code = curl_getinfo($ch, CURLINFO_HTTP_CODE);
 
-    if (curl_errno($ch) || $http_code !== 200) {
+    if (curl_errno($ch) || $http_code !== 202) {
         throw new Exception("AI 추천 서버와의 통신에 실패했습니다. (HTTP: {$http_code})");
     }
     curl_close($ch);
 
-    // 5. AI 추천 결과 파싱 및 반환
+    // 5. 작업 ID 반환
     $response_data = json_decode($response_body, true);
-    if (isset($response_data['final_answer']) && !empty($response_data['final_answer'])) {
-        $recommendation_text = $response_data['final_answer'];
-
-        // DB에 결과 저장
-        $pdo = getDBConnection();
-        $stmt = $pdo->prepare("INSERT INTO ai_hobby_recommendations (user_id, recommendation_text) VALUES (?, ?)");
-        $stmt->execute([$_SESSION['user_id'], $recommendation_text]);
-
-        echo json_encode(['success' => true, 'recommendation' => htmlspecialchars($recommendation_text)]);
+    if (!empty($response_data['job_id'])) {
+        echo json_encode(['success' => true, 'job_id' => $response_data['job_id']]);
     } else {
-        throw new Exception('AI가 유효한 추천을 생성하지 못했습니다.');
+        throw new Exception('AI 추천 작업을 등록하지 못했습니다.');
     }
 
 } catch (Exception $e) {
@@ -0,0 +1,58 @@
+<?php
+require_once 'config.php';
+
+header('Content-Type: application/json');
+
+// 로그인 확인
+if (!isLoggedIn()) {
+    echo json_encode(['success' => false, 'message' => '로그인이 필요합니다.']);
+    exit;
+}
+
+$job_id = $_GET['job_id'] ?? '';
+if (!preg_match('/^[a-f0-9]{32}$/', $job_id)) {
+    echo json_encode(['success' => false, 'message' => '잘못된 요청입니다.']);
+    exit;
+}
+
+try {
+    // AI 서버에 작업 상태 조회
+    $ch = curl_init('http://127.0.0.1:8000/jobs/' . $job_id);
+    curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
+    curl_setopt($ch, CURLOPT_CONNECTTIMEOUT, 5);
+    curl_setopt($ch, CURLOPT_TIMEOUT, 10);
+
+    $response_body = curl_exec($ch);
+    $http_code = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+
+    if (curl_errno($ch) || $http_code !== 200) {
+        throw new Exception("AI 추천 서버와의 통신에 실패했습니다. (HTTP: {$http_code})");
+    }
+    curl_close($ch);
+
+    $job = json_decode($response_body, true);
+
+    // 다른 사용자의 작업은 조회할 수 없습니다.
+    if (($job['user_id'] ?? null) !== (string)$_SESSION['user_id']) {
+        echo json_encode(['success' => false, 'message' => '잘못된 요청입니다.']);
+        exit;
+    }
+
+    if ($job['status'] === 'succeeded') {
+        echo json_encode([
+            'success' => true,
+            'status' => 'succeeded',
+            'recommendation' => htmlspecialchars($job['result']['recommendation'])
+        ]);
+    } elseif ($job['status'] === 'failed') {
+        echo json_encode(['success' => false, 'status' => 'failed', 'message' => 'AI가 유효한 추천을 생성하지 못했습니다.']);
+    } else {
+        echo json_encode(['success' => true, 'status' => $job['status']]);
+    }
+
+} catch (Exception $e) {
+    error_log("AI Recommendation Status Error: " . $e->getMessage());
+    echo json_encode(['success' => false, 'message' => $e->getMessage()]);
+}
+
+?>
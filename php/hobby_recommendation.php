@@ -378,6 +378,27 @@ debug_output("최종 상태", [
                 }
             });
 
+            // AI 추천 작업이 끝날 때까지 2초 간격으로 상태를 확인합니다. (최대 약 3분)
+            function pollRecommendation(jobId, attempt = 0) {
+                return new Promise(resolve => setTimeout(resolve, 2000))
+                    .then(() => fetch('get_ai_recommendation_status.php?job_id=' + encodeURIComponent(jobId)))
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error('네트워크 응답이 올바르지 않습니다.');
+                        }
+                        return response.json();
+                    })
+                    .then(data => {
+                        if (data.success && (data.status === 'queued' || data.status === 'running')) {
+                            if (attempt >= 90) {
+                                return { success: false, message: '추천 생성이 지연되고 있습니다. 잠시 후 마이페이지에서 확인해주세요.' };
+                            }
+                            return pollRecommendation(jobId, attempt + 1);
+                        }
+                        return data;
+                    });
+            }
+
             submitBtn.addEventListener('click', function(e) {
                 e.preventDefault(); // 기본 폼 제출(새로고침)을 막습니다.
                 if (!validateCurrentStep()) {
@@ -401,6 +422,8 @@ debug_output("최종 상태", [
                     }
                     return response.json();
                 })
+                // [수정] 서버는 작업 ID만 바로 돌려주므로, 결과가 나올 때까지 상태를 폴링합니다.
+                .then(data => (data.success && data.job_id) ? pollRecommendation(data.job_id) : data)
                 .then(data => {
                     if (data.success && data.recommendation) {
                         // [수정] 성공 시, 화면 레이아웃을 변경하고 결과를 표시합니다.